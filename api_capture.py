@@ -0,0 +1,160 @@
+import os
+import json
+import zlib
+import datetime
+import urllib.request
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from PIL import Image, ImageDraw, ImageFont
+
+import image_utils
+import tracing
+
+# Same data the dashboard/day page draws its chart from
+BASE_URL = os.environ.get("WAKATIME_BASE_URL", "https://wakatime.com").rstrip("/")
+DURATIONS_URL = BASE_URL + "/api/v1/users/current/durations?date={date}"
+USER_URL = BASE_URL + "/api/v1/users/current"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# --- CHART LOOK (close to the WakaTime dark dashboard) ---
+WIDTH = 1200
+LABEL_WIDTH = 220
+HEADER_HEIGHT = 70
+ROW_HEIGHT = 30
+AXIS_HEIGHT = 30
+PADDING = 20
+BACKGROUND = (34, 34, 34)
+GRID = (60, 60, 60)
+TEXT = (230, 230, 230)
+MUTED = (150, 150, 150)
+PALETTE = [
+    (255, 87, 34), (46, 204, 113), (52, 152, 219), (155, 89, 182), (241, 196, 15),
+    (26, 188, 156), (231, 76, 60), (149, 165, 166), (230, 126, 34), (52, 73, 94)
+]
+
+
+def load_cookie_header(auth_file="auth.json", user_cookie=None):
+    """Builds a Cookie header from the saved Playwright session; a pasted session cookie wins."""
+    cookies = {}
+    if os.path.exists(auth_file):
+        with open(auth_file, "r") as f:
+            for c in json.load(f).get("cookies", []):
+                if c.get("domain", "").lstrip(".").endswith("wakatime.com"):
+                    cookies[c["name"]] = c["value"]
+    if user_cookie:
+        cookies["session"] = user_cookie.strip()
+    if not cookies:
+        raise RuntimeError("No WakaTime session found (auth.json / session cookie).")
+    return "; ".join(f"{k}={v}" for k, v in cookies.items())
+
+
+def _get_json(url, cookie_header, timeout=15):
+    req = urllib.request.Request(
+        url, headers={"Cookie": cookie_header, "User-Agent": USER_AGENT, "Accept": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def fetch_durations(waka_date_str, cookie_header, timeout=15):
+    return _get_json(DURATIONS_URL.format(date=waka_date_str), cookie_header, timeout)
+
+
+def fetch_timezone(cookie_header, timeout=15):
+    """The user's WakaTime timezone setting (IANA name), which is what their days are cut by."""
+    return _get_json(USER_URL, cookie_header, timeout).get("data", {}).get("timezone")
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _color(project):
+    return PALETTE[zlib.crc32(project.encode("utf-8")) % len(PALETTE)]
+
+
+def _fmt_seconds(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours} hrs {rest // 60} mins"
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name) if name else datetime.timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return datetime.timezone.utc
+
+
+def _day_start(payload, waka_date_str):
+    """Midnight of waka_date_str in the user's WakaTime timezone, as a unix timestamp."""
+    start = payload.get("start")
+    if start:
+        try:
+            return datetime.datetime.fromisoformat(start.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    day = datetime.datetime.strptime(waka_date_str, "%Y-%m-%d")
+    return day.replace(tzinfo=_zone(payload.get("timezone"))).timestamp()
+
+
+def render_day_chart(payload, waka_date_str):
+    """Draws the per-project timeline for one day and returns it as a Pillow image (encoded once by the caller)."""
+    durations = payload.get("data", [])
+    totals = {}
+    for d in durations:
+        project = d.get("project") or "Unknown"
+        totals[project] = totals.get(project, 0) + d.get("duration", 0)
+    projects = sorted(totals, key=totals.get, reverse=True) or ["No activity"]
+
+    height = HEADER_HEIGHT + len(projects) * ROW_HEIGHT + AXIS_HEIGHT + PADDING
+    img = Image.new("RGB", (WIDTH, height), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    title_font, font = _font(20), _font(13)
+
+    draw.text((PADDING, PADDING), f"{waka_date_str}  ·  {_fmt_seconds(sum(totals.values()))}", fill=TEXT, font=title_font)
+
+    chart_left, chart_right = LABEL_WIDTH, WIDTH - PADDING
+    chart_top = HEADER_HEIGHT
+    chart_bottom = chart_top + len(projects) * ROW_HEIGHT
+    span = chart_right - chart_left
+
+    # Hour grid (every 2 hours)
+    for hour in range(0, 25, 2):
+        x = chart_left + span * hour / 24
+        draw.line([(x, chart_top), (x, chart_bottom)], fill=GRID)
+        draw.text((x - 8, chart_bottom + 6), f"{hour:02d}", fill=MUTED, font=font)
+
+    day_start = _day_start(payload, waka_date_str)
+    rows = {p: i for i, p in enumerate(projects)}
+    for i, project in enumerate(projects):
+        y = chart_top + i * ROW_HEIGHT
+        label = f"{project[:22]}  {_fmt_seconds(totals.get(project, 0))}" if project in totals else project
+        draw.text((PADDING, y + 8), label, fill=TEXT if project in totals else MUTED, font=font)
+
+    for d in durations:
+        project = d.get("project") or "Unknown"
+        start = (d.get("time", day_start) - day_start) / 86400
+        end = start + d.get("duration", 0) / 86400
+        x0 = chart_left + span * max(0.0, start)
+        x1 = chart_left + span * min(1.0, end)
+        y = chart_top + rows[project] * ROW_HEIGHT
+        draw.rectangle([x0, y + 6, max(x1, x0 + 2), y + ROW_HEIGHT - 6], fill=_color(project))
+
+    return img
+
+
+def capture(waka_date_str, auth_file="auth.json", user_cookie=None):
+    """Browser-free capture: fetch the day's durations and render the chart. Returns (image bytes, has_activity)."""
+    with tracing.span("api.fetch"):
+        cookie_header = load_cookie_header(auth_file, user_cookie)
+        payload = fetch_durations(waka_date_str, cookie_header)
+        if not payload.get("start") and not payload.get("timezone"):
+            # Rare: no day bounds in the response, so cut the day by the user's own timezone
+            payload["timezone"] = fetch_timezone(cookie_header)
+    with tracing.span("api.render") as span:
+        data = image_utils.encode_image(render_day_chart(payload, waka_date_str))
+        if span:
+            span.set(bytes=len(data), durations=len(payload.get("data", [])))
+    return data, bool(payload.get("data"))
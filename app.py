@@ -2,7 +2,8 @@ import streamlit as st
 import datetime
 import time
 import extra_streamlit_components as stx
-from automation import OfficeAutomator
+from async_automation import AsyncOfficeAutomator
+import capture_scheduler
 
 # --- 1. CONFIGURATION & PHOSPHOR ICONS ---
 st.set_page_config(page_title="WakaTime Automator", page_icon="⚡", layout="centered")
@@ -216,6 +217,9 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- BACKEND LOGIC REMAINS THE SAME ---
+# One scheduler per process: every session's captures share its browser and worker pool
+scheduler = capture_scheduler.get_scheduler()
+
 def get_manager():
     return stx.CookieManager()
 
@@ -229,6 +233,8 @@ if "drive_folder" not in st.session_state:
     st.session_state.drive_folder = ""
 if "logs" not in st.session_state:
     st.session_state.logs = []
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
 
 def logger(message):
     timestamp = datetime.datetime.now().strftime('%H:%M')
@@ -321,21 +327,25 @@ else:
 
     # Action Button
     if st.button("Initiate Sequence", type="primary", use_container_width=True):
-        progress_bar = st.progress(0, text="Initializing...")
-        
-        bot = OfficeAutomator(logger=logger)
+        bot = AsyncOfficeAutomator(logger=logger)
         bot.user_cookie = st.session_state.waka_session
         bot.folder_id = st.session_state.drive_folder
-        
-        try:
-            # Fake smooth progress for UX
-            progress_bar.progress(10, text="Accessing Secure Browser...")
-            time.sleep(0.5)
-            progress_bar.progress(30, text="Capturing Analytics...")
-            
-            # Run Actual Bot
-            bot.run(wh, ot, note)
-            
+
+        job = scheduler.submit((st.session_state.waka_session, bot.folder_id), bot, wh, ot, note)
+        st.session_state.job_id = job.id
+
+    # Poll the running job (survives reruns while the capture is in flight)
+    job = scheduler.get(st.session_state.job_id) if st.session_state.job_id else None
+    if job is not None:
+        progress_bar = st.progress(job.progress, text=job.stage)
+        # job.progress / job.stage move as trace spans finish (see capture_scheduler.PROGRESS_SPANS)
+        while not job.wait(0.25):
+            progress_bar.progress(job.progress, text=job.stage)
+        for timestamp, message in job.logs:
+            st.session_state.logs.append(f"<span style='color: #888;'>[{timestamp}]</span> {message}")
+        st.session_state.job_id = None
+
+        if job.error is None:
             progress_bar.progress(100, text="Done!")
             st.markdown("""
                 <div class="success-box">
@@ -344,13 +354,12 @@ else:
                     <div class="fun-text">Another day, another spreadsheet conquered.</div>
                 </div>
             """, unsafe_allow_html=True)
-            
-        except Exception as e:
+        else:
             progress_bar.empty()
             st.markdown(f"""
                 <div class="glass-card" style="border-color: #e74c3c; padding: 0.8rem;">
                     <i class="ph-fill ph-warning" style="font-size: 1.2rem; color: #e74c3c;"></i>
-                    <strong>Error:</strong> {e}
+                    <strong>Error:</strong> {job.error}
                 </div>
             """, unsafe_allow_html=True)
 
@@ -0,0 +1,242 @@
+import os
+import re
+import time
+import atexit
+import asyncio
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+
+import json_store
+
+# Every capture opens a fresh context with an empty HTTP cache, so the dashboard's JS/CSS
+# bundles came over the network each time. This is a small shared cache served through
+# route.fulfill: bodies are stored once by sha256 (content-addressed), an index maps
+# URL -> blob + response headers + freshness, and the least recently used entries are
+# evicted once the blobs exceed MAX_BYTES. Only script/stylesheet GETs are cached; the
+# dashboard HTML and the data API always go to the network.
+CACHE_DIR = os.environ.get("ASSET_CACHE_DIR", "cache/assets")
+MAX_BYTES = int(os.environ.get("ASSET_CACHE_MAX_MB", "100")) * 1024 * 1024
+CACHEABLE_TYPES = frozenset(("script", "stylesheet"))
+SAVE_DELAY = float(os.environ.get("ASSET_CACHE_SAVE_DELAY", "5"))  # Index writes are batched over this many seconds
+
+# Hop-by-hop / encoding headers don't describe the decoded body we hand back
+DROP_HEADERS = frozenset(("content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"))
+# ...and cookies are never replayed from disk
+STORE_DROP_HEADERS = DROP_HEADERS | {"set-cookie"}
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*(\d+)", re.I)
+
+
+def freshness(headers, now=None):
+    """
+    -> (storable, expires_at) from Cache-Control / Expires.
+    no-store isn't stored; no-cache (or only a validator) is stored but revalidated every time.
+    """
+    now = now or time.time()
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return False, 0
+    validator = "etag" in headers or "last-modified" in headers
+    if "no-cache" in cache_control:
+        return validator, 0
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return True, now + int(match.group(1))
+    if "expires" in headers:
+        try:
+            return True, parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return validator, 0
+    return validator, 0
+
+
+class AssetCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._store = json_store.JsonStore(os.path.join(cache_dir, "index.json"))
+        self._lock = self._store.lock
+        self._dirty = False
+        self._save_timer = None
+
+    # --- STORAGE ---
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, "blobs", digest[:2], digest)
+
+    @property
+    def _index(self):
+        return self._store.data
+
+    def _save(self):
+        self._store.save()
+        self._dirty = False
+
+    def flush(self):
+        with self._lock:
+            self._save_timer = None
+            if self._dirty:
+                self._save()
+
+    def _mark_dirty(self):
+        # Called with _lock held. One index write per SAVE_DELAY instead of one per response
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def lookup(self, url):
+        """Index entry plus body for url, or None. Touches the entry for LRU."""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None:
+                return None
+            entry = dict(entry)
+        try:
+            with open(self._blob_path(entry["sha256"]), "rb") as f:
+                body = f.read()
+        except OSError:
+            with self._lock:
+                if self._index.get(url, {}).get("sha256") == entry["sha256"]:
+                    del self._index[url]
+                    self._mark_dirty()
+            return None
+        with self._lock:
+            if url in self._index:
+                self._index[url]["used"] = time.time()
+                self._mark_dirty()
+        return entry, body
+
+    def store(self, url, status, headers, body):
+        storable, expires = freshness(headers)
+        if not storable or status != 200:
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        kept = {k: v for k, v in headers.items() if k.lower() not in STORE_DROP_HEADERS}
+        if not os.path.exists(path):
+            # Content-addressed: concurrent writers of the same blob write the same bytes
+            json_store.atomic_write(path, body)
+        with self._lock:
+            self._index[url] = {
+                "sha256": digest, "size": len(body), "status": status, "headers": kept,
+                "expires": expires, "etag": headers.get("etag"), "last_modified": headers.get("last-modified"),
+                "used": time.time(),
+            }
+            self._evict()
+            self._mark_dirty()
+
+    def refresh(self, url, headers):
+        """A 304 came back: the stored body is still good for another freshness period."""
+        storable, expires = freshness(headers)
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                entry["expires"] = expires if storable else 0
+                self._mark_dirty()
+
+    def _evict(self):
+        # Blobs are shared between URLs with identical content: size each one once
+        blobs = {}
+        for entry in self._index.values():
+            used, _ = blobs.get(entry["sha256"], (0, 0))
+            blobs[entry["sha256"]] = max(used, entry["used"]), entry["size"]
+        total = sum(size for _, size in blobs.values())
+        for digest, (used, size) in sorted(blobs.items(), key=lambda kv: kv[1][0]):
+            if total <= self.max_bytes:
+                break
+            for url in [u for u, e in self._index.items() if e["sha256"] == digest]:
+                del self._index[url]
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+            total -= size
+
+    # --- PLAYWRIGHT ---
+    @staticmethod
+    def cacheable(request):
+        return request.method == "GET" and request.resource_type in CACHEABLE_TYPES
+
+    @staticmethod
+    def _conditional_headers(request, entry):
+        headers = dict(request.headers)
+        if entry.get("etag"):
+            headers["if-none-match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["if-modified-since"] = entry["last_modified"]
+        return headers
+
+    def serve(self, route):
+        """
+        Answers a script/stylesheet request from the cache when possible.
+        Returns (outcome, network_bytes) with outcome hit/revalidated/miss/bypass, or None if the request isn't cacheable.
+        """
+        request = route.request
+        if not self.cacheable(request):
+            return None
+        cached = self.lookup(request.url)
+        if cached and cached[0]["expires"] > time.time():
+            entry, body = cached
+            route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+            return "hit", 0
+
+        try:
+            response = route.fetch(headers=self._conditional_headers(request, cached[0]) if cached else None)
+        except Exception:
+            route.continue_()  # Let the browser deal with the network error itself
+            return "bypass", 0
+        if response.status == 304 and cached:
+            entry, body = cached
+            self.refresh(request.url, response.headers)
+            route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+            return "revalidated", 0
+
+        body = response.body()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROP_HEADERS}
+        route.fulfill(status=response.status, headers=headers, body=body)
+        self.store(request.url, response.status, response.headers, body)
+        return "miss", len(body)
+
+    async def serve_async(self, route):
+        """serve() for async Playwright; blob reads and writes happen in the default executor, off the event loop."""
+        request = route.request
+        if not self.cacheable(request):
+            return None
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.lookup, request.url)
+        if cached and cached[0]["expires"] > time.time():
+            entry, body = cached
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+            return "hit", 0
+
+        try:
+            response = await route.fetch(headers=self._conditional_headers(request, cached[0]) if cached else None)
+        except Exception:
+            await route.continue_()
+            return "bypass", 0
+        if response.status == 304 and cached:
+            entry, body = cached
+            self.refresh(request.url, response.headers)
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+            return "revalidated", 0
+
+        body = await response.body()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROP_HEADERS}
+        await route.fulfill(status=response.status, headers=headers, body=body)
+        await loop.run_in_executor(None, self.store, request.url, response.status, response.headers, body)
+        return "miss", len(body)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AssetCache()
+            atexit.register(_cache.flush)
+        return _cache
@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+from playwright.async_api import async_playwright
+
+import api_capture
+import capture_worker
+import image_utils
+import readiness
+import request_blocker
+import tracing
+import user_contexts
+from automation import OfficeAutomator
+from browser_pool import launch_args
+
+
+class AsyncOfficeAutomator(OfficeAutomator):
+    """
+    Same capture as OfficeAutomator, but every step is an awaitable so many captures
+    can share one event loop and one browser. Drive/Excel work runs in the default executor.
+    """
+
+    async def open_context(self, browser):
+        """One-off context for this run (the scheduler uses warm per-user contexts instead, see user_contexts)."""
+        with tracing.span("browser.context"):
+            state = user_contexts.initial_state(self.auth_file, self.user_cookie)
+            context = await browser.new_context(storage_state=state, viewport=user_contexts.VIEWPORT)
+            await user_contexts.inject_async(context, self.user_cookie, state)
+            blocker = await request_blocker.Blocker().install_async(context)
+        return context, blocker
+
+    async def load_chart(self, page, waka_date_str):
+        """Navigates and waits for the chart's API response + SVG quiescence. Returns the readiness report."""
+        url = readiness.dashboard_url(waka_date_str)
+        return await readiness.wait_until_ready_async(page, url)
+
+    async def take_screenshot(self, page):
+        return await image_utils.capture_chart_async(page)
+
+    async def capture_in(self, context, blocker, waka_date_str):
+        page = await context.new_page()
+        try:
+            report = await self.load_chart(page, waka_date_str)
+            image = await self.take_screenshot(page)
+            return image, report["ready"]
+        finally:
+            self.block_stats = blocker.summary()
+            await page.close()
+
+    async def capture_async(self, browser, waka_date_str, contexts=None):
+        """Returns (image bytes, chart_ready). With contexts (a UserContexts), reuses this user's warm context."""
+        with tracing.span("capture", mode=self.mode):
+            return await self._capture(browser, waka_date_str, contexts)
+
+    async def _capture(self, browser, waka_date_str, contexts):
+        if self.mode == "api":
+            return await asyncio.get_running_loop().run_in_executor(
+                None, tracing.bind(api_capture.capture), waka_date_str, self.auth_file, self.user_cookie
+            )
+        if contexts is not None:
+            async with contexts.acquire(self.auth_file, self.user_cookie) as (context, blocker):
+                return await self.capture_in(context, blocker, waka_date_str)
+
+        context, blocker = await self.open_context(browser)
+        try:
+            return await self.capture_in(context, blocker, waka_date_str)
+        finally:
+            try:
+                await user_contexts.save_state_async(context, user_contexts.state_path(self.auth_file, self.user_cookie))
+            except Exception:
+                pass  # A failed capture shouldn't be masked by the write-back
+            await context.close()
+
+    async def capture_in_worker_async(self, waka_date_str):
+        """capture_in_worker without blocking the event loop."""
+        with tracing.span("capture.worker"):
+            result = await capture_worker.get_worker().capture_async(self.auth_file, self.user_cookie, waka_date_str)
+            tracing.set_attrs(peak_memory_mb=result["peak_memory_mb"])
+        return self._worker_result(result)
+
+    async def sync_cloud_async(self, image, image_name, display_date, working_hours, overtime, note, pipeline=None):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, tracing.bind(self.sync_cloud), image, image_name, display_date, working_hours, overtime, note, pipeline
+        )
+
+    async def run(self, working_hours, overtime, note, browser=None):
+        """
+        Async twin of OfficeAutomator.run. Pass a shared browser to capture in it; without one the
+        capture runs in capture_worker (or, with CAPTURE_WORKER=0, in a browser launched for this run).
+        """
+        with tracing.start_trace("run", mode=self.mode, sheet_backend=self.sheet_backend):
+            return await self._run_async(working_hours, overtime, note, browser)
+
+    async def _run_async(self, working_hours, overtime, note, browser):
+        today = datetime.date.today()
+        waka_date_str = today.strftime("%Y-%m-%d")
+        display_date = today.strftime("%d-%m-%Y")
+        image_name = image_utils.screenshot_name(waka_date_str)
+
+        self.log("🚀 Speed Run Initiated...")
+        if self.mode == "browser" and not self.has_session():
+            self.log("❌ Error: No WakaTime session (auth.json or session cookie).")
+            return
+
+        journal = self.open_journal(waka_date_str)
+        pipeline = self.start_cloud_pipeline(journal)
+        image = self.resume_capture(journal)
+        if image is not None:
+            await self.sync_cloud_async(image, image_name, display_date, working_hours, overtime, note, pipeline)
+            self.log("✨ Finished!")
+            return
+
+        self.log("⚡ Browser Engine: Start")
+        try:
+            if browser is not None or self.mode == "api":
+                image, chart_ready = await self.capture_async(browser, waka_date_str)
+            elif capture_worker.ENABLED:
+                # Chromium lives in the supervised worker process (memory budget, kill + restart)
+                image, chart_ready = await self.capture_in_worker_async(waka_date_str)
+            else:
+                async with async_playwright() as p:
+                    with tracing.span("browser.launch"):
+                        own_browser = await p.chromium.launch(headless=True, args=launch_args())
+                    try:
+                        image, chart_ready = await self.capture_async(own_browser, waka_date_str)
+                    finally:
+                        await own_browser.close()
+        except Exception as e:
+            self.log(f"❌ Browser Error: {e}")
+            if pipeline: pipeline.close()
+            return
+
+        if not chart_ready:
+            self.log("⚠️ Chart delayed, snapped anyway...")
+        if self.block_stats:
+            self.log(self.block_stats)
+        self.log("📸 Screenshot: DONE")
+        journal.save_image(image)
+
+        await self.sync_cloud_async(image, image_name, display_date, working_hours, overtime, note, pipeline)
+        self.log("✨ Finished!")
@@ -2,26 +2,47 @@ import os
 import json
 import datetime
 import re
-from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 
 # Import helpers
+import browser_pool
+import api_capture
+import capture_worker
+import image_utils
 import drive_utils
+import readiness
+import request_blocker
+import run_journal
+import tracing
+import user_contexts
+from cloud_pipeline import CloudPipeline
 from smart_handler import SmartHandler
+from sheet_handler import SheetHandler
+
+# CAPTURE MODES: "browser" screenshots the dashboard, "api" renders the chart from the JSON API (no Chromium)
+CAPTURE_MODES = ("browser", "api")
+
+# SHEET BACKENDS: "xlsx" edits the uploaded workbook, "sheets" writes a native Google Sheet via values.batchUpdate
+SHEET_BACKENDS = ("xlsx", "sheets")
+
+# Backfill: parallel screenshot uploads (kept low to stay under Drive's per-user rate limit)
+BACKFILL_UPLOAD_CONCURRENCY = int(os.environ.get("BACKFILL_UPLOAD_CONCURRENCY", "4"))
 
 class OfficeAutomator:
-    def __init__(self, logger=print):
+    def __init__(self, logger=print, mode=None, sheet_backend=None):
         self.log = logger
         self.auth_file = "auth.json"
         self._folder_id = None 
         self.sheet_url = None
-        
-        # AGGRESSIVE BLOCKING LIST (Speeds up loading by ~60%)
-        self.BLOCK_RESOURCE_TYPES = ['image', 'font', 'media', 'texttrack', 'object', 'beacon', 'csp_report', 'imageset']
-        self.BLOCK_DOMAINS = [
-            'google-analytics', 'googletagmanager', 'intercom', 'hotjar', 'facebook', 
-            'doubleclick', 'twitter', 'linkedin', 'stripe'
-        ]
+        self.user_cookie = None
+        self.block_stats = None
+        self.mode = mode or os.environ.get("CAPTURE_MODE", "browser")
+        if self.mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode '{self.mode}' (use one of {CAPTURE_MODES})")
+        self.sheet_backend = sheet_backend or os.environ.get("SHEET_BACKEND", "xlsx")
+        if self.sheet_backend not in SHEET_BACKENDS:
+            raise ValueError(f"Unknown sheet backend '{self.sheet_backend}' (use one of {SHEET_BACKENDS})")
 
     @property
     def folder_id(self):
@@ -35,107 +56,289 @@ class OfficeAutomator:
         match = re.search(r'[-\w]{25,}', value)
         self._folder_id = match.group(0) if match else value.strip()
 
+    def has_session(self):
+        """A pasted session cookie or a saved auth.json is enough to open the dashboard."""
+        return bool(self.user_cookie) or os.path.exists(self.auth_file)
+
     def run(self, working_hours, overtime, note):
+        # One trace per run (cache/traces.jsonl, see tracing.py)
+        with tracing.start_trace("run", mode=self.mode, sheet_backend=self.sheet_backend):
+            return self._run(working_hours, overtime, note)
+
+    def _run(self, working_hours, overtime, note):
         today = datetime.date.today()
         waka_date_str = today.strftime("%Y-%m-%d")
         display_date = today.strftime("%d-%m-%Y")
-        screenshot_path = f"screenshots/wakatime_{waka_date_str}.png"
+        image_name = image_utils.screenshot_name(waka_date_str)
 
         self.log("🚀 Speed Run Initiated...")
 
+        # Excel download runs in the background while we capture
+        journal = self.open_journal(waka_date_str)
+        pipeline = self.start_cloud_pipeline(journal)
+
         # --- STEP 1: LIGHTNING CAPTURE ---
-        if not os.path.exists(self.auth_file):
-            self.log("❌ Error: auth.json missing.")
-            return
+        image = self.resume_capture(journal)
+        if image is not None:
+            pass  # An earlier attempt of this run got past the capture
+        elif self.mode == "api":
+            # No browser at all: render the chart from the day's JSON
+            try:
+                with tracing.span("capture"):
+                    image, chart_ready = api_capture.capture(waka_date_str, self.auth_file, self.user_cookie)
+            except Exception as e:
+                self.log(f"❌ API Capture Error: {e}")
+                if pipeline: pipeline.close()
+                return
+            if not chart_ready:
+                self.log("⚠️ No activity recorded for today.")
+            self.log("📸 Chart Rendered: DONE")
+        else:
+            if not self.has_session():
+                self.log("❌ Error: No WakaTime session (auth.json or session cookie).")
+                if pipeline: pipeline.close()
+                return
 
-        with sync_playwright() as p:
             self.log("⚡ Browser Engine: Start")
-            # ARGS: Disable unnecessary Chrome features for speed
-            browser = p.chromium.launch(
-                headless=True, 
-                args=[
-                    "--no-sandbox", 
-                    "--disable-setuid-sandbox", 
-                    "--disable-extensions", 
-                    "--disable-gpu", 
-                    "--blink-settings=imagesEnabled=false" # Don't even try to render images
-                ]
-            )
-            context = browser.new_context(storage_state=self.auth_file, viewport={"width": 1920, "height": 1080})
-            page = context.new_page()
-            
-            # 1. Enable Aggressive Blocker
-            page.route("**/*", self.intercept_route)
-
+            url = readiness.dashboard_url(waka_date_str)
             try:
-                # 2. Fast Navigation (Don't wait for network idle)
-                url = f"https://wakatime.com/dashboard/day?date={waka_date_str}"
-                page.goto(url, wait_until="domcontentloaded", timeout=15000)
-                
-                # 3. Smart Trigger: Snap as soon as the SVG chart exists
-                # We wait for the specific 'rect' element inside the chart.
-                try:
-                    page.locator("svg >> css=rect").first.wait_for(state="visible", timeout=10000)
-                except:
-                    self.log("⚠️ Chart delayed, snapping anyway...")
-
-                # 4. Instant Screenshot
-                os.makedirs("screenshots", exist_ok=True)
-                page.screenshot(path=screenshot_path)
-                self.log("📸 Screenshot: DONE")
-            
+                if capture_worker.ENABLED:
+                    # Chromium lives in the supervised worker process (memory budget, kill + restart)
+                    image, chart_ready = self.capture_in_worker(waka_date_str)
+                else:
+                    # Borrow a warm browser from the shared pool (no Chromium cold start per click)
+                    state = user_contexts.initial_state(self.auth_file, self.user_cookie)
+                    with tracing.span("capture"):
+                        image, chart_ready = browser_pool.get_pool().run(
+                            lambda context: self.capture(context, url, state),
+                            storage_state=state,
+                            viewport=user_contexts.VIEWPORT
+                        )
             except Exception as e:
                 self.log(f"❌ Browser Error: {e}")
-                browser.close()
+                if pipeline: pipeline.close()
                 return
 
-            browser.close()
+            if not chart_ready:
+                self.log("⚠️ Chart delayed, snapped anyway...")
+            self.log(self.block_stats)
+            self.log("📸 Screenshot: DONE")
+        journal.save_image(image)
 
-        # --- STEP 2: CLOUD SYNC (Parallel-like feel) ---
+        # --- STEP 2: CLOUD SYNC ---
+        self.sync_cloud(image, image_name, display_date, working_hours, overtime, note, pipeline)
+        self.log("✨ Finished!")
+
+    def start_cloud_pipeline(self, journal=None):
+        """Starts the workbook lookup/download right away so it overlaps with the capture."""
+        if not self.folder_id:
+            return None
+        pipeline = CloudPipeline(self.folder_id, log=self.log, sheet_backend=self.sheet_backend, journal=journal)
+        if not (journal and journal.stage(run_journal.ROW)):
+            pipeline.prefetch_workbook()  # A retry whose row already went through may not need the workbook at all
+        return pipeline
+
+    def open_journal(self, waka_date_str):
+        """Today's run journal (see run_journal): a retry skips the stages an earlier attempt finished."""
+        return run_journal.open_run(self.auth_file, self.user_cookie, self.folder_id, waka_date_str)
+
+    def resume_capture(self, journal):
+        """The screenshot an unfinished earlier attempt of this run captured, or None."""
+        image = journal.load_image()
+        if image is not None:
+            self.log("♻️ Resuming: reusing the screenshot from the last attempt")
+        return image
+
+    def sync_cloud(self, image, image_name, display_date, working_hours, overtime, note, pipeline=None):
+        """Uploads the screenshot bytes and updates the Excel log. Returns True when both steps went through."""
+        if not self.folder_id:
+            self.log("❌ Error: No Folder ID.")
+            return False
+
+        self.log("☁️ Syncing Data...")
+        pipeline = pipeline or self.start_cloud_pipeline()
         try:
-            self.log("☁️ Syncing Data...")
-            drive_service = drive_utils.authenticate_google_drive()
-            smart_bot = SmartHandler(drive_service)
+            with tracing.span("cloud"):
+                return pipeline.run(image, image_name, display_date, working_hours, overtime, note)
+        except Exception as e:
+            self.log(f"❌ Cloud Error: {e}")
+            return False
 
-            if not self.folder_id:
-                self.log("❌ Error: No Folder ID.")
-                return
+    def capture(self, context, url, state=None):
+        """
+        Runs on the pool's browser thread, so it reports back via the return value instead of self.log.
+        state is the storage state the context was opened with. Returns (image bytes, chart_ready).
+        """
+        # 1. Session cookie + Aggressive Blocker (once for the whole context)
+        user_contexts.inject(context, self.user_cookie, state)
+        blocker = request_blocker.Blocker().install(context)
+        page = context.new_page()
+        try:
+            return self._snap(page, url)
+        finally:
+            self.block_stats = blocker.summary()
+            self._save_session(context)
+
+    def capture_in_worker(self, waka_date_str):
+        """Browser capture in the capture_worker subprocess. Returns (image bytes, chart_ready)."""
+        with tracing.span("capture.worker"):
+            result = capture_worker.get_worker().capture(self.auth_file, self.user_cookie, waka_date_str)
+            tracing.set_attrs(peak_memory_mb=result["peak_memory_mb"])
+        return self._worker_result(result)
+
+    def _worker_result(self, result):
+        self.block_stats = result["block_stats"]
+        self.log(f"🧠 Capture peak memory: {result['peak_memory_mb']:.0f} MB")
+        return result["image"], result["ready"]
 
-            # A. Upload Image
-            today_folder_id = drive_utils.find_or_create_folder(drive_service, self.folder_id, display_date)
-            drive_utils.upload_file_to_drive(screenshot_path, os.path.basename(screenshot_path), today_folder_id)
-
-            # B. Update Excel (Fast Search)
-            query = f"name contains 'Time update' and '{self.folder_id}' in parents and trashed = false"
-            results = drive_service.files().list(
-                q=query, 
-                fields="files(id, name, mimeType)",
-                includeItemsFromAllDrives=True, 
-                supportsAllDrives=True
-            ).execute()
-            files = results.get('files', [])
-
-            if files:
-                target_file = files[0]
-                self.log(f"📎 Editing: {target_file['name']}")
-                smart_bot.handle_excel_file(target_file['id'], working_hours, overtime, note)
-                self.log("✅ Excel Updated!")
+    def capture_range(self, context, urls, state=None):
+        """Backfill capture: one page walks every URL. Returns {url: (image bytes, chart_ready)}."""
+        user_contexts.inject(context, self.user_cookie, state)
+        blocker = request_blocker.Blocker().install(context)
+        page = context.new_page()
+        try:
+            return {url: self._snap(page, url) for url in urls}
+        finally:
+            self.block_stats = blocker.summary()
+            self._save_session(context)
+
+    def _save_session(self, context):
+        # Keep the cookies WakaTime rotated during the run for the next one
+        try:
+            user_contexts.save_state(context, user_contexts.state_path(self.auth_file, self.user_cookie))
+        except Exception as e:
+            print(f"⚠️ Could not save session state: {e}")
+
+    def _snap(self, page, url):
+        # 2-3. Navigate, wait for the chart's API response, then for the SVG to stop changing
+        report = readiness.wait_until_ready(page, url)
+
+        # 4. Instant Screenshot (clipped to the chart, compressed)
+        return image_utils.capture_chart(page), report["ready"]
+
+    def run_range(self, start, end, entries=None):
+        """
+        Backfill every day from start to end (inclusive) in one go: one browser context,
+        bounded-concurrency uploads and a single workbook download/save/upload.
+        entries maps date -> (working_hours, overtime, note), or is one tuple used for every day.
+        Days without an entry only get their screenshot.
+        """
+        with tracing.start_trace("backfill", mode=self.mode, sheet_backend=self.sheet_backend, start=str(start), end=str(end)):
+            return self._run_range(start, end, entries)
+
+    def _upload_day(self, day, image, file_id=None):
+        """
+        One backfill screenshot, on an upload thread. Its folder ID comes from id_cache (filled by the
+        batch lookup); file_id is the screenshot already in that folder, if any.
+        """
+        service = drive_utils.get_drive_service()
+        return drive_utils.retry_on_stale_id(
+            lambda: drive_utils.find_or_create_folder(service, self.folder_id, day.strftime("%d-%m-%Y")),
+            lambda folder_id: drive_utils.upload_bytes_to_drive(
+                image, image_utils.screenshot_name(day.strftime("%Y-%m-%d")), folder_id, service, file_id=file_id
+            )
+        )
+
+    def _run_range(self, start, end, entries=None):
+        days = [start + datetime.timedelta(days=n) for n in range((end - start).days + 1)]
+        if not days:
+            self.log("❌ Error: Empty date range.")
+            return False
+        if not self.folder_id:
+            self.log("❌ Error: No Folder ID.")
+            return False
+
+        if isinstance(entries, tuple):
+            rows = {day: entries for day in days}
+        else:
+            rows = {day: entry for day, entry in (entries or {}).items() if start <= day <= end}
+
+        shots = {}
+        self.log(f"🚀 Backfill: {days[0]} → {days[-1]} ({len(days)} days)")
+
+        # --- STEP 1: CAPTURE EVERY DAY ---
+        try:
+            if self.mode == "api":
+                for day in days:
+                    shots[day], has_activity = api_capture.capture(day.strftime("%Y-%m-%d"), self.auth_file, self.user_cookie)
+                    if not has_activity:
+                        self.log(f"⚠️ No activity on {day}.")
             else:
-                self.log("⚠️ 'Time update' file not found.")
-                # Debug listing
-                # all_files = drive_service.files().list(q=f"'{self.folder_id}' in parents", fields="files(name)", includeItemsFromAllDrives=True, supportsAllDrives=True).execute()
-                # self.log(f"Files seen: {[f['name'] for f in all_files.get('files', [])]}")
+                if not self.has_session():
+                    self.log("❌ Error: No WakaTime session (auth.json or session cookie).")
+                    return False
+                urls = {readiness.dashboard_url(day.strftime('%Y-%m-%d')): day for day in days}
+                state = user_contexts.initial_state(self.auth_file, self.user_cookie)
+                captured = browser_pool.get_pool().run(
+                    lambda context: self.capture_range(context, urls, state),
+                    job_timeout=browser_pool.JOB_TIMEOUT * len(urls),  # One page per day, walked in sequence
+                    storage_state=state,
+                    viewport=user_contexts.VIEWPORT
+                )
+                for url, (image, chart_ready) in captured.items():
+                    shots[urls[url]] = image
+                    if not chart_ready:
+                        self.log(f"⚠️ Chart delayed, snapped anyway: {url}")
+                self.log(self.block_stats)
+        except Exception as e:
+            self.log(f"❌ Capture Error: {e}")
+            return False
+        self.log(f"📸 Captured {len(shots)} days.")
 
+        # --- STEP 2: UPLOADS (folders resolved in one batch) ---
+        ok = True
+        try:
+            service = drive_utils.get_drive_service()
+            folders = drive_utils.find_or_create_folders(service, self.folder_id, [day.strftime("%d-%m-%Y") for day in days])
+            # Screenshots a previous backfill left there are updated in place, found in one batch
+            existing = drive_utils.find_files_by_name(service, {
+                day: (folders[day.strftime("%d-%m-%Y")], image_utils.screenshot_name(day.strftime("%Y-%m-%d"))) for day in shots
+            })
+            with ThreadPoolExecutor(max_workers=BACKFILL_UPLOAD_CONCURRENCY, thread_name_prefix="backfill") as executor:
+                uploads = {
+                    executor.submit(tracing.bind(self._upload_day), day, image, existing.get(day)): day
+                    for day, image in shots.items()
+                }
+                for future, day in uploads.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self.log(f"❌ Upload Error ({day}): {e}")
+                        ok = False
         except Exception as e:
             self.log(f"❌ Cloud Error: {e}")
+            return False
 
-        self.log("✨ Finished!")
+        # --- STEP 3: ONE EXCEL ROUND TRIP ---
+        if rows and self.sheet_backend == "sheets":
+            try:
+                sheets_bot = SheetHandler()
+
+                def update_sheet(spreadsheet_id):
+                    if spreadsheet_id:
+                        sheets_bot.update_rows(spreadsheet_id, rows)
+                        self.log(f"✅ Sheet Updated! ({len(rows)} rows)")
+                    else:
+                        self.log("⚠️ 'Time update' Google Sheet not found.")
+
+                drive_utils.retry_on_stale_id(lambda: sheets_bot.find_sheet_id_by_name(service, self.folder_id), update_sheet)
+            except Exception as e:
+                self.log(f"❌ Sheet Error: {e}")
+                ok = False
+        elif rows:
+            try:
+                def update_excel(target):
+                    if target:
+                        smart_bot = SmartHandler(service)
+                        smart_bot.commit_updates(target['id'], rows)
+                        self.log(f"✅ Excel Updated! ({len(rows)} rows)")
+                    else:
+                        self.log("⚠️ 'Time update' file not found.")
+
+                drive_utils.retry_on_stale_id(lambda: drive_utils.find_time_update_file(service, self.folder_id), update_excel)
+            except Exception as e:
+                self.log(f"❌ Excel Error: {e}")
+                ok = False
 
-    def intercept_route(self, route):
-        req = route.request
-        # Block everything except the main document and API calls
-        if req.resource_type in self.BLOCK_RESOURCE_TYPES:
-            return route.abort()
-        if any(d in req.url for d in self.BLOCK_DOMAINS):
-            return route.abort()
-        return route.continue_()
\ No newline at end of file
+        self.log("✨ Backfill Finished!")
+        return ok
@@ -0,0 +1,315 @@
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import httplib2
+
+# In-process stand-in for the Drive v3 / Sheets v4 endpoints the app uses, plugged in with
+# drive_utils.set_http_factory(drive.http). googleapiclient builds real requests (static
+# discovery, multipart / resumable uploads, batch bodies) and FakeHttp answers them from a dict,
+# so the client-side cost and the number of round trips are measured, not the network.
+# LATENCY adds a fixed delay per round trip to make extra calls visible in the timings.
+FOLDER_MIME = "application/vnd.google-apps.folder"
+SHEET_MIME = "application/vnd.google-apps.spreadsheet"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_CLAUSE = re.compile(r"^(?:(name|mimeType)\s*(=|contains)\s*'(.*)'|'(.*)'\s+in\s+parents|trashed\s*=\s*(true|false))$")
+_A1 = re.compile(r"^(?:[^!]+!)?([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def _col(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def _matches(item, q):
+    for clause in filter(None, (c.strip() for c in q.split(" and "))):
+        m = _CLAUSE.match(clause)
+        if not m:
+            raise ValueError(f"Unsupported query clause: {clause}")
+        field, op, value, parent, trashed = m.groups()
+        if parent is not None:
+            if parent not in item["parents"]:
+                return False
+        elif trashed is not None:
+            if item["trashed"] != (trashed == "true"):
+                return False
+        elif op == "=":
+            if item[field] != value:
+                return False
+        elif value not in item[field]:
+            return False
+    return True
+
+
+class FakeDrive:
+    """Files, folders and sheets held in memory. Thread-safe: one FakeHttp per thread shares it."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.files = {}
+        self.sheets = {}
+        self.calls = {}          # Per endpoint, batched calls included
+        self.round_trips = 0     # HTTP requests actually made (a batch is one)
+        self._sessions = {}
+        self.fail_every = 0      # > 0: every Nth resumable chunk is answered 503 (retry/resume benchmarks)
+        self._chunks = 0
+        self._lock = threading.Lock()
+
+    # --- SEEDING ---
+    def add(self, name, parents=(), mime_type=None, content=None, rows=None):
+        file_id = uuid.uuid4().hex
+        with self._lock:
+            self.files[file_id] = {
+                "id": file_id, "name": name, "mimeType": mime_type or ("application/octet-stream" if content is not None else FOLDER_MIME),
+                "parents": list(parents), "trashed": False, "content": content, "headRevisionId": "1",
+            }
+            if rows is not None:
+                self.sheets[file_id] = [list(r) for r in rows]
+        return file_id
+
+    def content(self, file_id):
+        return self.files[file_id]["content"]
+
+    def named(self, name):
+        with self._lock:
+            return [f["id"] for f in self.files.values() if f["name"] == name]
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {}
+            self.round_trips = 0
+
+    def http(self):
+        return FakeHttp(self)
+
+    # --- METADATA ---
+    @staticmethod
+    def _meta(item):
+        meta = {k: v for k, v in item.items() if k not in ("content", "trashed")}
+        if item["content"] is not None:
+            meta["md5Checksum"] = hashlib.md5(item["content"]).hexdigest()
+            meta["size"] = str(len(item["content"]))
+        return meta
+
+    def _write(self, file_id, metadata, content):
+        item = self.files.get(file_id)
+        if item is None:
+            return None
+        item.update({k: v for k, v in (metadata or {}).items() if k in ("name", "mimeType")})
+        if content is not None:
+            item["content"] = content
+            item["headRevisionId"] = str(int(item["headRevisionId"]) + 1)
+        return self._meta(item)
+
+    def _create(self, metadata, content):
+        file_id = uuid.uuid4().hex
+        self.files[file_id] = {
+            "id": file_id, "name": metadata.get("name", "Untitled"),
+            "mimeType": metadata.get("mimeType") or ("application/octet-stream" if content is not None else FOLDER_MIME),
+            "parents": metadata.get("parents", []), "trashed": False, "content": content, "headRevisionId": "1",
+        }
+        return self._meta(self.files[file_id])
+
+    # --- DISPATCH ---
+    def handle(self, method, uri, body, headers):
+        """-> (status, headers, body bytes) for one HTTP request."""
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(uri)
+        path, query = parts.path, _query(parts.query)
+        if hasattr(body, "read"):
+            body = body.read()  # Resumable chunks arrive as a stream slice
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+
+        with self._lock:
+            self.round_trips += 1
+            route = self._route(method, path)
+            self.calls[route] = self.calls.get(route, 0) + 1
+            if route == "batch":
+                return self._batch(body, headers)
+            return self._dispatch(route, method, path, query, body, headers)
+
+    @staticmethod
+    def _route(method, path):
+        if path.startswith("/batch/"):
+            return "batch"
+        if path.startswith("/upload/session/"):
+            return "upload.session"
+        if "/values/" in path and path.endswith(":append"):
+            return "sheets.append"
+        if "/values:" in path:
+            return "sheets." + path.rsplit(":", 1)[1]
+        if path.startswith("/upload/drive/v3/files"):
+            return "upload." + ("update" if path.count("/") > 4 else "create")
+        if path == "/drive/v3/files":
+            return "files.list" if method == "GET" else "files.create"
+        if path.startswith("/drive/v3/files/"):
+            return "files.get" if method == "GET" else "files.update"
+        return "unknown"
+
+    def _dispatch(self, route, method, path, query, body, headers):
+        if route == "files.list":
+            found = [self._meta(f) for f in self.files.values() if _matches(f, query.get("q", ""))]
+            return _json(200, {"files": found})
+        if route == "files.create":
+            return _json(200, self._create(json.loads(body or b"{}"), None))
+        if route in ("files.get", "files.update"):
+            file_id = unquote(path.rsplit("/", 1)[1])
+            item = self.files.get(file_id)
+            if item is None:
+                return _json(404, {"error": {"code": 404, "message": f"File not found: {file_id}"}})
+            if route == "files.update":
+                return _json(200, self._write(file_id, json.loads(body or b"{}"), None))
+            if query.get("alt") == "media":
+                return 200, {"content-type": item["mimeType"], "content-length": str(len(item["content"] or b""))}, item["content"] or b""
+            return _json(200, self._meta(item))
+        if route in ("upload.create", "upload.update"):
+            file_id = unquote(path.rsplit("/", 1)[1]) if route == "upload.update" else None
+            if file_id is not None and file_id not in self.files:
+                return _json(404, {"error": {"code": 404, "message": f"File not found: {file_id}"}})
+            return self._upload(query.get("uploadType"), file_id, body, headers)
+        if route == "upload.session":
+            return self._resume(path.rsplit("/", 1)[1], body, headers)
+        if route.startswith("sheets."):
+            spreadsheet_id = path.split("/")[3]
+            if spreadsheet_id not in self.sheets:
+                return _json(404, {"error": {"code": 404, "message": "Requested entity was not found."}})
+            return self._sheets(route, spreadsheet_id, path, query, body)
+        return _json(400, {"error": {"code": 400, "message": f"Fake Google API: no route for {method} {path}"}})
+
+    # --- UPLOADS ---
+    def _finish_upload(self, file_id, metadata, content):
+        if file_id is None:
+            return _json(200, self._create(metadata, content))
+        return _json(200, self._write(file_id, metadata, content))
+
+    def _upload(self, upload_type, file_id, body, headers):
+        if upload_type == "media":
+            return self._finish_upload(file_id, {}, body)
+        if upload_type == "multipart":
+            message = BytesParser().parsebytes(b"Content-Type: " + headers["content-type"].encode() + b"\r\n\r\n" + body)
+            metadata, media = message.get_payload()
+            return self._finish_upload(file_id, json.loads(metadata.get_payload(decode=True) or b"{}"), media.get_payload(decode=True))
+        if upload_type == "resumable":
+            session = uuid.uuid4().hex
+            self._sessions[session] = {"file_id": file_id, "metadata": json.loads(body or b"{}"), "data": bytearray()}
+            return 200, {"location": f"https://www.googleapis.com/upload/session/{session}"}, b""
+        return _json(400, {"error": {"code": 400, "message": f"Unsupported uploadType {upload_type}"}})
+
+    def _resume(self, session_id, body, headers):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return _json(404, {"error": {"code": 404, "message": "Upload session expired"}})
+        if body and self.fail_every:
+            self._chunks += 1
+            if self._chunks % self.fail_every == 0:  # Chunk dropped on the floor, like a backend hiccup
+                return _json(503, {"error": {"code": 503, "message": "Backend Error"}})
+        m = re.match(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", headers.get("content-range", ""))
+        if m and m.group(1) is not None:
+            session["data"][int(m.group(1)):] = body or b""
+        total = m.group(3) if m else None
+        if total is not None and total != "*" and len(session["data"]) >= int(total):
+            del self._sessions[session_id]
+            return self._finish_upload(session["file_id"], session["metadata"], bytes(session["data"]))
+        received = len(session["data"])
+        return 308, ({"range": f"bytes=0-{received - 1}"} if received else {}), b""
+
+    # --- SHEETS ---
+    def _read_range(self, rows, a1):
+        m = _A1.match(a1)
+        c0, r0, c1, r1 = m.group(1), m.group(2), m.group(3) or m.group(1), m.group(4) or m.group(2)
+        first, last = (int(r0) if r0 else 1), (int(r1) if r1 else len(rows))
+        values = []
+        for row in rows[first - 1:last]:
+            values.append(row[_col(c0):_col(c1) + 1])
+        while values and not any(values[-1]):
+            values.pop()
+        return {"range": a1, "majorDimension": "ROWS", **({"values": values} if values else {})}
+
+    def _sheets(self, route, spreadsheet_id, path, query, body):
+        rows = self.sheets[spreadsheet_id]
+        if route == "sheets.batchGet":
+            return _json(200, {"spreadsheetId": spreadsheet_id, "valueRanges": [self._read_range(rows, r) for r in query["ranges"]]})
+        if route == "sheets.batchUpdate":
+            request = json.loads(body)
+            for item in request.get("data", []):
+                m = _A1.match(item["range"])
+                start_col, start_row = _col(m.group(1)), int(m.group(2))
+                for offset, values in enumerate(item["values"]):
+                    while len(rows) < start_row + offset:
+                        rows.append([])
+                    row = rows[start_row + offset - 1]
+                    row.extend([""] * (start_col + len(values) - len(row)))
+                    row[start_col:start_col + len(values)] = values
+            return _json(200, {"spreadsheetId": spreadsheet_id, "totalUpdatedCells": sum(len(v) for d in request.get("data", []) for v in d["values"])})
+        if route == "sheets.append":
+            values = json.loads(body)["values"]
+            # Like Sheets: the table ends at the last row with any value, whatever column it is in
+            end = max((n + 1 for n, row in enumerate(rows) if any(row)), default=0)
+            del rows[end:]
+            rows.extend(list(v) for v in values)
+            sheet = unquote(path.split("/")[5]).split("!")[0]
+            updated = f"{sheet}!A{end + 1}:{chr(64 + max(len(v) for v in values))}{end + len(values)}"
+            return _json(200, {"spreadsheetId": spreadsheet_id, "updates": {"updatedRange": updated, "updatedRows": len(values)}})
+        return _json(400, {"error": {"code": 400, "message": f"Unsupported {route}"}})
+
+    # --- BATCH ---
+    def _batch(self, body, headers):
+        message = BytesParser().parsebytes(b"Content-Type: " + headers["content-type"].encode() + b"\r\n\r\n" + body)
+        boundary = "batch_" + uuid.uuid4().hex
+        out = []
+        for part in message.get_payload():
+            request = part.get_payload(decode=True)
+            sep = b"\r\n\r\n" if b"\r\n\r\n" in request else b"\n\n"
+            head, _, inner_body = request.partition(sep)
+            lines = head.decode("utf-8").splitlines()
+            method, target = lines[0].split(" ")[:2]
+            inner_headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+            parts = urlsplit(target)
+            route = self._route(method, parts.path)
+            self.calls[route] = self.calls.get(route, 0) + 1
+            query = _query(parts.query)
+            status, _, payload = self._dispatch(route, method, parts.path, query, inner_body, {k.lower(): v for k, v in inner_headers.items()})
+            content_id = " ".join(part.get("Content-ID", "<>").split())  # Long headers come back folded
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n\r\n".encode("utf-8")
+                + payload + b"\r\n"
+            )
+        data = b"".join(out) + f"--{boundary}--\r\n".encode("utf-8")
+        return 200, {"content-type": f"multipart/mixed; boundary={boundary}"}, data
+
+
+def _query(qs):
+    # ranges repeats in values:batchGet; every other parameter is single-valued
+    return {k: (v if k == "ranges" else v[-1]) for k, v in parse_qs(qs).items()}
+
+
+def _json(status, payload):
+    return status, {"content-type": "application/json; charset=UTF-8"}, json.dumps(payload).encode("utf-8")
+
+
+class FakeHttp:
+    """The httplib2.Http surface googleapiclient uses: request() -> (Response, bytes)."""
+
+    def __init__(self, drive):
+        self.drive = drive
+        self.timeout = None
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        status, resp_headers, data = self.drive.handle(method, uri, body, headers)
+        response = httplib2.Response({"status": str(status), **resp_headers})
+        return response, data
+
+    def close(self):
+        pass
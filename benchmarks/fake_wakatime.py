@@ -0,0 +1,169 @@
+import json
+import time
+import hashlib
+import datetime
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for the WakaTime dashboard: point WAKATIME_BASE_URL at server.url and the
+# browser / API capture paths run unchanged. It mimics what the real page makes us wait for:
+#   - /dashboard/day: HTML that pulls a cacheable JS bundle + stylesheet and a few third-party
+#     trackers (which request_blocker should drop),
+#   - the bundle fetches /api/v1/users/current/durations and answers after api_delay seconds,
+#   - then draws the <svg> chart in several animation frames, like the real chart settling.
+PROJECTS = ["wakatime-screenshot-capture", "api", "infra", "docs", "frontend"]
+BUNDLE_PADDING = 300 * 1024  # The real dashboard bundle is a few hundred KB
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>WakaTime Dashboard</title>
+<link rel="stylesheet" href="/static/app.{version}.css">
+<link rel="stylesheet" href="https://fonts.googleapis.com/css?family=Open+Sans">
+<script async src="https://www.googletagmanager.com/gtag/js?id=UA-0"></script>
+<script async src="https://widget.intercom.io/widget/bench"></script>
+</head><body>
+<div class="header"><img src="/static/logo.png" alt=""><h1>Coding activity for {date}</h1></div>
+<div id="chart"></div>
+<script src="/static/app.{version}.js"></script>
+</body></html>"""
+
+APP_JS = """(function () {
+  const date = new URLSearchParams(location.search).get('date');
+  const NS = 'http://www.w3.org/2000/svg';
+  setTimeout(() => fetch('/api/v1/users/current/durations?date=' + date)
+    .then(r => r.json())
+    .then(payload => {
+      const rows = payload.data || [];
+      if (!rows.length) { document.getElementById('chart').textContent = 'No activity'; return; }
+      const svg = document.createElementNS(NS, 'svg');
+      svg.setAttribute('width', '1200'); svg.setAttribute('height', String(40 + 30 * rows.length));
+      document.getElementById('chart').appendChild(svg);
+      let i = 0;
+      const frame = () => {
+        const d = rows[i];
+        const rect = document.createElementNS(NS, 'rect');
+        rect.setAttribute('x', String(220 + (d.time % 86400) / 86400 * 960));
+        rect.setAttribute('y', String(20 + 30 * (i % 5)));
+        rect.setAttribute('width', String(Math.max(2, d.duration / 86400 * 960)));
+        rect.setAttribute('height', '20');
+        rect.setAttribute('fill', d.color);
+        svg.appendChild(rect);
+        if (++i < rows.length) requestAnimationFrame(frame);
+      };
+      requestAnimationFrame(frame);
+    }), __SCRIPT_DELAY__);
+})();
+/* __PADDING__ */"""
+
+APP_CSS = "body{background:#222;color:#eee;font-family:sans-serif}#chart svg{display:block;margin:20px}\n/* %s */"
+
+
+def durations(waka_date_str, n=24):
+    """Deterministic fake day: n coding sessions spread over the day, or none on Sundays."""
+    day = datetime.datetime.strptime(waka_date_str, "%Y-%m-%d")
+    if day.weekday() == 6:
+        return {"data": [], "start": day.isoformat() + "Z"}
+    start = day.replace(tzinfo=datetime.timezone.utc).timestamp()
+    palette = ["#ff5722", "#2ecc71", "#3498db", "#9b59b6", "#f1c40f"]
+    data = []
+    for i in range(n):
+        project = PROJECTS[i % len(PROJECTS)]
+        data.append({
+            "project": project, "time": start + 8 * 3600 + i * 1200, "duration": 600 + (i * 37) % 500,
+            "color": palette[i % len(palette)],
+        })
+    return {"data": data, "start": day.isoformat() + "Z", "end": (day + datetime.timedelta(days=1)).isoformat() + "Z"}
+
+
+class FakeWakaTime:
+    """Threaded local HTTP server. Counts requests per kind so a run can report what it loaded."""
+
+    def __init__(self, api_delay=0.2, script_delay=50, sessions=24, port=0):
+        self.api_delay = api_delay
+        self.sessions = sessions
+        self.hits = {}
+        self._lock = threading.Lock()
+        padding = "x" * BUNDLE_PADDING
+        self.assets = {
+            "js": APP_JS.replace("__SCRIPT_DELAY__", str(script_delay)).replace("__PADDING__", padding).encode("utf-8"),
+            "css": (APP_CSS % padding[:BUNDLE_PADDING // 10]).encode("utf-8"),
+        }
+        self.version = hashlib.sha256(self.assets["js"]).hexdigest()[:10]
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, kind):
+        with self._lock:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def reset_hits(self):
+        with self._lock:
+            self.hits = {}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                if parts.path == "/dashboard/day":
+                    server._count("page")
+                    date = query.get("date", datetime.date.today().isoformat())
+                    body = PAGE.format(version=server.version, date=date).encode("utf-8")
+                    return self._send(200, body, "text/html; charset=utf-8", {"Cache-Control": "no-store"})
+                if parts.path.startswith("/static/app."):
+                    kind = parts.path.rsplit(".", 1)[1]
+                    server._count(f"asset.{kind}")
+                    etag = f'"{server.version}-{kind}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, b"", "text/plain", {"ETag": etag})
+                    content_type = "application/javascript" if kind == "js" else "text/css"
+                    return self._send(200, server.assets[kind], content_type, {
+                        "Cache-Control": "public, max-age=31536000, immutable", "ETag": etag,
+                    })
+                if parts.path == "/api/v1/users/current/durations":
+                    server._count("api")
+                    time.sleep(server.api_delay)
+                    date = query.get("date", datetime.date.today().isoformat())
+                    body = json.dumps(durations(date, server.sessions)).encode("utf-8")
+                    return self._send(200, body, "application/json", {"Cache-Control": "no-store"})
+                server._count("other")
+                self._send(404, b"not found", "text/plain")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-wakatime", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
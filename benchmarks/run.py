@@ -0,0 +1,489 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import resource
+import statistics
+import subprocess
+import importlib.util
+
+from benchmarks import fake_google, fake_wakatime, workbooks
+
+# Offline benchmarks: the real code paths (OfficeAutomator.run, main.capture_and_sync, the
+# Excel / Sheets handlers, the cloud pipeline) against local stand-ins for WakaTime
+# (fake_wakatime, a local HTTP server) and Google Drive / Sheets (fake_google, answered
+# in-process through drive_utils.set_http_factory). No credentials, no network.
+#
+#   python -m benchmarks.run                              # every case, table on stdout
+#   python -m benchmarks.run -k smart_handler --rows 100000
+#   python -m benchmarks.run --save benchmarks/baseline.json
+#   python -m benchmarks.run --baseline benchmarks/baseline.json   # exit 1 on a regression
+#
+# Each case runs in its own subprocess so its peak RSS is its own. Reported per case:
+# p50 / p95 latency, the median of each trace stage (capture, cloud, workbook.*, ...),
+# Google API round trips per run, and peak RSS of the worker and of its largest child (Chromium).
+BENCH_DIR = os.environ.get("BENCH_DIR", "cache/bench")
+DEFAULT_ROWS = "1000,10000,100000"
+OPENPYXL_MAX_ROWS = 10000   # Full openpyxl load/save is the slow path xlsx_patch avoids; 100k rows takes minutes
+NOISE_FLOOR_MS = 5          # Latency differences below this never count as a regression
+
+CASES = {}
+
+
+class Case:
+    def __init__(self, name, fn, needs, sized, variants):
+        self.name = name
+        self.fn = fn
+        self.needs = needs
+        self.sized = sized
+        self.variants = variants
+
+    def expand(self, sizes):
+        """-> [(full name, n_rows, variant)] e.g. smart_handler.commit/10000/cold"""
+        out = []
+        for n in (sizes if self.sized else [None]):
+            if self.name == "openpyxl.load_save" and n > OPENPYXL_MAX_ROWS:
+                continue
+            for variant in self.variants:
+                parts = [self.name] + ([str(n)] if n else []) + ([variant] if variant else [])
+                out.append(("/".join(parts), n, variant))
+        return out
+
+
+def case(name, needs=(), sized=False, variants=(None,)):
+    def register(fn):
+        CASES[name] = Case(name, fn, needs, sized, variants)
+        return fn
+    return register
+
+
+def missing_needs(needs):
+    return [module for module in needs if importlib.util.find_spec(module) is None]
+
+
+# --- ENVIRONMENT (worker side) ---
+class Bench:
+    """One worker's world: a fake Drive with a team folder, the fake WakaTime server, isolated caches."""
+
+    def __init__(self, bench_dir, state_dir, api_latency, wakatime):
+        import drive_utils
+
+        self.dir = bench_dir
+        self.state_dir = state_dir
+        self.wakatime = wakatime
+        self.drive = fake_google.FakeDrive(latency=api_latency)
+        drive_utils.set_http_factory(self.drive.http)
+        self.root = self.drive.add("Team folder")
+        self.auth_file = os.path.join(state_dir, "auth.json")
+        with open(self.auth_file, "w") as f:
+            json.dump({"cookies": [], "origins": []}, f)
+
+    def workbook(self, n_rows):
+        return self.drive.add("Time update.xlsx", [self.root], fake_google.XLSX_MIME, workbooks.workbook_bytes(self.dir, n_rows))
+
+    def sheet(self, n_rows):
+        return self.drive.add("Time update", [self.root], fake_google.SHEET_MIME, rows=workbooks.sheet_rows(n_rows))
+
+    def reset_caches(self):
+        """Cold start: drop the Drive ID cache, the local workbook copy and the row index."""
+        import file_cache
+        import id_cache
+        import row_index
+
+        shutil.rmtree(file_cache.CACHE_DIR, ignore_errors=True)
+        for store in (id_cache._store, row_index._store):
+            with store.lock:
+                store.data.clear()
+                if os.path.exists(store.path):
+                    os.remove(store.path)
+
+
+class _Log:
+    """logger= for OfficeAutomator / CloudPipeline: silent, but a ❌ line fails the run."""
+
+    def __init__(self):
+        self.errors = []
+
+    def __call__(self, message):
+        if str(message).startswith("❌"):
+            self.errors.append(str(message))
+
+    def check(self):
+        if self.errors:
+            raise RuntimeError(self.errors[0])
+
+
+def _today_rows():
+    return {datetime.date.today(): ("8", "1", "bench")}
+
+
+def _screenshot():
+    # Incompressible, about the size of a webp chart capture
+    return os.urandom(40 * 1024)
+
+
+# --- CASES: each returns (prepare, step); prepare runs untimed before every step ---
+@case("xlsx_patch.apply_updates", sized=True)
+def bench_xlsx_patch(bench, n_rows, variant):
+    from smart_handler import SmartHandler
+
+    data = workbooks.workbook_bytes(bench.dir, n_rows)
+    handler = SmartHandler(None)
+    return None, lambda: handler.apply_updates(io.BytesIO(data), _today_rows())
+
+
+@case("openpyxl.load_save", sized=True)
+def bench_openpyxl(bench, n_rows, variant):
+    import openpyxl
+
+    data = workbooks.workbook_bytes(bench.dir, n_rows)
+
+    def step():
+        wb = openpyxl.load_workbook(io.BytesIO(data))
+        wb.save(io.BytesIO())
+    return None, step
+
+
+@case("smart_handler.commit_updates", sized=True, variants=("cold", "warm"))
+def bench_smart_handler(bench, n_rows, variant):
+    import drive_utils
+    from smart_handler import SmartHandler
+
+    file_id = bench.workbook(n_rows)
+    handler = SmartHandler(drive_utils.get_drive_service())
+    return (bench.reset_caches if variant == "cold" else None), lambda: handler.commit_updates(file_id, _today_rows())
+
+
+@case("excel_utils.roundtrip", sized=True)
+def bench_excel_utils(bench, n_rows, variant):
+    # main.py's Excel step: find -> download -> patch -> upload
+    import drive_utils
+    import excel_utils
+
+    bench.workbook(n_rows)
+    service = drive_utils.get_drive_service()
+    date_str = datetime.date.today().strftime("%d-%m-%Y")
+
+    def step():
+        excel_id = excel_utils.find_excel_file(service, bench.root)
+        workbook = excel_utils.download_excel(service, excel_id)
+        if not excel_utils.update_excel_row(workbook, date_str, "8", "1", "bench"):
+            raise RuntimeError(f"{date_str} not found in the workbook")
+        excel_utils.upload_excel_update(service, workbook, excel_id)
+    return bench.reset_caches, step
+
+
+@case("sheet_handler.update_rows", sized=True, variants=("cold", "warm"))
+def bench_sheet_handler(bench, n_rows, variant):
+    from sheet_handler import SheetHandler
+
+    spreadsheet_id = bench.sheet(n_rows)
+    handler = SheetHandler()
+    return (bench.reset_caches if variant == "cold" else None), lambda: handler.update_rows(spreadsheet_id, _today_rows())
+
+
+@case("drive_utils.upload_bytes", variants=("64k", "8m", "8m-flaky"))
+def bench_upload(bench, n_rows, variant):
+    # 8 MB is above RESUMABLE_THRESHOLD: exercises the resumable session path.
+    # 8m-flaky sends it in 1 MB chunks and fails every third one: measures retry + resume cost.
+    import drive_utils
+
+    if variant == "8m-flaky":
+        drive_utils.UPLOAD_CHUNK_SIZE = 1024 * 1024
+        drive_utils.BACKOFF_BASE = 0.01
+        bench.drive.fail_every = 3
+    data = os.urandom(64 * 1024 if variant == "64k" else 8 * 1024 * 1024)
+    service = drive_utils.get_drive_service()
+    return None, lambda: drive_utils.upload_bytes_to_drive(data, "bench.bin", bench.root, service)
+
+
+@case("drive_utils.find_or_create_folders")
+def bench_folders(bench, n_rows, variant):
+    # A month of backfill folders resolved through the batch API
+    import drive_utils
+
+    names = [(datetime.date.today() - datetime.timedelta(days=n)).strftime("%d-%m-%Y") for n in range(31)]
+    service = drive_utils.get_drive_service()
+    return bench.reset_caches, lambda: drive_utils.find_or_create_folders(service, bench.root, names)
+
+
+@case("cloud_pipeline.run", sized=True, variants=("xlsx-cold", "xlsx-warm", "sheets"))
+def bench_cloud(bench, n_rows, variant):
+    # The cloud step of OfficeAutomator.run on its own (screenshot upload + timesheet row)
+    from cloud_pipeline import CloudPipeline
+
+    backend = "sheets" if variant == "sheets" else "xlsx"
+    if backend == "sheets":
+        bench.sheet(n_rows)
+    else:
+        bench.workbook(n_rows)
+    image = _screenshot()
+    today = datetime.date.today()
+
+    def step():
+        log = _Log()
+        pipeline = CloudPipeline(bench.root, log=log, sheet_backend=backend)
+        pipeline.prefetch_workbook()
+        ok = pipeline.run(image, f"bench_{today}.webp", today.strftime("%d-%m-%Y"), "8", "1", "bench")
+        log.check()
+        if not ok:
+            raise RuntimeError("Cloud pipeline reported a failure")
+    return (bench.reset_caches if variant == "xlsx-cold" else None), step
+
+
+@case("api_capture.capture")
+def bench_api_capture(bench, n_rows, variant):
+    import api_capture
+
+    date = datetime.date.today().strftime("%Y-%m-%d")
+    return None, lambda: api_capture.capture(date, bench.auth_file, "bench-session")
+
+
+@case("automation.run", needs=("playwright",), sized=True, variants=("api", "browser"))
+def bench_automator(bench, n_rows, variant):
+    from automation import OfficeAutomator
+
+    bench.workbook(n_rows)
+
+    def step():
+        log = _Log()
+        bot = OfficeAutomator(logger=log, mode=variant, sheet_backend="xlsx")
+        bot.folder_id = bench.root
+        bot.auth_file = bench.auth_file
+        bot.user_cookie = "bench-session"
+        bot.run("8", "1", "bench")
+        log.check()
+    return None, step
+
+
+@case("main.capture_and_sync", needs=("playwright",), sized=True)
+def bench_main(bench, n_rows, variant):
+    # main.main_workflow minus the input() prompts
+    import image_utils
+    import main
+
+    bench.workbook(n_rows)
+    today = datetime.date.today()
+    waka_date_str = today.strftime("%Y-%m-%d")
+    screenshot_name = image_utils.screenshot_name(waka_date_str)
+
+    def step():
+        before = len(bench.drive.named(screenshot_name))
+        main.capture_and_sync(bench.root, waka_date_str, today.strftime("%d-%m-%Y"), screenshot_name,
+                              bench.auth_file, "8", "1", "bench")
+        if len(bench.drive.named(screenshot_name)) == before:
+            raise RuntimeError("No screenshot reached the fake Drive")
+    return None, step
+
+
+# --- WORKER ---
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_worker(args):
+    name, n_rows, variant = args.worker, args.n_rows, args.variant
+    state_dir = os.path.join(args.bench_dir, f"state-{os.getpid()}")
+    shutil.rmtree(state_dir, ignore_errors=True)
+    os.makedirs(state_dir)
+
+    wakatime = fake_wakatime.FakeWakaTime(api_delay=args.wakatime_delay_ms / 1000).start()
+    # Module-level settings are read at import time: set them before importing the app
+    os.environ.update({
+        "WAKATIME_BASE_URL": wakatime.url,
+        "DRIVE_FILE_CACHE_DIR": os.path.join(state_dir, "files"),
+        "DRIVE_ID_CACHE_FILE": os.path.join(state_dir, "drive_ids.json"),
+        "ROW_INDEX_FILE": os.path.join(state_dir, "row_index.json"),
+        "ASSET_CACHE_DIR": os.path.join(state_dir, "assets"),
+        "SESSION_STATE_DIR": os.path.join(state_dir, "sessions"),
+        "TRACE_FILE": os.path.join(args.bench_dir, "traces.jsonl"),
+        "CHART_TIMINGS_FILE": os.path.join(args.bench_dir, "readiness.jsonl"),
+        "WRITE_BEHIND_DELAY": str(args.write_behind_delay),
+    })
+    import tracing
+
+    bench = Bench(args.bench_dir, state_dir, args.api_latency_ms / 1000, wakatime)
+    prepare, step = CASES[name].fn(bench, n_rows, variant)
+
+    latencies, round_trips, stages, calls = [], [], {}, {}
+    try:
+        for i in range(args.warmup + args.repeat):
+            if prepare:
+                prepare()
+            bench.drive.reset_calls()
+            with tracing.start_trace(f"bench.{name}") as trace:
+                start = time.perf_counter()
+                step()
+                elapsed = time.perf_counter() - start
+            if i < args.warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            round_trips.append(bench.drive.round_trips)
+            for route, n in bench.drive.calls.items():
+                calls[route] = calls.get(route, 0) + n
+            for s in trace.spans:
+                if s is not trace.root:
+                    stages.setdefault(s.name, []).append((s.duration or 0) * 1000)
+    finally:
+        if "playwright" in CASES[name].needs and "browser_pool" in sys.modules:
+            sys.modules["browser_pool"].get_pool().shutdown()  # Reaps Chromium so RUSAGE_CHILDREN sees it
+        wakatime.stop()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(_percentile(latencies, 0.95), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "runs": len(latencies),
+        "api_round_trips": statistics.median(round_trips),
+        "api_calls": {route: n / len(latencies) for route, n in sorted(calls.items())},
+        "stages_p50_ms": {k: round(statistics.median(v), 2) for k, v in sorted(stages.items())},
+        "wakatime_requests": dict(sorted(wakatime.hits.items())),
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "child_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+# --- DRIVER ---
+def _worker_command(args, name, n_rows, variant, out_path):
+    cmd = [
+        sys.executable, "-m", "benchmarks.run", "--worker", name, "--out", out_path,
+        "--bench-dir", args.bench_dir, "--repeat", str(args.repeat), "--warmup", str(args.warmup),
+        "--api-latency-ms", str(args.api_latency_ms), "--wakatime-delay-ms", str(args.wakatime_delay_ms),
+        "--write-behind-delay", str(args.write_behind_delay),
+    ]
+    if n_rows:
+        cmd += ["--n-rows", str(n_rows)]
+    if variant:
+        cmd += ["--variant", variant]
+    return cmd
+
+
+def run_all(args):
+    sizes = [int(n) for n in args.rows.split(",") if n.strip()]
+    selected = [
+        (full, c, n, v) for c in CASES.values() for full, n, v in c.expand(sizes)
+        if not args.k or any(k in full for k in args.k)
+    ]
+    results = {}
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(args.bench_dir, exist_ok=True)
+    for full, c, n_rows, variant in selected:
+        missing = missing_needs(c.needs)
+        if missing:
+            results[full] = {"skipped": f"needs {', '.join(missing)}"}
+            print(f"-- {full}: skipped ({results[full]['skipped']})", file=sys.stderr)
+            continue
+        print(f"-- {full} ...", file=sys.stderr, flush=True)
+        out_path = os.path.join(args.bench_dir, f"result-{os.getpid()}.json")
+        proc = subprocess.run(
+            _worker_command(args, c.name, n_rows, variant, out_path), cwd=repo,
+            stdout=None if args.verbose else subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if proc.returncode != 0 or not os.path.exists(out_path):
+            results[full] = {"error": (proc.stderr.strip().splitlines() or ["worker failed"])[-1]}
+        else:
+            with open(out_path, "r") as f:
+                results[full] = json.load(f)
+            os.remove(out_path)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """-> [regression messages]: slower p50, more API round trips, or more memory than the baseline."""
+    problems = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before or "p50_ms" not in now or "p50_ms" not in before:
+            continue
+        if now["p50_ms"] > before["p50_ms"] * (1 + threshold) and now["p50_ms"] - before["p50_ms"] > NOISE_FLOOR_MS:
+            problems.append(f"{name}: p50 {before['p50_ms']:.1f}ms -> {now['p50_ms']:.1f}ms")
+        if now["api_round_trips"] > before["api_round_trips"]:
+            problems.append(f"{name}: API round trips {before['api_round_trips']} -> {now['api_round_trips']}")
+        for key in ("peak_rss_mb", "child_peak_rss_mb"):
+            if before.get(key) and now[key] > before[key] * (1 + threshold):
+                problems.append(f"{name}: {key} {before[key]:.0f} -> {now[key]:.0f}")
+    for name, now in results.items():
+        if "error" in now:
+            problems.append(f"{name}: {now['error']}")
+    return problems
+
+
+def print_table(results):
+    print(f"{'case':<46} {'p50':>9} {'p95':>9} {'api':>5} {'rss':>7} {'child':>7}  stages (p50)")
+    for name, r in results.items():
+        if "p50_ms" not in r:
+            print(f"{name:<46} {r.get('skipped') or 'ERROR: ' + r.get('error', '')}")
+            continue
+        top = sorted(r["stages_p50_ms"].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        stages = ", ".join(f"{k} {v:.0f}ms" for k, v in top)
+        print(
+            f"{name:<46} {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['api_round_trips']:>5g} "
+            f"{r['peak_rss_mb']:>5.0f}MB {r['child_peak_rss_mb']:>5.0f}MB  {stages}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against fake WakaTime / Google endpoints.")
+    parser.add_argument("-k", action="append", help="Only cases whose name contains this (repeatable)")
+    parser.add_argument("--rows", default=DEFAULT_ROWS, help=f"Workbook sizes for sized cases (default {DEFAULT_ROWS})")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--api-latency-ms", type=float, default=30, help="Added to every fake Google round trip")
+    parser.add_argument("--wakatime-delay-ms", type=float, default=200, help="Fake durations API response time")
+    parser.add_argument("--write-behind-delay", type=float, default=0,
+                        help="WRITE_BEHIND_DELAY for the workers (0: measure the work, not the coalescing wait)")
+    parser.add_argument("--bench-dir", default=BENCH_DIR)
+    parser.add_argument("--baseline", help="Compare against this results file; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown / memory growth (0.25 = 25%%)")
+    parser.add_argument("--save", help="Write the results as JSON (e.g. a new baseline)")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    # Internal: one case in this process
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--n-rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = run_worker(args)
+        with open(args.out, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    if args.list:
+        sizes = [int(n) for n in args.rows.split(",") if n.strip()]
+        for c in CASES.values():
+            for full, _, _ in c.expand(sizes):
+                print(full + (f"  (needs {', '.join(c.needs)})" if c.needs else ""))
+        return 0
+
+    results = run_all(args)
+    print_table(results)
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.threshold)
+        if problems:
+            print("\n❌ Regressions against " + args.baseline + ":")
+            for p in problems:
+                print(f"   - {p}")
+            return 1
+        print(f"\n✅ No regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
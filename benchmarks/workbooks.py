@@ -0,0 +1,45 @@
+import os
+import datetime
+
+import openpyxl
+
+import json_store
+
+# Synthetic "Time update" workbooks shaped like the real one: a header row, then
+# [Date, User, Working Hours, Overtime, Note] per day, oldest first, ending today.
+# Written with openpyxl's write-only mode (the 100k-row one takes a few seconds) and
+# kept under BENCH_DIR so repeated benchmark runs reuse them.
+HEADER = ["Date", "User", "Working Hours", "Overtime", "Note"]
+
+
+def rows(n_rows, end=None):
+    end = end or datetime.date.today()
+    for n in range(n_rows - 1, -1, -1):
+        day = end - datetime.timedelta(days=n)
+        yield [day.strftime("%d-%m-%Y"), "User", "8", "0", f"Sprint work {n % 97}"]
+
+
+def path_for(bench_dir, n_rows, end=None):
+    end = end or datetime.date.today()
+    return os.path.join(bench_dir, "workbooks", f"time_update_{n_rows}_{end.isoformat()}.xlsx")
+
+
+def workbook_bytes(bench_dir, n_rows, end=None):
+    """The xlsx for n_rows days ending at end (default today), generated once per day and size."""
+    path = path_for(bench_dir, n_rows, end)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        wb = openpyxl.Workbook(write_only=True)
+        sheet = wb.create_sheet("Sheet1")
+        sheet.append(HEADER)
+        for row in rows(n_rows, end):
+            sheet.append(row)
+        with json_store.atomic_path(path) as tmp:
+            wb.save(tmp)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def sheet_rows(n_rows, end=None):
+    """Same data as a native Google Sheet's cell grid (for the fake Sheets API)."""
+    return [HEADER] + list(rows(n_rows, end))
@@ -0,0 +1,233 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from playwright.sync_api import sync_playwright
+
+import tracing
+
+# --- POOL TUNING (override via env on the dyno) ---
+POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+MAX_USES = int(os.environ.get("BROWSER_MAX_USES", "50"))          # Recycle Chromium after N captures
+IDLE_TIMEOUT = int(os.environ.get("BROWSER_IDLE_TIMEOUT", "900"))  # Close an unused Chromium after N seconds
+ACQUIRE_TIMEOUT = int(os.environ.get("BROWSER_ACQUIRE_TIMEOUT", "120"))
+JOB_TIMEOUT = int(os.environ.get("BROWSER_JOB_TIMEOUT", "90"))    # A one-page capture taking longer is treated as hung
+REAP_INTERVAL = 30
+
+# ARGS: Disable unnecessary Chrome features for speed
+LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--blink-settings=imagesEnabled=false"  # Don't even try to render images
+]
+
+# LOW-MEMORY PROFILE: for small dynos (CHROMIUM_LOW_MEMORY=1, always on inside capture_worker).
+# One renderer for every tab, no site-isolation processes, no background services, capped V8 heap.
+LOW_MEMORY = os.environ.get("CHROMIUM_LOW_MEMORY", "0") == "1"
+LOW_MEMORY_ARGS = [
+    "--renderer-process-limit=1",
+    "--disable-site-isolation-trials",
+    "--disable-features=site-per-process,IsolateOrigins,BackForwardCache,Translate,MediaRouter,OptimizationHints,AudioServiceOutOfProcess",
+    "--disable-dev-shm-usage",  # /dev/shm is tiny in containers; Chromium falls back to /tmp
+    "--disable-software-rasterizer",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--mute-audio",
+    "--js-flags=--max-old-space-size=128",
+]
+# Whole browser in one process: smallest footprint, but a renderer crash takes the browser with it
+if os.environ.get("CHROMIUM_SINGLE_PROCESS", "0") == "1":
+    LOW_MEMORY_ARGS += ["--single-process", "--no-zygote"]
+
+
+def launch_args():
+    return LAUNCH_ARGS + LOW_MEMORY_ARGS if LOW_MEMORY else list(LAUNCH_ARGS)
+
+
+class _Job:
+    def __init__(self, fn, context_kwargs):
+        self.fn = fn
+        self.context_kwargs = context_kwargs
+        # Runs callables on the slot thread inside the borrower's trace context
+        self.call = tracing.bind(lambda f, *args: f(*args))
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _BrowserSlot(threading.Thread):
+    """
+    One warm Chromium instance.
+    Playwright's sync API is pinned to the thread that started it, so every slot
+    owns a thread and borrowers hand it work instead of touching the browser directly.
+    """
+
+    def __init__(self, pool, index):
+        super().__init__(name=f"browser-slot-{index}", daemon=True)
+        self.pool = pool
+        self.jobs = queue.Queue()
+        self.playwright = None
+        self.browser = None
+        self.uses = 0
+        self.last_used = time.monotonic()
+        self.retired = False  # Set by the pool when a job hung here; the slot never goes back to _idle
+
+    def run(self):
+        with sync_playwright() as p:
+            self.playwright = p
+            try:
+                self._launch()  # Pre-launch so the first click is already warm
+            except Exception as e:
+                print(f"⚠️ Browser pre-launch failed: {e}")
+
+            while True:
+                try:
+                    job = self.jobs.get(timeout=REAP_INTERVAL)
+                except queue.Empty:
+                    self._reap_if_idle()
+                    continue
+                if job is None:
+                    break
+                self._execute(job)
+
+            self._close()
+
+    def _launch(self):
+        with tracing.span("browser.launch"):
+            self.browser = self.playwright.chromium.launch(headless=True, args=launch_args())
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    def _close(self):
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+        self.browser = None
+
+    def _healthy_browser(self):
+        # Health check: a crashed or disconnected Chromium gets replaced before use
+        if self.browser is None or not self.browser.is_connected():
+            self._close()
+            self._launch()
+        return self.browser
+
+    def _new_context(self, context_kwargs):
+        browser = self._healthy_browser()
+        with tracing.span("browser.context"):
+            return browser.new_context(**context_kwargs)
+
+    def _reap_if_idle(self):
+        if self.browser is not None and time.monotonic() - self.last_used > IDLE_TIMEOUT:
+            self._close()
+
+    def _execute(self, job):
+        context = None
+        try:
+            context = job.call(self._new_context, job.context_kwargs)
+            job.result = job.call(job.fn, context)
+        except BaseException as e:
+            job.error = e
+        finally:
+            if context is not None:
+                try:
+                    context.close()
+                except Exception:
+                    pass
+            self.uses += 1
+            self.last_used = time.monotonic()
+            if self.uses >= MAX_USES:
+                self._close()  # Recycle: fresh Chromium on next borrow
+            job.done.set()
+            self.pool._release(self)
+
+
+class BrowserPool:
+    """Process-wide pool of pre-launched Chromium instances. Borrowers get a fresh BrowserContext."""
+
+    def __init__(self, size=POOL_SIZE):
+        self._idle = queue.Queue()
+        self._slots = []
+        self._lock = threading.Lock()
+        self._spawned = 0
+        for _ in range(max(1, size)):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        slot = _BrowserSlot(self, self._spawned)
+        self._spawned += 1
+        slot.start()
+        self._slots.append(slot)
+        return slot
+
+    def _release(self, slot):
+        with self._lock:
+            if slot.retired:
+                return
+        self._idle.put(slot)
+
+    def _retire(self, slot, job):
+        """
+        Gives up on a slot whose job outlived its job_timeout (hung Chromium, dead thread) and puts a fresh
+        slot in its place. Returns False when the job finished after all. The old thread is left to
+        exit on its own: Playwright objects can't be closed from another thread.
+        """
+        with self._lock:
+            if job.done.is_set():
+                return False
+            slot.retired = True
+            self._slots.remove(slot)
+            replacement = self._spawn()
+        slot.jobs.put(None)
+        self._idle.put(replacement)
+        return True
+
+    def run(self, fn, timeout=ACQUIRE_TIMEOUT, job_timeout=JOB_TIMEOUT, **context_kwargs):
+        """
+        Runs fn(context) on a warm browser and returns its result.
+        The context is created with context_kwargs and closed afterwards; exceptions are re-raised here.
+        A job still running after job_timeout seconds is treated as hung (pass more for multi-page jobs).
+        """
+        try:
+            slot = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("All browsers are busy, try again in a moment.")
+
+        job = _Job(fn, context_kwargs)
+        slot.jobs.put(job)
+        if not job.done.wait(job_timeout) and self._retire(slot, job):
+            tracing.count("browser_timeouts")
+            print(f"⚠️ {slot.name} hung for {job_timeout}s, replaced it with a fresh browser")
+            raise TimeoutError(f"Browser capture timed out after {job_timeout}s.")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def shutdown(self):
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            slot.jobs.put(None)
+        for slot in slots:
+            slot.join(timeout=10)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the shared pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,239 @@
+import os
+import time
+import uuid
+import asyncio
+import datetime
+import threading
+from playwright.async_api import async_playwright
+
+import capture_worker
+import image_utils
+import tracing
+import user_contexts
+from browser_pool import launch_args
+
+# --- CAPACITY PLANNING ---
+CONTEXT_MEMORY_MB = int(os.environ.get("CAPTURE_CONTEXT_MEMORY_MB", "120"))  # Rough cost of one open dashboard tab
+RESERVED_MEMORY_MB = int(os.environ.get("CAPTURE_RESERVED_MEMORY_MB", "250"))  # Streamlit + Chromium base process
+KEEP_FINISHED_JOBS = 200
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def max_concurrency():
+    """How many browser contexts this machine can keep open at once."""
+    override = os.environ.get("CAPTURE_MAX_CONCURRENCY")
+    if override:
+        return max(1, int(override))
+    by_cpu = (os.cpu_count() or 1) * 2
+    by_memory = (capture_worker.memory_limit_mb() - RESERVED_MEMORY_MB) // CONTEXT_MEMORY_MB
+    return max(1, min(by_cpu, by_memory))
+
+
+# Progress comes from finished trace spans: name -> (share of the bar, stage text).
+# Browser and API mode hit different spans; whatever is left is filled in by finish().
+PROGRESS_SPANS = {
+    "browser.launch": (5, "Browser ready"),
+    "browser.context": (5, "Session ready"),
+    "chart.navigate": (10, "Dashboard loaded"),
+    "chart.api": (10, "Analytics received"),
+    "chart.render": (10, "Chart rendered"),
+    "api.fetch": (25, "Analytics received"),
+    "api.render": (10, "Chart rendered"),
+    "screenshot": (10, "Screenshot taken"),
+    "workbook.download": (5, "Timesheet fetched"),
+    "image_upload": (20, "Screenshot uploaded"),
+    "excel_commit": (20, "Timesheet updated"),
+    "sheet_update": (20, "Timesheet updated"),
+}
+
+
+class JobHandle:
+    """Thread-safe view of one capture job. The UI polls it instead of blocking on the run."""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.status = QUEUED
+        self.progress = 5
+        self.stage = "Queued..."
+        self.error = None
+        self.logs = []
+        self.created = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+        self._progress_lock = threading.Lock()
+
+    def log(self, message):
+        timestamp = datetime.datetime.now().strftime('%H:%M')
+        self.logs.append((timestamp, message))
+
+    def set_stage(self, progress, stage):
+        self.progress = progress
+        self.stage = stage
+
+    def on_span(self, span):
+        """Trace listener: moves the bar forward as real stages finish (never backwards)."""
+        step = PROGRESS_SPANS.get(span.name)
+        if step is None or span.status != "ok":
+            return
+        share, stage = step
+        with self._progress_lock:
+            if not self.finished:
+                self.set_stage(min(95, self.progress + share), stage)
+
+    def finish(self, error=None):
+        self.error = error
+        self.status = FAILED if error else DONE
+        self.progress = 100
+        self.stage = "Failed" if error else "Done!"
+        self.finished_at = time.time()
+        self._done.set()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class CaptureScheduler:
+    """
+    Runs capture jobs for many users on one event loop with one async Chromium
+    (in the capture_worker subprocess unless CAPTURE_WORKER=0).
+    Browser work is bounded by a semaphore sized from CPU/RAM; the Drive/Excel step
+    runs in the loop's thread pool so it never blocks other captures.
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency or max_concurrency()
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, name="capture-scheduler", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    # --- EVENT LOOP THREAD ---
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._browser_lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+        # Warm per-user contexts (session cookie injected once, state written back after each run)
+        self._contexts = user_contexts.UserContexts(self._get_browser)
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                with tracing.span("browser.launch"):
+                    self._browser = await self._playwright.chromium.launch(headless=True, args=launch_args())
+            return self._browser
+
+    async def _run_job(self, job, bot, working_hours, overtime, note):
+        today = datetime.date.today()
+        waka_date_str = today.strftime("%Y-%m-%d")
+        display_date = today.strftime("%d-%m-%Y")
+        # Jobs run side by side; the screenshot stays in memory so they never share a file
+        image_name = image_utils.screenshot_name(waka_date_str)
+
+        with tracing.start_trace("job", mode=bot.mode, sheet_backend=bot.sheet_backend) as trace:
+            trace.on_span(job.on_span)
+            await self._traced_job(job, bot, working_hours, overtime, note, waka_date_str, display_date, image_name)
+
+    async def _traced_job(self, job, bot, working_hours, overtime, note, waka_date_str, display_date, image_name):
+        error = None
+        pipeline = None
+        try:
+            if bot.mode == "browser" and not bot.has_session():
+                raise RuntimeError("No WakaTime session (auth.json or session cookie).")
+
+            # Workbook download starts now, even while we wait for a browser slot
+            journal = bot.open_journal(waka_date_str)
+            pipeline = bot.start_cloud_pipeline(journal)
+            image = bot.resume_capture(journal)
+            if image is None:
+                async with self._semaphore:
+                    job.status = RUNNING
+                    job.set_stage(max(job.progress, 10), "Capturing Analytics...")
+                    job.log("⚡ Browser Engine: Start")
+                    if bot.mode == "browser" and capture_worker.ENABLED:
+                        # Chromium runs in the supervised worker: a heavy capture gets it restarted, not the app OOM-killed
+                        image, chart_ready = await bot.capture_in_worker_async(waka_date_str)
+                    else:
+                        browser = await self._get_browser() if bot.mode == "browser" else None
+                        image, chart_ready = await bot.capture_async(browser, waka_date_str, self._contexts)
+                if not chart_ready:
+                    job.log("⚠️ Chart delayed, snapped anyway...")
+                if bot.block_stats:
+                    job.log(bot.block_stats)
+                job.log("📸 Screenshot: DONE")
+                journal.save_image(image)
+            else:
+                job.status = RUNNING  # Retry of a run whose capture already went through: straight to the sync
+
+            job.stage = "Syncing Drive & Excel..."
+            synced = await bot.sync_cloud_async(image, image_name, display_date, working_hours, overtime, note, pipeline)
+            pipeline = None
+            if not synced:
+                error = "Cloud sync failed, see Terminal."
+        except Exception as e:
+            job.log(f"❌ Job Error: {e}")
+            error = str(e)
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+            job.log("✨ Finished!" if not error else "💥 Aborted.")
+            job.finish(error)
+
+    # --- PUBLIC API (any thread) ---
+    def submit(self, key, bot, working_hours, overtime, note):
+        """
+        Queues a capture for an AsyncOfficeAutomator, keyed by session/folder. A second submit
+        for a key that is still in flight returns the existing handle instead of a duplicate run.
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None and not existing.finished:
+                return existing
+            job = JobHandle(key)
+            self._active[key] = job
+            self._jobs[job.id] = job
+            self._prune()
+
+        bot.log = job.log
+        asyncio.run_coroutine_threadsafe(self._run_job(job, bot, working_hours, overtime, note), self._loop)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:-KEEP_FINISHED_JOBS]:
+            del self._jobs[job.id]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler, starting its event loop on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CaptureScheduler()
+        return _scheduler
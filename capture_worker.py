@@ -0,0 +1,416 @@
+import os
+import sys
+import time
+import uuid
+import pickle
+import signal
+import struct
+import asyncio
+import threading
+import subprocess
+from concurrent.futures import Future
+
+import tracing
+
+# Browser captures run in a supervised subprocess instead of next to Streamlit:
+#   - the worker (python -m capture_worker) owns Playwright, one low-memory Chromium and the warm
+#     per-user contexts, and runs many captures concurrently on its event loop,
+#   - the supervisor polls the memory of the worker's whole process tree (worker + Chromium) from /proc
+#     and kills the tree when it goes over MEMORY_BUDGET_MB or a capture runs past JOB_TIMEOUT,
+#     then starts a fresh worker; only the captures in flight fail, never the web app,
+#   - every capture reports the tree's peak memory while it ran.
+# Requests/replies are pickled dicts, length-prefixed, over the worker's stdin/stdout.
+ENABLED = os.environ.get("CAPTURE_WORKER", "1") == "1"
+PARENT_RESERVED_MB = int(os.environ.get("CAPTURE_PARENT_RESERVED_MB", "150"))  # Streamlit + this process
+MEMORY_BUDGET_MB = int(os.environ.get("CAPTURE_WORKER_MEMORY_MB", "0"))        # 0 = container limit minus the reserve
+JOB_TIMEOUT = int(os.environ.get("CAPTURE_WORKER_TIMEOUT", "90"))              # Seconds before a capture counts as hung
+POLL_INTERVAL = 0.25
+MIN_BUDGET_MB = 200
+
+
+class WorkerKilled(RuntimeError):
+    """The worker was killed (memory budget / hang) or died while this capture was in flight."""
+
+
+# --- /proc ---
+def memory_limit_mb():
+    """Container memory limit (cgroup v2/v1), falling back to physical RAM."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                raw = f.read().strip()
+            if raw != "max" and int(raw) < 1 << 50:
+                return int(raw) // (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return 1024
+
+
+def default_budget_mb():
+    if MEMORY_BUDGET_MB:
+        return MEMORY_BUDGET_MB
+    return max(MIN_BUDGET_MB, memory_limit_mb() - PARENT_RESERVED_MB)
+
+
+def process_tree(pid):
+    """pid and all its descendants. Playwright starts Chromium in its own process group, so walk ppids."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the ")" closing the command name: state ppid ...
+        ppid = int(stat[stat.rindex(b")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        tree.append(current)
+        todo.extend(children.get(current, ()))
+    return tree
+
+
+def _memory_kb(pid):
+    # PSS splits pages Chromium's processes share between them, so the tree isn't counted twice;
+    # plain RSS (statm) when smaps_rollup isn't available
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def tree_memory_mb(pid):
+    return sum(_memory_kb(p) for p in process_tree(pid)) / 1024
+
+
+# --- FRAMING ---
+_HEADER = struct.Struct("!I")
+
+
+def _send(stream, lock, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    with lock:
+        stream.write(_HEADER.pack(len(data)) + data)
+        stream.flush()
+
+
+def _recv(stream):
+    """Next message, or None at EOF."""
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (size,) = _HEADER.unpack(header)
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return pickle.loads(data)
+
+
+def _replay_span(span):
+    tracing.record(span["name"], span["seconds"], start=span["start"], **span["attrs"])
+
+
+# --- SUPERVISOR (web app / CLI process) ---
+class _Pending:
+    def __init__(self, timeout):
+        self.future = Future()
+        # Worker spans land in the submitting run's trace (and drive its progress bar)
+        self.on_span = tracing.bind(_replay_span)
+        self.deadline = time.monotonic() + timeout
+        self.peak_mb = 0.0
+
+
+class CaptureWorker:
+    """Starts, watches and restarts the capture subprocess. Thread-safe; submit() from any thread or event loop."""
+
+    def __init__(self, budget_mb=None, timeout=JOB_TIMEOUT):
+        self.budget_mb = budget_mb or default_budget_mb()
+        self.timeout = timeout
+        self.restarts = 0
+        self.last_mb = 0.0
+        self._proc = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._monitor_thread = threading.Thread(target=self._monitor, name="capture-worker-monitor", daemon=True)
+        self._monitor_thread.start()
+
+    def _start(self):
+        # Caller holds self._lock
+        here = os.path.dirname(os.path.abspath(__file__))
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")])),
+            "CHROMIUM_LOW_MEMORY": os.environ.get("CHROMIUM_LOW_MEMORY", "1"),
+            "TRACE_FILE": "",  # The worker's spans are replayed into our traces instead
+            "TRACE_OTEL": "0",
+        }
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "capture_worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, start_new_session=True,
+        )
+        threading.Thread(target=self._read, args=(self._proc,), name="capture-worker-reader", daemon=True).start()
+
+    def _read(self, proc):
+        while True:
+            try:
+                message = _recv(proc.stdout)
+            except Exception:
+                message = None
+            if message is None:
+                proc.wait()
+                self._retire(proc, f"Capture worker exited (code {proc.returncode}).", kill=False)
+                return
+            with self._lock:
+                pending = self._pending.get(message["id"])
+                if pending is not None and message["type"] != "span":
+                    del self._pending[message["id"]]
+            if pending is None:
+                continue
+            if message["type"] == "span":
+                pending.on_span(message["span"])
+            elif message["type"] == "result":
+                pending.future.set_result({
+                    "image": message["image"], "ready": message["ready"],
+                    "block_stats": message["block_stats"], "peak_memory_mb": round(pending.peak_mb, 1),
+                })
+            else:
+                pending.future.set_exception(RuntimeError(message["error"]))
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(POLL_INTERVAL)
+            with self._lock:
+                proc, pending = self._proc, list(self._pending.values())
+            if proc is None or proc.poll() is not None:
+                continue
+            used = tree_memory_mb(proc.pid)
+            self.last_mb = used
+            for p in pending:
+                p.peak_mb = max(p.peak_mb, used)
+            if used > self.budget_mb:
+                self._retire(proc, f"Capture worker over its memory budget ({used:.0f} MB > {self.budget_mb} MB), killed.")
+            elif any(time.monotonic() > p.deadline for p in pending):
+                self._retire(proc, f"Capture hung for more than {self.timeout}s, worker killed.")
+
+    def _retire(self, proc, reason, kill=True):
+        """Kills proc's whole tree (kill=True) and starts a fresh worker; fails its in-flight captures either way."""
+        with self._lock:
+            if self._proc is not proc:
+                return  # Already replaced
+            self._proc = None
+            failed, self._pending = self._pending, {}
+        if kill:
+            for pid in reversed(process_tree(proc.pid)):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            proc.wait()
+        print(f"♻️ {reason}")
+        self.restarts += 1
+        for pending in failed.values():
+            if not pending.future.done():
+                pending.future.set_exception(WorkerKilled(reason))
+        if not kill or not failed:
+            # Crashed on its own, or was idle: start lazily on the next capture rather than loop on a broken worker
+            return
+        with self._lock:
+            if not self._closed and self._proc is None:
+                self._start()  # Warm again before the next click
+
+    def submit(self, auth_file, user_cookie, waka_date_str):
+        """Queues one browser capture. The Future resolves to {"image", "ready", "block_stats", "peak_memory_mb"}."""
+        job_id = uuid.uuid4().hex
+        pending = _Pending(self.timeout)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Capture worker is shut down.")
+            if self._proc is None or self._proc.poll() is not None:
+                self._proc = None
+                self._start()
+            proc = self._proc
+            self._pending[job_id] = pending
+            pending.peak_mb = self.last_mb
+        try:
+            _send(proc.stdin, self._send_lock, {
+                "id": job_id, "auth_file": auth_file, "user_cookie": user_cookie, "date": waka_date_str,
+            })
+        except OSError as e:
+            self._retire(proc, f"Capture worker unreachable ({e}).")
+        return pending.future
+
+    def capture(self, auth_file, user_cookie, waka_date_str):
+        return self.submit(auth_file, user_cookie, waka_date_str).result()
+
+    async def capture_async(self, auth_file, user_cookie, waka_date_str):
+        return await asyncio.wrap_future(self.submit(auth_file, user_cookie, waka_date_str))
+
+    def shutdown(self, timeout=10):
+        with self._lock:
+            self._closed = True
+            proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()  # EOF: the worker closes its contexts (saving sessions) and exits
+            proc.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            for pid in reversed(process_tree(proc.pid)):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Returns the process-wide supervisor; the subprocess itself starts on the first capture."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            import atexit
+            _worker = CaptureWorker()
+            atexit.register(_worker.shutdown)
+        return _worker
+
+
+# --- WORKER (python -m capture_worker) ---
+class _Server:
+    def __init__(self, outbox):
+        import browser_pool
+        import user_contexts
+
+        self.outbox = outbox
+        self.max_uses = browser_pool.MAX_USES
+        self.uses = 0
+        self.active = 0
+        self._send_lock = threading.Lock()
+        self._browser_lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+        self.contexts = user_contexts.UserContexts(self._get_browser)
+
+    def send(self, message):
+        _send(self.outbox, self._send_lock, message)
+
+    async def _get_browser(self):
+        from playwright.async_api import async_playwright
+        from browser_pool import launch_args
+
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                with tracing.span("browser.launch"):
+                    self._browser = await self._playwright.chromium.launch(headless=True, args=launch_args())
+            return self._browser
+
+    def _forward(self, job_id, trace):
+        def on_span(span):
+            if span is trace.root:
+                return
+            self.send({"type": "span", "id": job_id, "span": {
+                "name": span.name, "seconds": span.duration or 0, "start": span.start,
+                "attrs": {k: v for k, v in span.attrs.items() if isinstance(v, (str, bool, int, float))},
+            }})
+        return on_span
+
+    async def handle(self, job):
+        from async_automation import AsyncOfficeAutomator
+
+        self.active += 1
+        bot = AsyncOfficeAutomator(logger=print, mode="browser")
+        bot.auth_file, bot.user_cookie = job["auth_file"], job["user_cookie"]
+        try:
+            with tracing.start_trace("capture_worker") as trace:
+                trace.on_span(self._forward(job["id"], trace))
+                image, ready = await bot.capture_async(await self._get_browser(), job["date"], self.contexts)
+            reply = {"type": "result", "id": job["id"], "image": image, "ready": ready, "block_stats": bot.block_stats}
+        except Exception as e:
+            reply = {"type": "error", "id": job["id"], "error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.active -= 1
+            self.uses += 1
+        self.send(reply)
+        await self._recycle_if_due()
+
+    async def _recycle_if_due(self):
+        # Same policy as browser_pool: a fresh Chromium every MAX_USES captures, once nothing is in flight
+        if self.uses < self.max_uses or self.active:
+            return
+        self.uses = 0
+        await self.close()
+
+    async def close(self):
+        await self.contexts.close_all()
+        async with self._browser_lock:
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+            self._browser = None
+
+
+def _pump(inbox, loop, queue):
+    while True:
+        try:
+            message = _recv(inbox)
+        except Exception:
+            message = None
+        loop.call_soon_threadsafe(queue.put_nowait, message)
+        if message is None:
+            return
+
+
+async def _serve(inbox, outbox):
+    server = _Server(outbox)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    threading.Thread(target=_pump, args=(inbox, loop, queue), daemon=True).start()
+    tasks = set()
+    while True:
+        job = await queue.get()
+        if job is None:
+            break  # Supervisor closed our stdin
+        task = asyncio.ensure_future(server.handle(job))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks, timeout=JOB_TIMEOUT)
+    await server.close()
+
+
+def _worker_main():
+    # stdout carries the protocol: keep the fd for it, send print() output to stderr
+    outbox = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    asyncio.run(_serve(sys.stdin.buffer, outbox))
+
+
+if __name__ == "__main__":
+    _worker_main()
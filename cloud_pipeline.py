@@ -0,0 +1,161 @@
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import drive_utils
+import run_journal
+import tracing
+import write_behind
+from smart_handler import SmartHandler
+from sheet_handler import SheetHandler
+
+# Shared across runs so worker threads (and their cached Drive services) stay warm
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cloud")
+
+
+class CloudPipeline:
+    """
+    The cloud step as a small DAG instead of a serial chain:
+
+        excel lookup -> download (started early, overlaps the capture) --\\
+                                                                          +-> modify -> upload --\\
+        folder lookup -> screenshot upload -----------------------------------------------------+-> join
+
+    Each branch uses its thread's cached Drive service because googleapiclient objects aren't thread-safe.
+    With a run_journal.RunJournal, branches an earlier attempt of the same run finished are skipped.
+    """
+
+    def __init__(self, parent_id, log=print, sheet_backend="xlsx", journal=None):
+        self.parent_id = parent_id
+        self.log = log
+        self.sheet_backend = sheet_backend
+        self.journal = journal
+        self.timings = {}
+        self._executor = _executor
+        self._prefetch = None
+
+    def _timed(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            with tracing.span(stage):
+                return fn(*args)
+        finally:
+            self.timings[stage] = time.perf_counter() - start
+
+    def _service(self):
+        return drive_utils.get_drive_service()
+
+    # --- BRANCH B (part 1): can run while the browser is still busy ---
+    def prefetch_workbook(self):
+        if self.sheet_backend == "sheets":
+            return None  # Native Sheets: nothing to download
+        if self._prefetch is None:
+            self._prefetch = self._executor.submit(tracing.bind(self._fetch_workbook))
+        return self._prefetch
+
+    def _fetch_workbook(self):
+        service = self._timed("excel_auth", self._service)
+        handler = SmartHandler(service)
+        found = {}
+
+        def resolve():
+            found['target'] = self._timed("excel_lookup", drive_utils.find_time_update_file, service, self.parent_id)
+            return found['target']
+
+        def download(target):
+            return target and self._timed("excel_download", handler.download_workbook, target['id'])
+
+        fh = drive_utils.retry_on_stale_id(resolve, download)
+        if not fh:
+            return None
+        return found['target'], fh
+
+    # --- BRANCH A ---
+    def _upload_screenshot(self, image, image_name, display_date):
+        digest = run_journal.image_hash(image)
+        previous = self.journal and self.journal.stage(run_journal.UPLOAD)
+        if previous and previous.get("sha256") == digest:
+            self.log("♻️ Screenshot already uploaded, skipping.")
+            return
+        if self.journal and not previous:
+            self.journal.mark(run_journal.UPLOAD, started=True)  # A retry then knows this upload may have gone through
+        service = self._timed("image_auth", self._service)
+        file_id = drive_utils.retry_on_stale_id(
+            lambda: self._timed("folder_lookup", drive_utils.find_or_create_folder, service, self.parent_id, display_date),
+            # Only a retry asks Drive for the name, a fresh run has nothing there yet
+            lambda folder_id: self._timed("image_upload", lambda: drive_utils.upload_bytes_to_drive(
+                image, image_name, folder_id, service, file_id=previous and previous.get("file_id"), lookup=bool(previous)
+            ))
+        )
+        if self.journal:
+            self.journal.mark(run_journal.UPLOAD, file_id=file_id, sha256=digest)
+
+    # --- BRANCH B (part 2) ---
+    def _update_row(self, working_hours, overtime, note):
+        values = [str(v) for v in (working_hours, overtime, note)]
+        if self.journal and self.journal.done(run_journal.ROW, values=values):
+            self.log("♻️ Row already written, skipping.")
+            return
+        written = self._update_sheet(*values) if self.sheet_backend == "sheets" else self._update_excel(*values)
+        if written and self.journal:
+            self.journal.mark(run_journal.ROW, values=values)
+
+    def _update_excel(self, working_hours, overtime, note):
+        # Never wait on a nested task from inside _executor: with every worker blocked like this the
+        # queued prefetch would never run. Not prefetched yet -> fetch on this thread instead.
+        fetched = self._prefetch.result() if self._prefetch is not None else self._fetch_workbook()
+        if fetched is None:
+            self.log("⚠️ 'Time update' file not found.")
+            return
+        target, fh = fetched
+        self.log(f"📎 Editing: {target['name']}")
+        rows = {datetime.date.today(): (working_hours, overtime, note)}
+        # Queued with other runs' edits to the same file; the prefetch already warmed file_cache
+        future = write_behind.get_queue().submit(target['id'], rows, "xlsx")
+        self._timed("excel_commit", future.result)
+        self.log("✅ Excel Updated!")
+        return True
+
+    def _update_sheet(self, working_hours, overtime, note):
+        service = self._service()
+        sheets_bot = SheetHandler()
+        rows = {datetime.date.today(): (working_hours, overtime, note)}
+
+        def update(spreadsheet_id):
+            if not spreadsheet_id:
+                self.log("⚠️ 'Time update' Google Sheet not found.")
+                return
+            future = write_behind.get_queue().submit(spreadsheet_id, rows, "sheets")
+            self._timed("sheet_update", future.result)
+            self.log("✅ Sheet Updated!")
+            return True
+
+        return drive_utils.retry_on_stale_id(
+            lambda: self._timed("sheet_lookup", sheets_bot.find_sheet_id_by_name, service, self.parent_id), update
+        )
+
+    def run(self, image, image_name, display_date, working_hours, overtime, note):
+        """Runs both branches and joins once; image is the encoded screenshot bytes. Returns True when both went through."""
+        start = time.perf_counter()
+        branches = [
+            ("Upload", self._executor.submit(tracing.bind(self._upload_screenshot), image, image_name, display_date)),
+            ("Excel", self._executor.submit(tracing.bind(self._update_row), working_hours, overtime, note)),
+        ]
+        ok = True
+        for name, future in branches:
+            try:
+                future.result()
+            except Exception as e:
+                self.log(f"❌ {name} Error: {e}")
+                ok = False
+        self.timings["cloud_total"] = time.perf_counter() - start
+        self.close()
+        if ok and self.journal:
+            self.journal.finish()
+
+        self.log("⏱️ " + " | ".join(f"{k} {v:.2f}s" for k, v in self.timings.items()))
+        return ok
+
+    def close(self):
+        if self._prefetch is not None:
+            self._prefetch.cancel()
@@ -1,30 +1,168 @@
 import os.path
+import json
+import time
+import random
+import ssl
+import socket
+import mimetypes
+import tempfile
+import threading
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaFileUpload, MediaIoBaseUpload
+
+import id_cache
+import tracing
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
+TOKEN_FILE = 'token.json'
+
+# --- IN-MEMORY UPLOADS ---
+# Payloads stay in RAM; only ones above SPOOL_THRESHOLD spill to a temp file.
+# Small payloads go up as one multipart request (a resumable session costs an extra round trip).
+SPOOL_THRESHOLD = int(os.environ.get("DRIVE_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+RESUMABLE_THRESHOLD = int(os.environ.get("DRIVE_RESUMABLE_THRESHOLD", str(5 * 1024 * 1024)))
+
+# --- RESILIENT UPLOADS ---
+# Resumable uploads go up in UPLOAD_CHUNK_MB chunks (Drive wants multiples of 256 KB). A 429/5xx or a
+# dropped connection is retried with jittered exponential backoff; a resumable session picks up
+# from the offset Drive already has instead of starting over.
+UPLOAD_CHUNK_SIZE = max(1, int(os.environ.get("DRIVE_UPLOAD_CHUNK_MB", "8"))) * 1024 * 1024
+UPLOAD_RETRIES = int(os.environ.get("DRIVE_UPLOAD_RETRIES", "6"))
+BACKOFF_BASE = float(os.environ.get("DRIVE_BACKOFF_BASE", "0.5"))   # Seconds; doubles per attempt
+BACKOFF_MAX = float(os.environ.get("DRIVE_BACKOFF_MAX", "32"))
+# Shared by every thread of the process: Drive's per-user quota is counted across all of them
+DRIVE_MAX_QPS = float(os.environ.get("DRIVE_MAX_QPS", "10"))
+RETRYABLE_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+RATE_LIMIT_REASONS = frozenset(("rateLimitExceeded", "userRateLimitExceeded"))
+
+# --- CREDENTIAL & SERVICE CACHE ---
+# Credentials are shared per token file (refreshed under a lock, written back once).
+# Services are cached per thread: httplib2 connections aren't thread-safe, but a thread
+# can keep reusing its own service instead of rebuilding it from the discovery doc.
+_creds_cache = {}
+_creds_lock = threading.Lock()
+_local = threading.local()
+_http_factory = None
+
+def set_http_factory(factory):
+    """
+    Routes every service built from now on through factory() (an httplib2.Http-like object)
+    instead of authorized HTTPS. Used by the offline benchmarks to talk to a fake Drive/Sheets;
+    None restores the real thing.
+    """
+    global _http_factory
+    _http_factory = factory
+
+def get_credentials(token_file=TOKEN_FILE):
+    with _creds_lock:
+        creds = _creds_cache.get(token_file)
+        if creds is None and os.path.exists(token_file):
+            creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    'credentials.json', SCOPES)
+                creds = flow.run_local_server(port=0)
+            with open(token_file, 'w') as token:
+                token.write(creds.to_json())
+
+        _creds_cache[token_file] = creds
+        return creds
+
+class RateLimiter:
+    """
+    Token bucket: rate requests per second, bursts up to burst. acquire() reserves its tokens
+    under the lock and sleeps off any debt outside it, so waiting threads don't serialize.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+rate_limiter = RateLimiter(DRIVE_MAX_QPS)
+
+class TracedHttpRequest(HttpRequest):
+    """Counts every Google API round trip into the current trace (see tracing) and paces it through rate_limiter."""
+
+    def execute(self, *args, **kwargs):
+        rate_limiter.acquire()
+        tracing.count("api_calls")
+        return super().execute(*args, **kwargs)
+
+def _get_service(api, version, token_file):
+    factory = _http_factory
+    creds = get_credentials(token_file) if factory is None else factory
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, token_file)
+    cached = services.get(key)
+    if cached is None or cached[0] is not creds:
+        # static_discovery: use the discovery doc bundled with the client, no fetch / disk cache
+        auth = {'credentials': creds} if factory is None else {'http': factory()}
+        service = build(api, version, static_discovery=True, cache_discovery=False, requestBuilder=TracedHttpRequest, **auth)
+        cached = services[key] = (creds, service)
+    return cached[1]
+
+def get_drive_service(token_file=TOKEN_FILE):
+    return _get_service('drive', 'v3', token_file)
+
+def get_sheets_service(token_file=TOKEN_FILE):
+    return _get_service('sheets', 'v4', token_file)
 
 def authenticate_google_drive():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
+    return get_drive_service()
+
+def is_not_found(error):
+    return isinstance(error, HttpError) and error.resp.status == 404
 
-    return build('drive', 'v3', credentials=creds)
+def retry_on_stale_id(resolve, action):
+    """
+    Runs action(item) with an item (an ID or a {'id': ...} dict, or None) that may have come from id_cache.
+    If Drive answers 404 the cached ID is dropped, resolved again and action retried once.
+    """
+    item = resolve()
+    try:
+        return action(item)
+    except HttpError as e:
+        if not is_not_found(e) or not item:
+            raise
+        id_cache.invalidate_id(item if isinstance(item, str) else item['id'])
+        return action(resolve())
 
 def find_or_create_folder(service, parent_id, folder_name):
+    cached = id_cache.get(parent_id, folder_name)
+    if cached:
+        return cached['id']
+    with tracing.span("drive.folder_lookup"):
+        return _find_or_create_folder(service, parent_id, folder_name)
+
+def _find_or_create_folder(service, parent_id, folder_name):
     print(f"📂 Checking for folder: {folder_name}...")
     
     # ADDED: includeItemsFromAllDrives and supportsAllDrives
@@ -54,28 +192,328 @@ def find_or_create_folder(service, parent_id, folder_name):
         ).execute()
         
         print(f"✅ Created folder ID: {folder.get('id')}")
-        return folder.get('id')
+        folder_id = folder.get('id')
     else:
         folder_id = items[0]['id']
         print(f"✅ Found existing folder ID: {folder_id}")
-        return folder_id
 
-def upload_file_to_drive(file_path, file_name, parent_id):
-    service = authenticate_google_drive()
+    id_cache.put(parent_id, folder_name, {'id': folder_id})
+    return folder_id
+
+def _lookup_cache_name(name, exact=False, mime_type=None):
+    return f"{'=' if exact else '~'}{name}|{mime_type or ''}"
+
+def find_time_update_file(service, parent_id, name="Time update", exact=False, mime_type=None):
+    """
+    Locates the timesheet ("Time update" workbook or Google Sheet) in parent_id.
+    Served from id_cache when possible, so a normal run sends no lookup query.
+    """
+    cache_name = _lookup_cache_name(name, exact, mime_type)
+    cached = id_cache.get(parent_id, cache_name)
+    if cached:
+        return cached
+
+    op = "=" if exact else "contains"
+    query = f"name {op} '{name}' and '{parent_id}' in parents and trashed = false"
+    if mime_type:
+        query += f" and mimeType = '{mime_type}'"
+    with tracing.span("drive.file_lookup"):
+        results = service.files().list(
+            q=query, 
+            fields="files(id, name, mimeType)",
+            includeItemsFromAllDrives=True, 
+            supportsAllDrives=True
+        ).execute()
+    files = results.get('files', [])
+    if not files:
+        return None
+
+    id_cache.put(parent_id, cache_name, files[0])
+    return files[0]
+
+# --- BATCH API (backfills / retries touching many dates) ---
+# Drive accepts up to 100 calls per batch; keep well under it.
+BATCH_SIZE = 50
+
+def _run_batch(service, requests):
+    """Executes {key: request} through BatchHttpRequest and returns {key: response}. Failed calls raise."""
+    responses = {}
+    errors = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    keys = list(requests)
+    for start in range(0, len(keys), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for key in keys[start:start + BATCH_SIZE]:
+            batch.add(requests[key], request_id=key)
+        with tracing.span("drive.batch", calls=len(keys[start:start + BATCH_SIZE])):
+            rate_limiter.acquire(len(keys[start:start + BATCH_SIZE]))  # Quota counts every call in the batch
+            tracing.count("api_calls")
+            batch.execute()
+
+    if errors:
+        raise next(iter(errors.values()))
+    return responses
+
+def find_or_create_folders(service, parent_id, folder_names):
+    """
+    Batched find_or_create_folder: one round trip to look up every missing name,
+    one more to create the ones that don't exist. Returns {folder_name: folder_id}.
+    """
+    result = {}
+    missing = []
+    for name in dict.fromkeys(folder_names):
+        cached = id_cache.get(parent_id, name)
+        if cached:
+            result[name] = cached['id']
+        else:
+            missing.append(name)
+
+    if not missing:
+        return result
+
+    print(f"📂 Checking {len(missing)} folders in one batch...")
+    lookups = {
+        str(i): service.files().list(
+            q=f"name = '{name}' and '{parent_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false",
+            spaces='drive',
+            fields='files(id, name)',
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True
+        )
+        for i, name in enumerate(missing)
+    }
+    found = _run_batch(service, lookups)
+
+    to_create = []
+    for i, name in enumerate(missing):
+        items = found[str(i)].get('files', [])
+        if items:
+            result[name] = items[0]['id']
+            id_cache.put(parent_id, name, {'id': items[0]['id']})
+        else:
+            to_create.append(name)
+
+    if to_create:
+        print(f"✨ Creating {len(to_create)} folders in one batch...")
+        creates = {
+            str(i): service.files().create(
+                body={'name': name, 'mimeType': 'application/vnd.google-apps.folder', 'parents': [parent_id]},
+                fields='id',
+                supportsAllDrives=True
+            )
+            for i, name in enumerate(to_create)
+        }
+        created = _run_batch(service, creates)
+        for i, name in enumerate(to_create):
+            folder_id = created[str(i)]['id']
+            result[name] = folder_id
+            id_cache.put(parent_id, name, {'id': folder_id})
+
+    return result
+
+def get_files_metadata(service, file_ids, fields='id, name, mimeType, modifiedTime, md5Checksum'):
+    """Bulk files().get in batches. Returns {file_id: metadata}."""
+    requests = {
+        file_id: service.files().get(fileId=file_id, fields=fields, supportsAllDrives=True)
+        for file_id in dict.fromkeys(file_ids)
+    }
+    return _run_batch(service, requests) if requests else {}
+
+def list_children_by_name(service, parent_ids, name):
+    """Bulk 'name = X in each parent' query. Returns {parent_id: [files]}."""
+    requests = {
+        parent_id: service.files().list(
+            q=f"name = '{name}' and '{parent_id}' in parents and trashed = false",
+            fields='files(id, name, mimeType, md5Checksum)',
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True
+        )
+        for parent_id in dict.fromkeys(parent_ids)
+    }
+    found = _run_batch(service, requests) if requests else {}
+    return {parent_id: resp.get('files', []) for parent_id, resp in found.items()}
+
+def find_files_by_name(service, locations):
+    """
+    Batched exact-name lookup for {key: (parent_id, name)}: id_cache first, one batch for the rest.
+    Returns {key: file_id} for the files that exist.
+    """
+    result = {}
+    requests = {}
+    for key, (parent_id, name) in locations.items():
+        cached = id_cache.get(parent_id, _lookup_cache_name(name, exact=True))
+        if cached:
+            result[key] = cached['id']
+        else:
+            requests[str(key)] = (key, service.files().list(
+                q=f"name = '{name}' and '{parent_id}' in parents and trashed = false",
+                fields='files(id, name, mimeType)',
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True
+            ))
+    if not requests:
+        return result
+    found = _run_batch(service, {request_id: request for request_id, (_, request) in requests.items()})
+    for request_id, (key, _) in requests.items():
+        files = found[request_id].get('files', [])
+        if files:
+            parent_id, name = locations[key]
+            id_cache.put(parent_id, _lookup_cache_name(name, exact=True), files[0])
+            result[key] = files[0]['id']
+    return result
+
+def upload_file_to_drive(file_path, file_name, parent_id, service=None):
+    service = service or get_drive_service()
     print(f"🚀 Uploading {file_name} to Drive...")
     
     file_metadata = {
         'name': file_name,
         'parents': [parent_id]
     }
-    media = MediaFileUpload(file_path, resumable=True)
+    media = media_from_file(file_path, mimetypes.guess_type(file_name)[0])
     
     # ADDED: supportsAllDrives=True
-    file = service.files().create(
-        body=file_metadata, 
-        media_body=media, 
-        fields='id',
-        supportsAllDrives=True
-    ).execute()
+    with tracing.span("drive.upload", bytes=os.path.getsize(file_path)):
+        tracing.count("bytes_up", os.path.getsize(file_path))
+        file = execute_upload(service.files().create(
+            body=file_metadata, 
+            media_body=media, 
+            fields='id',
+            supportsAllDrives=True
+        ))
     
-    print(f"🎉 Upload Complete! File ID: {file.get('id')}")
\ No newline at end of file
+    print(f"🎉 Upload Complete! File ID: {file.get('id')}")
+    return file.get('id')
+
+def spool(data):
+    """bytes -> readable stream, kept in memory unless it is bigger than SPOOL_THRESHOLD."""
+    stream = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+    stream.write(data)
+    stream.seek(0)
+    return stream
+
+def media_from_bytes(data, mimetype):
+    return MediaIoBaseUpload(spool(data), mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE,
+                             resumable=len(data) > RESUMABLE_THRESHOLD)
+
+def media_from_file(file_path, mimetype):
+    return MediaFileUpload(file_path, mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+
+def _error_reasons(error):
+    # Read from the body ourselves: HttpError.error_details is only filled in when Google sent a message
+    try:
+        errors = json.loads(error.content.decode("utf-8"))["error"].get("errors", [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return set()
+    return {e.get("reason") for e in errors if isinstance(e, dict)}
+
+def is_transient(error):
+    """429 / 5xx / Drive rate-limit 403s and network errors are worth retrying; anything else isn't."""
+    if isinstance(error, HttpError):
+        if error.resp.status in RETRYABLE_STATUSES:
+            return True
+        if error.resp.status == 403:
+            return bool(_error_reasons(error) & RATE_LIMIT_REASONS)
+        return False
+    # Network-level failures only: a FileNotFoundError / PermissionError / full disk from the media
+    # source is an OSError too, but retrying it just delays the real error
+    return isinstance(error, (ConnectionError, socket.timeout, TimeoutError, ssl.SSLError, httplib2.HttpLib2Error))
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff; a Retry-After from Drive is honoured as the minimum."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    retry_after = getattr(getattr(error, 'resp', None), 'get', lambda *_: None)('retry-after')
+    if retry_after and str(retry_after).isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+def _fresh_request(request):
+    # Drive forgot the resumable session (404/410 on the session URI): the same upload as a new
+    # request, which opens a new session and sends from byte 0
+    return type(request)(
+        request.http, request.postproc, request.uri, method=request.method, body=request.body,
+        headers=dict(request.headers), methodId=request.methodId, resumable=request.resumable
+    )
+
+def execute_upload(request, retries=None):
+    """
+    Runs a files().create/update carrying media to completion and returns the response body.
+    Resumable media are driven chunk by chunk through next_chunk(): after a transient error the
+    next call asks Drive how many bytes it already has and continues from there.
+    Retries reset whenever a chunk gets through, so a long upload isn't capped by early hiccups.
+    """
+    retries = UPLOAD_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            if request.resumable is None:
+                return request.execute()  # Single multipart request (paced + counted by TracedHttpRequest)
+            response = None
+            while response is None:
+                before = request.resumable_progress
+                rate_limiter.acquire()
+                tracing.count("api_calls")  # next_chunk talks HTTP directly, bypassing execute()
+                _, response = request.next_chunk()
+                if request.resumable_progress > before:
+                    attempt = 0
+            return response
+        except Exception as e:
+            session_lost = isinstance(e, HttpError) and e.resp.status in (404, 410) and request.resumable_uri
+            if attempt >= retries or not (session_lost or is_transient(e)):
+                raise
+            if session_lost:
+                request = _fresh_request(request)
+            delay = backoff_delay(attempt, e)
+            attempt += 1
+            tracing.count("upload_retries")
+            print(f"🔁 Upload interrupted ({getattr(getattr(e, 'resp', None), 'status', type(e).__name__)}), "
+                  f"retry {attempt}/{retries} in {delay:.1f}s...")
+            time.sleep(delay)
+
+def upload_bytes_to_drive(data, file_name, parent_id, service=None, mimetype=None, file_id=None, lookup=False):
+    """
+    Same as upload_file_to_drive, straight from memory (no screenshot file on disk).
+    Upsert by name: the given file_id, or a file_name this process already uploaded to parent_id
+    (see id_cache), gets a new revision instead of a duplicate next to it. lookup=True also asks
+    Drive for file_name when neither is known (a retry whose earlier upload may have gone through).
+    """
+    service = service or get_drive_service()
+    print(f"🚀 Uploading {file_name} to Drive...")
+
+    mimetype = mimetype or mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    if not file_id:
+        cache_name = _lookup_cache_name(file_name, exact=True)
+        known = id_cache.get(parent_id, cache_name) or (lookup and find_time_update_file(service, parent_id, name=file_name, exact=True))
+        file_id = (known or {}).get('id')
+    with tracing.span("drive.upload", bytes=len(data), update=bool(file_id)):
+        tracing.count("bytes_up", len(data))
+        file = None
+        if file_id:
+            try:
+                file = execute_upload(service.files().update(
+                    fileId=file_id,
+                    media_body=media_from_bytes(data, mimetype),
+                    fields='id',
+                    supportsAllDrives=True
+                ))
+            except HttpError as e:
+                if not is_not_found(e):
+                    raise
+                id_cache.invalidate_id(file_id)  # Deleted since we last saw it: create it again
+        if file is None:
+            file = execute_upload(service.files().create(
+                body={'name': file_name, 'parents': [parent_id]},
+                media_body=media_from_bytes(data, mimetype),
+                fields='id',
+                supportsAllDrives=True
+            ))
+            id_cache.put(parent_id, _lookup_cache_name(file_name, exact=True), {'id': file['id'], 'name': file_name})
+
+    print(f"🎉 Upload Complete! File ID: {file.get('id')}")
+    return file.get('id')
@@ -1,23 +1,19 @@
+import io
 import openpyxl
 import datetime
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaIoBaseDownload
+
+import drive_utils
+import xlsx_patch
 
 def find_excel_file(service, parent_id, name="Time update.xlsx"):
     """Finds the file ID of the Excel sheet."""
     print(f"🔎 Searching for '{name}'...")
     
-    # ADDED: supportsAllDrives=True to find files in shared folders
-    query = f"name = '{name}' and '{parent_id}' in parents and trashed = false"
-    results = service.files().list(
-        q=query, 
-        fields="files(id, name)",
-        includeItemsFromAllDrives=True, 
-        supportsAllDrives=True
-    ).execute()
-    
-    files = results.get('files', [])
+    # Cached by parent + name (see id_cache), only queries Drive on a miss
+    found = drive_utils.find_time_update_file(service, parent_id, name, exact=True)
     
-    if not files:
+    if not found:
         print(f"❌ Could not find '{name}' in the folder.")
         # Debug: List what files ARE there so we can see the issue
         print("   (Files found in this folder:)")
@@ -26,33 +22,71 @@ def find_excel_file(service, parent_id, name="Time update.xlsx"):
             print(f"   - {f['name']}")
         return None
     
-    return files[0]['id']
+    return found['id']
+
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 
-def download_excel(service, file_id, local_path):
+def download_excel(service, file_id, local_path=None):
+    """Without local_path the workbook is kept in memory and returned as a BytesIO."""
     print(f"📥 Downloading Excel file...")
     request = service.files().get_media(fileId=file_id)
-    with open(local_path, "wb") as fh:
+    fh = io.BytesIO() if local_path is None else open(local_path, "wb")
+    try:
         downloader = MediaIoBaseDownload(fh, request)
         done = False
         while done is False:
             status, done = downloader.next_chunk()
+    finally:
+        if local_path is not None:
+            fh.close()
     print("✅ Download complete.")
+    if local_path is None:
+        fh.seek(0)
+        return fh
+
+# The workbook is either a path on disk or an in-memory buffer from download_excel()
+def _read_workbook(workbook):
+    if isinstance(workbook, str):
+        with open(workbook, "rb") as f:
+            return f.read()
+    return workbook.getvalue()
 
-def update_excel_row(file_path, date_str, working_hours, overtime, note):
+def _write_workbook(workbook, data):
+    if isinstance(workbook, str):
+        with open(workbook, "wb") as f:
+            f.write(data)
+        return
+    workbook.seek(0)
+    workbook.truncate()
+    workbook.write(data)
+    workbook.seek(0)
+
+def _cell_date_str(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%d-%m-%Y")
+    return str(value)
+
+def update_excel_row(workbook, date_str, working_hours, overtime, note):
     print(f"✏️  Updating Excel for date: {date_str}...")
     try:
-        wb = openpyxl.load_workbook(file_path)
+        # Fast path: patch the row in place inside the xlsx zip, no full parse/rewrite
+        original = _read_workbook(workbook)
+        patched = xlsx_patch.patch_rows(original, {date_str: (working_hours, overtime, note)}, _cell_date_str, append=False)
+        if patched is not None:
+            data, matched, _ = patched
+            if not matched:
+                print(f"⚠️  Date {date_str} not found in Excel!")
+                return False
+            print(f"✅ Found row for {date_str}!")
+            _write_workbook(workbook, data)
+            return True
+
+        wb = openpyxl.load_workbook(io.BytesIO(original))
         sheet = wb.active 
         row_found = False
         
         for row in sheet.iter_rows(min_row=2):
-            cell_date = row[0].value 
-            if isinstance(cell_date, datetime.datetime):
-                cell_date_str = cell_date.strftime("%d-%m-%Y")
-            else:
-                cell_date_str = str(cell_date)
-            
-            if cell_date_str == date_str:
+            if _cell_date_str(row[0].value) == date_str:
                 print(f"✅ Found row for {date_str}!")
                 row[2].value = working_hours
                 row[3].value = overtime
@@ -61,7 +95,9 @@ def update_excel_row(file_path, date_str, working_hours, overtime, note):
                 break
         
         if row_found:
-            wb.save(file_path)
+            out = io.BytesIO()
+            wb.save(out)
+            _write_workbook(workbook, out.getvalue())
             return True
         else:
             print(f"⚠️  Date {date_str} not found in Excel!")
@@ -70,8 +106,11 @@ def update_excel_row(file_path, date_str, working_hours, overtime, note):
         print(f"❌ Excel Error: {e}")
         return False
 
-def upload_excel_update(service, local_path, file_id):
+def upload_excel_update(service, workbook, file_id):
     print("☁️  Uploading updated Excel...")
-    media = MediaFileUpload(local_path, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', resumable=True)
-    service.files().update(fileId=file_id, media_body=media, supportsAllDrives=True).execute()
+    if isinstance(workbook, str):
+        media = drive_utils.media_from_file(workbook, XLSX_MIME)
+    else:
+        media = drive_utils.media_from_bytes(workbook.getvalue(), XLSX_MIME)
+    drive_utils.execute_upload(service.files().update(fileId=file_id, media_body=media, supportsAllDrives=True))
     print("🎉 Excel updated successfully!")
\ No newline at end of file
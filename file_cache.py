@@ -0,0 +1,53 @@
+import os
+import json
+import hashlib
+import threading
+
+import json_store
+
+# Local copy of Drive files we download every run (the "Time update" workbook), keyed by
+# file ID and tagged with Drive's md5Checksum / headRevisionId. A metadata-only request
+# tells us whether the cached bytes are still current.
+CACHE_DIR = os.environ.get("DRIVE_FILE_CACHE_DIR", "cache/files")
+
+_lock = threading.Lock()
+
+
+def _paths(file_id):
+    return os.path.join(CACHE_DIR, f"{file_id}.bin"), os.path.join(CACHE_DIR, f"{file_id}.json")
+
+
+def get(file_id, md5):
+    """Cached bytes for file_id if they still match Drive's md5Checksum, else None."""
+    if not md5:
+        return None
+    data_path, meta_path = _paths(file_id)
+    with _lock:
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("md5Checksum") != md5:
+                return None
+            with open(data_path, "rb") as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+    # Guard against a torn/corrupted cache file
+    return data if hashlib.md5(data).hexdigest() == md5 else None
+
+
+def put(file_id, data, md5=None, head_revision=None):
+    data_path, meta_path = _paths(file_id)
+    meta = {"md5Checksum": md5 or hashlib.md5(data).hexdigest(), "headRevisionId": head_revision}
+    with _lock:
+        json_store.atomic_write(data_path, data)
+        json_store.atomic_write(meta_path, json.dumps(meta))
+
+
+def invalidate(file_id):
+    with _lock:
+        for path in _paths(file_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
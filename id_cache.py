@@ -0,0 +1,41 @@
+import os
+import time
+
+import json_store
+
+# Persistent parent+name -> Drive ID map (date folders, the "Time update" workbook).
+# These IDs almost never change, so a normal run should not need any lookup query.
+CACHE_FILE = os.environ.get("DRIVE_ID_CACHE_FILE", "cache/drive_ids.json")
+TTL_SECONDS = int(os.environ.get("DRIVE_ID_CACHE_TTL", str(7 * 24 * 3600)))
+
+_store = json_store.JsonStore(CACHE_FILE)
+
+
+def _key(parent_id, name):
+    return f"{parent_id}/{name}"
+
+
+def get(parent_id, name):
+    """Returns the cached item ({'id': ..., ...}) or None when missing/expired."""
+    with _store.lock:
+        entry = _store.data.get(_key(parent_id, name))
+        if entry is None or time.time() - entry["cached_at"] > TTL_SECONDS:
+            return None
+        return entry["item"]
+
+
+def put(parent_id, name, item):
+    with _store.lock:
+        _store.data[_key(parent_id, name)] = {"item": item, "cached_at": time.time()}
+        _store.save()
+
+
+def invalidate_id(file_id):
+    """Drops every entry pointing at file_id (called when Drive answers 404 for it)."""
+    with _store.lock:
+        entries = _store.data
+        stale = [k for k, v in entries.items() if v["item"].get("id") == file_id]
+        for k in stale:
+            del entries[k]
+        if stale:
+            _store.save()
@@ -0,0 +1,91 @@
+import io
+import os
+import asyncio
+import mimetypes
+from PIL import Image
+
+import readiness
+import tracing
+
+# --- SCREENSHOT OUTPUT (override via env) ---
+SCREENSHOT_FORMAT = os.environ.get("SCREENSHOT_FORMAT", "webp").lower()   # png | webp | jpeg
+SCREENSHOT_QUALITY = int(os.environ.get("SCREENSHOT_QUALITY", "80"))      # webp/jpeg only
+SCREENSHOT_MAX_WIDTH = int(os.environ.get("SCREENSHOT_MAX_WIDTH", "0"))   # 0 = keep capture width
+CLIP_TIMEOUT = int(os.environ.get("SCREENSHOT_CLIP_TIMEOUT", "2000"))     # ms; the chart is already settled by now
+
+EXTENSIONS = {"png": "png", "webp": "webp", "jpeg": "jpg", "jpg": "jpg"}
+mimetypes.add_type("image/webp", ".webp")
+
+def extension(fmt=None):
+    return EXTENSIONS.get(fmt or SCREENSHOT_FORMAT, "png")
+
+
+def screenshot_name(waka_date_str, fmt=None):
+    return f"wakatime_{waka_date_str}.{extension(fmt)}"
+
+
+def encode(png_bytes, fmt=None, quality=None, max_width=None):
+    """PNG screenshot bytes -> downscaled (optional) and re-encoded bytes in the configured format."""
+    fmt = fmt or SCREENSHOT_FORMAT
+    max_width = SCREENSHOT_MAX_WIDTH if max_width is None else max_width
+    if fmt == "png" and not max_width:
+        return png_bytes
+    return encode_image(Image.open(io.BytesIO(png_bytes)), fmt, quality, max_width)
+
+
+def encode_image(img, fmt=None, quality=None, max_width=None):
+    """Same as encode for a Pillow image we drew ourselves: one compression pass, no PNG round trip."""
+    fmt = fmt or SCREENSHOT_FORMAT
+    quality = quality or SCREENSHOT_QUALITY
+    max_width = SCREENSHOT_MAX_WIDTH if max_width is None else max_width
+    if max_width and img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt in ("jpeg", "jpg"):
+        img.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(out, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def _fallback(span, error):
+    # Not clipped = the whole viewport gets uploaded; make that visible instead of silent
+    print(f"⚠️ Chart '{readiness.CHART_SELECTOR}' not found ({type(error).__name__}), using the full viewport")
+    tracing.count("clip_fallbacks")
+    if span:
+        span.set(clip_error=str(error).splitlines()[0][:200])
+
+
+def capture_chart(page):
+    """Screenshot of the chart element (readiness.CHART_SELECTOR; falls back to the viewport), encoded per config."""
+    with tracing.span("screenshot") as span:
+        clipped = True
+        try:
+            png = page.locator(readiness.CHART_SELECTOR).first.screenshot(timeout=CLIP_TIMEOUT)
+        except Exception as e:
+            clipped = False
+            _fallback(span, e)
+            png = page.screenshot()
+        data = encode(png)
+        if span:
+            span.set(png_bytes=len(png), bytes=len(data), clipped=clipped)
+        return data
+
+
+async def capture_chart_async(page):
+    with tracing.span("screenshot") as span:
+        clipped = True
+        try:
+            png = await page.locator(readiness.CHART_SELECTOR).first.screenshot(timeout=CLIP_TIMEOUT)
+        except Exception as e:
+            clipped = False
+            _fallback(span, e)
+            png = await page.screenshot()
+        # Pillow encode is CPU-bound: keep it off the event loop
+        data = await asyncio.get_running_loop().run_in_executor(None, encode, png)
+        if span:
+            span.set(png_bytes=len(png), bytes=len(data), clipped=clipped)
+        return data
@@ -0,0 +1,60 @@
+import os
+import json
+import threading
+import contextlib
+
+# Local persistence shared by the caches (id_cache, row_index, run_journal, file_cache,
+# asset_cache, user_contexts). Every write goes to a temp file next to the target and is moved
+# into place with os.replace, so concurrent runs and processes never see a half-written file.
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """Yields a temp path next to path; whatever was written there replaces path on exit."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data):
+    """Writes bytes or str to path atomically."""
+    with atomic_path(path) as tmp:
+        with open(tmp, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+
+
+class JsonStore:
+    """
+    A JSON object persisted at path: read on first use (a missing or corrupt file reads as empty)
+    and written back whole by save(). Hold lock around every access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            try:
+                with open(self.path, "r") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def save(self):
+        atomic_write(self.path, json.dumps(self.data))
+
+    def clear(self):
+        """Forgets the in-memory copy; the next access reads the file again."""
+        self._data = None
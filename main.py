@@ -1,28 +1,21 @@
 import os
+import sys
 import json
 import datetime
-from playwright.sync_api import sync_playwright
 
 # Import helpers
 import drive_utils
 import excel_utils
+import browser_pool
+import image_utils
+import readiness
+import request_blocker
+import tracing
+import user_contexts
 
 # CONFIG FILE NAME
 CONFIG_FILE = "user_config.json"
 
-# --- 2025 PRODUCTION OPTIMIZATION: BLOCK LIST ---
-BLOCK_RESOURCE_TYPES = ['font', 'media', 'texttrack', 'object', 'beacon', 'csp_report', 'imageset']
-BLOCK_DOMAINS = [
-    'google-analytics',
-    'googletagmanager',
-    'intercom',
-    'segment.com',
-    'hotjar',
-    'doubleclick',
-    'facebook',
-    'linkedin'
-]
-
 def get_folder_id():
     """Checks for saved Folder ID. If missing, asks user once and saves it."""
     if os.path.exists(CONFIG_FILE):
@@ -52,9 +45,7 @@ def main_workflow():
     folder_date_str = today.strftime("%d-%m-%Y") 
     
     auth_file = "auth.json"
-    screenshot_path = f"screenshots/wakatime_{waka_date_str}.png"
-    screenshot_name = f"wakatime_{waka_date_str}.png"
-    excel_local_path = "Time_update_temp.xlsx"
+    screenshot_name = image_utils.screenshot_name(waka_date_str)
     
     print(f"🚀 Office Automator: {folder_date_str}")
     
@@ -64,80 +55,59 @@ def main_workflow():
     ot = input("   - Overtime: ")
     note = input("   - Note: ")
 
+    # Everything after the prompts is one trace (see tracing.py)
+    with tracing.start_trace("cli", date=folder_date_str):
+        capture_and_sync(PARENT_FOLDER_ID, waka_date_str, folder_date_str, screenshot_name, auth_file, wh, ot, note)
+
+def capture_and_sync(PARENT_FOLDER_ID, waka_date_str, folder_date_str, screenshot_name, auth_file, wh, ot, note):
     # --- STEP 2: CAPTURE ---
     print("\n📸  [1/3] Launching Smart Capture...")
-    capture_success = False
+    screenshot = None
     
-    with sync_playwright() as p:
-        if not os.path.exists(auth_file):
-            print("❌ Error: auth.json missing. Run manual login first.")
-            return
-
-        # --- PHASE 1: HEADLESS ENGINE ---
-        browser = p.chromium.launch(
-            headless=True,
-            args=[
-                "--use-gl=egl",
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-setuid-sandbox"
-            ]
-        )
-        
-        context = browser.new_context(
-            storage_state=auth_file, 
-            viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        
+    if not os.path.exists(auth_file):
+        print("❌ Error: auth.json missing. Run manual login first.")
+        return
+
+    def capture(context):
+        # --- PHASE 1: RESOURCE BLOCKER (shared rules, see request_blocker.py) ---
+        blocker = request_blocker.Blocker().install(context)
         page = context.new_page()
         page.set_default_timeout(30000) # Reduced from 60s to 30s for fail-fast
 
-        # --- PHASE 1: RESOURCE BLOCKER ---
-        def route_handler(route):
-            req = route.request
-            if req.resource_type in BLOCK_RESOURCE_TYPES:
-                return route.abort()
-            if any(d in req.url for d in BLOCK_DOMAINS):
-                return route.abort()
-            return route.continue_()
-
-        page.route("**/*", route_handler)
-
-        try:
-            url = f"https://wakatime.com/dashboard/day?date={waka_date_str}"
-            print(f"   -> Go: {url}")
-            
-            # --- PHASE 2: SMART NAVIGATION ---
-            # 'domcontentloaded' triggers as soon as HTML is parsed (very fast)
-            page.goto(url, wait_until="domcontentloaded")
-            
-            print("   -> 🧠 Smart-Waiting for data...")
-            
-            # --- PHASE 2: AUTO-WAIT LOGIC ---
-            # 1. Wait for Network Idle: This confirms the API JSON has arrived.
-            #    (Reliable now because we blocked the noisy tracking scripts)
-            page.wait_for_load_state("networkidle")
-            
-            # 2. Wait for SVG Content: Explicitly check for internal elements (rect/path)
-            #    This ensures the chart isn't just an empty container.
-            page.wait_for_selector("svg >> css=rect,path", state="attached", timeout=10000)
-
-            # 3. Visual Confirmation (Green Border)
-            page.evaluate("document.querySelector('svg').style.border = '5px solid #00ff00'")
-            
-            # Ensure directory exists
-            os.makedirs("screenshots", exist_ok=True)
-            
-            page.screenshot(path=screenshot_path)
-            print("   -> 📸 SNAP! Screenshot taken.")
-            capture_success = True
-        except Exception as e:
-            print(f"❌  Capture failed: {e}")
-        
-        browser.close()
+        url = readiness.dashboard_url(waka_date_str)
+        print(f"   -> Go: {url}")
+
+        # --- PHASE 2: ADAPTIVE WAIT ---
+        # domcontentloaded -> the chart's API response -> SVG stops mutating (see readiness.py)
+        print("   -> 🧠 Smart-Waiting for data...")
+        report = readiness.wait_until_ready(page, url)
+        phases = ", ".join(f"{k} {v:.2f}s" for k, v in report["timings"].items())
+        print(f"   -> {'✅ Chart ready' if report['ready'] else '⚠️ Chart not settled'} ({phases})")
+
+        # 3. Visual Confirmation (Green Border)
+        page.evaluate("() => { const svg = document.querySelector('svg'); if (svg) svg.style.border = '5px solid #00ff00'; }")
+
+        # Clip to the chart and compress (see image_utils); kept in memory until the upload
+        data = image_utils.capture_chart(page)
+        print("   -> 📸 SNAP! Screenshot taken.")
+        print(f"   -> {blocker.summary()}")
+
+        # Write back cookies WakaTime refreshed during the run
+        user_contexts.save_state(context, auth_file)
+        return data
+
+    # --- PHASE 1: HEADLESS ENGINE (warm, shared browser pool) ---
+    try:
+        screenshot = browser_pool.get_pool().run(
+            capture,
+            storage_state=auth_file,
+            viewport={"width": 1920, "height": 1080},
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        )
+    except Exception as e:
+        print(f"❌  Capture failed: {e}")
 
-    if not capture_success:
+    if screenshot is None:
         return
 
     # --- STEP 3: DRIVE SYNC ---
@@ -145,28 +115,51 @@ def main_workflow():
     try:
         service = drive_utils.authenticate_google_drive()
         
-        # A. Upload Screenshot
-        today_folder_id = drive_utils.find_or_create_folder(service, PARENT_FOLDER_ID, folder_date_str)
-        drive_utils.upload_file_to_drive(screenshot_path, screenshot_name, today_folder_id)
+        # A. Upload Screenshot (IDs may come from id_cache: a 404 drops them and looks them up again)
+        drive_utils.retry_on_stale_id(
+            lambda: drive_utils.find_or_create_folder(service, PARENT_FOLDER_ID, folder_date_str),
+            lambda today_folder_id: drive_utils.upload_bytes_to_drive(screenshot, screenshot_name, today_folder_id, service)
+        )
         
         # B. Update Excel
         print("\n📊  [3/3] Updating Excel...")
-        excel_id = excel_utils.find_excel_file(service, PARENT_FOLDER_ID)
-        
-        if excel_id:
-            excel_utils.download_excel(service, excel_id, excel_local_path)
-            updated = excel_utils.update_excel_row(excel_local_path, folder_date_str, wh, ot, note)
+
+        def update_excel(excel_id):
+            if not excel_id:
+                print("⚠️ Skipping Excel (File not found)")
+                return
+            # Download -> patch -> upload, all in memory
+            workbook = excel_utils.download_excel(service, excel_id)
+            updated = excel_utils.update_excel_row(workbook, folder_date_str, wh, ot, note)
             if updated:
-                excel_utils.upload_excel_update(service, excel_local_path, excel_id)
-                if os.path.exists(excel_local_path):
-                    os.remove(excel_local_path)
-        else:
-            print("⚠️ Skipping Excel (File not found)")
+                excel_utils.upload_excel_update(service, workbook, excel_id)
+
+        drive_utils.retry_on_stale_id(lambda: excel_utils.find_excel_file(service, PARENT_FOLDER_ID), update_excel)
         
     except Exception as e:
         print(f"❌  Cloud Error: {e}")
 
     print("\n🎉 DONE! Reliable & Fast.")
 
+def backfill_workflow(start_str, end_str):
+    """python main.py backfill 2025-01-01 2025-01-31 -> screenshots + timesheet rows for every day."""
+    from automation import OfficeAutomator
+
+    start = datetime.datetime.strptime(start_str, "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(end_str, "%Y-%m-%d").date()
+
+    print(f"🚀 Office Automator Backfill: {start} → {end}")
+    print("\n📝  Time Sheet Details (used for every day, leave hours empty to only capture):")
+    wh = input("   - Working Hours: ")
+    ot = input("   - Overtime: ")
+    note = input("   - Note: ")
+
+    bot = OfficeAutomator()
+    bot.folder_id = get_folder_id()
+    bot.run_range(start, end, (wh, ot, note) if wh else None)
+
 if __name__ == "__main__":
-    main_workflow()
\ No newline at end of file
+    if len(sys.argv) == 4 and sys.argv[1] == "backfill":
+        backfill_workflow(sys.argv[2], sys.argv[3])
+    else:
+        main_workflow()
\ No newline at end of file
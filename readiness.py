@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import time
+import threading
+import statistics
+
+import tracing
+
+# Instead of "networkidle + fixed 10s selector timeout", a capture is ready once:
+#   1. navigate: the dashboard HTML is parsed (domcontentloaded)
+#   2. api:      the XHR that feeds the chart has answered (page.expect_response)
+#   3. render:   the chart <svg> has stopped mutating for QUIET_MS (MutationObserver)
+# Each phase's duration is appended to TIMINGS_FILE so the thresholds can be tuned from real runs.
+BASE_URL = os.environ.get("WAKATIME_BASE_URL", "https://wakatime.com").rstrip("/")  # Benchmarks point this at a local stand-in
+CHART_API_PATTERN = re.compile(os.environ.get("CHART_API_PATTERN", r"/api/v1/users/current/(durations|summaries)"))
+CHART_SELECTOR = os.environ.get("CHART_SELECTOR", "#chart")                 # Element holding the day chart (also the screenshot clip)
+CHART_MIN_AREA = int(os.environ.get("CHART_MIN_AREA", "10000"))             # px²: smaller svgs are icons, not a drawn chart
+NAVIGATE_TIMEOUT = int(os.environ.get("CHART_NAVIGATE_TIMEOUT", "15000"))  # ms
+API_TIMEOUT = int(os.environ.get("CHART_API_TIMEOUT", "10000"))            # ms, counted from navigation start
+QUIET_MS = int(os.environ.get("CHART_QUIET_MS", "150"))                    # No svg mutation for this long = settled
+RENDER_TIMEOUT = int(os.environ.get("CHART_RENDER_TIMEOUT", "5000"))       # ms, give up waiting for the chart to settle
+TIMINGS_FILE = os.environ.get("CHART_TIMINGS_FILE", "cache/readiness.jsonl")
+
+# Resolves once the chart has drawn inside chartSelector (or, for a day without data, once the page
+# is quiet) and no svg node changed for quietMs. Icon svgs elsewhere on the page don't count as drawn.
+# Never rejects: on timeout it reports what it saw.
+SETTLE_JS = """({quietMs, timeoutMs, expectChart, chartSelector, minArea}) => new Promise(resolve => {
+    const start = performance.now();
+    let last = start, mutations = 0;
+    const drawn = () => {
+        const box = document.querySelector(chartSelector);
+        const svg = box && (box.tagName === 'svg' ? box : box.querySelector('svg'));
+        if (!svg || !svg.querySelector('rect, path')) return false;
+        const r = svg.getBoundingClientRect();
+        return r.width * r.height >= minArea;
+    };
+    const touchesSvg = (node) => {
+        const el = node && (node.nodeType === 1 ? node : node.parentElement);
+        return !!el && (!!el.closest('svg') || el.tagName === 'svg' || !!(el.querySelector && el.querySelector('svg')));
+    };
+    const observer = new MutationObserver(records => {
+        for (const r of records) {
+            if (touchesSvg(r.target) || [...r.addedNodes].some(touchesSvg)) {
+                last = performance.now(); mutations++;
+                return;
+            }
+        }
+    });
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    const tick = () => {
+        const now = performance.now();
+        const ready = drawn() || !expectChart;
+        if ((ready && now - last >= quietMs) || now - start >= timeoutMs) {
+            observer.disconnect();
+            resolve({ready: ready, drawn: drawn(), mutations: mutations});
+            return;
+        }
+        setTimeout(tick, Math.min(50, quietMs));
+    };
+    tick();
+})"""
+
+_lock = threading.Lock()
+
+
+def dashboard_url(waka_date_str):
+    return f"{BASE_URL}/dashboard/day?date={waka_date_str}"
+
+
+def is_chart_api(response):
+    return bool(CHART_API_PATTERN.search(response.url))
+
+
+def _has_data(response):
+    """False only when the API clearly says the day is empty (then there's no chart to wait for)."""
+    try:
+        return bool(response.json().get("data", True))
+    except Exception:
+        return True
+
+
+def _settle_args(expect_chart):
+    return {
+        "quietMs": QUIET_MS, "timeoutMs": RENDER_TIMEOUT, "expectChart": expect_chart,
+        "chartSelector": CHART_SELECTOR, "minArea": CHART_MIN_AREA,
+    }
+
+
+def _report(url, timings, settled, api_ok, wall_start):
+    # Phases were timed inside Playwright calls; add them to the run's trace afterwards
+    offset = wall_start
+    for phase in ("navigate", "api", "render"):
+        tracing.record(f"chart.{phase}", timings[phase], start=offset)
+        offset += timings[phase]
+    tracing.set_attrs(chart_ready=bool(settled and settled.get("ready")))
+
+    report = {
+        "url": url,
+        "ready": bool(settled and settled.get("ready")),
+        "api": api_ok,
+        "mutations": settled.get("mutations", 0) if settled else 0,
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+    }
+    record(report)
+    return report
+
+
+def wait_until_ready(page, url):
+    """Navigates to url and returns a report dict once the chart is ready (or the waits ran out)."""
+    timings = {}
+    wall_start = time.time()
+    start = time.perf_counter()
+    api_ok, expect_chart = False, True
+    try:
+        with page.expect_response(is_chart_api, timeout=API_TIMEOUT) as response_info:
+            page.goto(url, wait_until="domcontentloaded", timeout=NAVIGATE_TIMEOUT)
+            timings["navigate"] = time.perf_counter() - start
+        expect_chart = _has_data(response_info.value)
+        api_ok = True
+    except Exception:
+        if "navigate" not in timings:
+            raise  # The page itself didn't load: that's an error, not a slow chart
+    timings["api"] = time.perf_counter() - start - timings["navigate"]
+
+    render_start = time.perf_counter()
+    settled = page.evaluate(SETTLE_JS, _settle_args(expect_chart))
+    timings["render"] = time.perf_counter() - render_start
+    timings["total"] = time.perf_counter() - start
+    return _report(url, timings, settled, api_ok, wall_start)
+
+
+async def wait_until_ready_async(page, url):
+    timings = {}
+    wall_start = time.time()
+    start = time.perf_counter()
+    api_ok, expect_chart = False, True
+    try:
+        async with page.expect_response(is_chart_api, timeout=API_TIMEOUT) as response_info:
+            await page.goto(url, wait_until="domcontentloaded", timeout=NAVIGATE_TIMEOUT)
+            timings["navigate"] = time.perf_counter() - start
+        response = await response_info.value
+        try:
+            expect_chart = bool((await response.json()).get("data", True))
+        except Exception:
+            pass
+        api_ok = True
+    except Exception:
+        if "navigate" not in timings:
+            raise
+    timings["api"] = time.perf_counter() - start - timings["navigate"]
+
+    render_start = time.perf_counter()
+    settled = await page.evaluate(SETTLE_JS, _settle_args(expect_chart))
+    timings["render"] = time.perf_counter() - render_start
+    timings["total"] = time.perf_counter() - start
+    return _report(url, timings, settled, api_ok, wall_start)
+
+
+def record(report):
+    if not TIMINGS_FILE:
+        return
+    line = json.dumps({"ts": time.time(), **report})
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(TIMINGS_FILE) or ".", exist_ok=True)
+            with open(TIMINGS_FILE, "a") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass  # Timings are diagnostics only
+
+
+def summary(path=None):
+    """Median / p90 per phase over the recorded runs: {phase: {"p50": s, "p90": s}}, plus the blank rate."""
+    phases = {}
+    blank = total = 0
+    try:
+        with open(path or TIMINGS_FILE, "r") as f:
+            for line in f:
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    continue
+                total += 1
+                blank += not report.get("ready")
+                for phase, seconds in report.get("timings", {}).items():
+                    phases.setdefault(phase, []).append(seconds)
+    except OSError:
+        return {}
+
+    result = {}
+    for phase, values in phases.items():
+        values.sort()
+        result[phase] = {"p50": statistics.median(values), "p90": values[min(len(values) - 1, int(len(values) * 0.9))]}
+    result["not_ready_rate"] = blank / total if total else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    # python readiness.py -> tuning data for CHART_QUIET_MS / CHART_RENDER_TIMEOUT
+    print(json.dumps(summary(), indent=2))
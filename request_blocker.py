@@ -0,0 +1,160 @@
+import os
+import json
+import threading
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import asset_cache
+
+# One rule set for every capture path (main.py, OfficeAutomator, AsyncOfficeAutomator).
+# Hosts are matched by suffix against precompiled sets: "a.b.doubleclick.net" checks
+# a.b.doubleclick.net, b.doubleclick.net, doubleclick.net, net -> a few O(1) lookups per request
+# instead of scanning a list of substrings.
+# Override with a JSON file (same keys) via BLOCK_RULES_FILE.
+RULES_FILE = os.environ.get("BLOCK_RULES_FILE", "block_rules.json")
+
+DEFAULT_RULES = {
+    # The chart is inline SVG: nothing of these types is needed for the screenshot
+    "block_resource_types": ["image", "font", "media", "texttrack", "object", "beacon", "csp_report", "imageset", "manifest"],
+    "block_hosts": [
+        "google-analytics.com", "analytics.google.com", "googletagmanager.com", "doubleclick.net",
+        "intercom.io", "intercomcdn.com", "intercomassets.com",
+        "hotjar.com", "hotjar.io", "segment.com", "segment.io",
+        "facebook.com", "facebook.net", "twitter.com", "ads-twitter.com", "linkedin.com", "licdn.com",
+        "stripe.com", "stripe.network",
+    ],
+    # Never blocked by host rules: the dashboard and the API the chart is drawn from
+    "allow_hosts": ["wakatime.com"],
+}
+
+
+class RuleSet:
+    def __init__(self, rules=None):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        self.block_types = frozenset(rules["block_resource_types"])
+        self.block_hosts = frozenset(h.lower().lstrip(".") for h in rules["block_hosts"])
+        self.allow_hosts = frozenset(h.lower().lstrip(".") for h in rules["allow_hosts"])
+        self._host_decision = lru_cache(maxsize=1024)(self._decide_host)
+
+    @classmethod
+    def load(cls, path=RULES_FILE):
+        """Rules from path if it exists, else the defaults."""
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                return cls(json.load(f))
+        return cls()
+
+    @staticmethod
+    def _suffixes(host):
+        labels = host.split(".")
+        return (".".join(labels[i:]) for i in range(len(labels)))
+
+    def _decide_host(self, host):
+        suffixes = list(self._suffixes(host))
+        if any(s in self.allow_hosts for s in suffixes):
+            return None
+        if any(s in self.block_hosts for s in suffixes):
+            return "host"
+        return None
+
+    def check(self, url, resource_type):
+        """Returns why the request should be blocked ("type" / "host"), or None to let it through."""
+        if resource_type in self.block_types:
+            return "type"
+        return self._host_decision((urlsplit(url).hostname or "").lower())
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_rules():
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = RuleSet.load()
+        return _rules
+
+
+class Blocker:
+    """
+    Per-run route handler + counters. install() hooks the whole context once,
+    so every page it opens is covered without a page.route per page.
+    Requests that pass are answered from the shared asset cache when possible (see asset_cache).
+    """
+
+    def __init__(self, rules=None, assets=None, use_asset_cache=True):
+        self.rules = rules or get_rules()
+        self.assets = assets or (asset_cache.get_cache() if use_asset_cache else None)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zeroes the counters (a warm context's blocker reports per run)."""
+        with self._lock:
+            self.stats = {"allowed": 0, "blocked": 0, "allowed_bytes": 0, "blocked_by": {}, "assets": {}}
+
+    def should_block(self, request):
+        reason = self.rules.check(request.url, request.resource_type)
+        with self._lock:
+            if reason:
+                self.stats["blocked"] += 1
+                key = f"{reason}:{request.resource_type if reason == 'type' else urlsplit(request.url).hostname}"
+                self.stats["blocked_by"][key] = self.stats["blocked_by"].get(key, 0) + 1
+            else:
+                self.stats["allowed"] += 1
+        return reason is not None
+
+    def _count_response(self, response):
+        # Blocked requests never go out, so only the bytes we let through can be measured
+        try:
+            size = int(response.headers.get("content-length", 0))
+        except ValueError:
+            size = 0
+        with self._lock:
+            self.stats["allowed_bytes"] += size
+
+    def _count_asset(self, served):
+        outcome, network_bytes = served
+        with self._lock:
+            self.stats["assets"][outcome] = self.stats["assets"].get(outcome, 0) + 1
+            self.stats["allowed_bytes"] += network_bytes
+
+    def handle(self, route):
+        if self.should_block(route.request):
+            return route.abort()
+        served = self.assets.serve(route) if self.assets else None
+        if served:
+            return self._count_asset(served)
+        return route.continue_()
+
+    async def handle_async(self, route):
+        if self.should_block(route.request):
+            await route.abort()
+            return
+        served = await self.assets.serve_async(route) if self.assets else None
+        if served:
+            self._count_asset(served)
+        else:
+            await route.continue_()
+
+    def install(self, context):
+        context.route("**/*", self.handle)
+        context.on("response", self._count_response)
+        return self
+
+    async def install_async(self, context):
+        await context.route("**/*", self.handle_async)
+        context.on("response", self._count_response)
+        return self
+
+    def summary(self):
+        s = self.stats
+        top = sorted(s["blocked_by"].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        detail = ", ".join(f"{k} ×{n}" for k, n in top)
+        assets = ", ".join(f"{k} {n}" for k, n in sorted(s["assets"].items()))
+        return (
+            f"🛡️ Blocked {s['blocked']} / allowed {s['allowed']} requests ({s['allowed_bytes'] / 1024:.0f} KB loaded)"
+            + (f" — {detail}" if detail else "")
+            + (f" | 📦 assets: {assets}" if assets else "")
+        )
@@ -0,0 +1,80 @@
+import os
+import re
+import datetime
+from functools import lru_cache
+from dateutil import parser
+
+import json_store
+
+# Persistent date -> row index per spreadsheet, tagged with the content version it describes
+# (md5 of the xlsx we last uploaded / Drive md5Checksum). When the file is unchanged the
+# timesheet row is found without scanning column A at all.
+INDEX_FILE = os.environ.get("ROW_INDEX_FILE", "cache/row_index.json")
+
+# Formats people actually type in column A, tried before the (slow) fuzzy dateutil parse
+DATE_FORMATS = ("%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%d.%m.%Y", "%d-%m-%y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S")
+
+_store = json_store.JsonStore(INDEX_FILE)
+
+
+# "5" or "42" would be read by dateutil as the 5th of this month / the year 2042
+_BARE_NUMBER = re.compile(r"^\d+(?:\.\d+)?$")
+
+
+@lru_cache(maxsize=8192)
+def _parse_strict(text):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _parse_date_text(text):
+    # Only strict hits are cached: dateutil fills missing fields in from *today*, so a memoized
+    # fuzzy result would go stale in a long-running process when the month or year changes
+    parsed = _parse_strict(text)
+    if parsed is not None or not text or _BARE_NUMBER.match(text):
+        return parsed
+    try:
+        return parser.parse(text, dayfirst=True).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+def normalize_date(date_val):
+    """Attempts to convert any date format into a standard python date object."""
+    if isinstance(date_val, datetime.datetime):
+        return date_val.date()
+    if isinstance(date_val, datetime.date):
+        return date_val
+    if date_val is None:
+        return None
+    return _parse_date_text(str(date_val).strip())
+
+
+def get(file_id, version):
+    """Returns {"rows": {date: row}, "last_row": n} if the stored index matches version, else None."""
+    with _store.lock:
+        entry = _store.data.get(file_id)
+        if not entry or entry.get("version") != version:
+            return None
+        rows = {datetime.date.fromisoformat(d): n for d, n in entry["rows"].items()}
+        return {"rows": rows, "last_row": entry["last_row"]}
+
+
+def put(file_id, version, index):
+    with _store.lock:
+        _store.data[file_id] = {
+            "version": version,
+            "rows": {d.isoformat(): n for d, n in index["rows"].items()},
+            "last_row": index["last_row"],
+        }
+        _store.save()
+
+
+def invalidate(file_id):
+    with _store.lock:
+        if _store.data.pop(file_id, None) is not None:
+            _store.save()
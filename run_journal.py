@@ -0,0 +1,114 @@
+import os
+import hashlib
+import datetime
+
+import image_utils
+import json_store
+import user_contexts
+
+# Persistent per-run journal: which stages of a day's run (per user + folder + date) already went
+# through. A retry after a failure resumes at the failed stage instead of re-capturing and
+# re-uploading everything; once a run completes its entry is closed and the next run starts fresh
+# (keeping the uploaded file ID, so the screenshot is updated in place rather than duplicated).
+JOURNAL_FILE = os.environ.get("RUN_JOURNAL_FILE", "cache/run_journal.json")
+IMAGE_DIR = os.environ.get("RUN_JOURNAL_DIR", "cache/journal")  # Screenshots of runs that haven't completed yet
+KEEP_DAYS = int(os.environ.get("RUN_JOURNAL_KEEP_DAYS", "7"))
+
+# Stages, in run order
+CAPTURE = "capture"   # {"sha256": ..., "path": ...}
+UPLOAD = "upload"     # {"file_id": ..., "sha256": ...}, {"started": True} while the first attempt is in flight
+ROW = "row"           # {"values": [working_hours, overtime, note]}
+
+_store = json_store.JsonStore(JOURNAL_FILE)
+
+
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _save():
+    # Old days are never resumed; drop them (and any screenshot they left behind)
+    cutoff = (datetime.date.today() - datetime.timedelta(days=KEEP_DAYS)).isoformat()
+    entries = _store.data
+    for key in [k for k, v in entries.items() if v["date"] < cutoff]:
+        _remove_image(entries.pop(key))
+    _store.save()
+
+
+def _remove_image(entry):
+    path = entry["stages"].get(CAPTURE, {}).get("path")
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class RunJournal:
+    """One day's run for one user and folder. Every mark() is written through to JOURNAL_FILE."""
+
+    def __init__(self, key, date):
+        self.key = key
+        self.date = date
+
+    def _entry(self):
+        return _store.data.setdefault(self.key, {"date": self.date, "stages": {}, "completed": False})
+
+    def stage(self, name):
+        with _store.lock:
+            return dict(_store.data.get(self.key, {}).get("stages", {}).get(name) or {}) or None
+
+    def done(self, name, **expected):
+        """True when name was recorded with exactly these values (e.g. the same image hash)."""
+        recorded = self.stage(name)
+        return recorded is not None and all(recorded.get(k) == v for k, v in expected.items())
+
+    def mark(self, name, **data):
+        with _store.lock:
+            self._entry()["stages"][name] = data
+            _save()
+
+    def save_image(self, data):
+        """Keeps the captured screenshot on disk until the run completes, so a retry can skip the capture."""
+        digest = image_hash(data)
+        if self.done(CAPTURE, sha256=digest):
+            return
+        path = os.path.join(IMAGE_DIR, f"{self.key}.{image_utils.extension()}")
+        json_store.atomic_write(path, data)
+        self.mark(CAPTURE, sha256=digest, path=path)
+
+    def load_image(self):
+        """The screenshot an unfinished earlier attempt captured, or None."""
+        recorded = self.stage(CAPTURE)
+        if not recorded:
+            return None
+        try:
+            with open(recorded["path"], "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data if image_hash(data) == recorded["sha256"] else None
+
+    def finish(self):
+        with _store.lock:
+            entry = self._entry()
+            entry["completed"] = True
+            _remove_image(entry)
+            entry["stages"].pop(CAPTURE, None)
+            _save()
+
+
+def open_run(auth_file, user_cookie, folder_id, date):
+    """
+    Journal for today's run of this user into folder_id. An unfinished entry is resumed as is;
+    a completed one is reset, keeping only the uploaded screenshot's file ID for the next upsert.
+    """
+    raw = f"{user_contexts.user_key(auth_file, user_cookie)}|{folder_id or ''}|{date}"
+    key = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+    with _store.lock:
+        entry = _store.data.get(key)
+        if entry is not None and entry["completed"]:
+            file_id = entry["stages"].get(UPLOAD, {}).get("file_id")
+            _store.data[key] = {"date": date, "stages": {UPLOAD: {"file_id": file_id}} if file_id else {}, "completed": False}
+            _save()
+    return RunJournal(key, date)
@@ -1,85 +1,145 @@
+import re
 import datetime
 from googleapiclient.discovery import build
 
+import drive_utils
+import row_index
+import tracing
+
+# Native Sheets have no md5Checksum, so their index is verified by reading the hinted cell instead
+SHEETS_INDEX_VERSION = "sheets"
+SHEET_NAME = "Sheet1"
+
 class SheetHandler:
-    def __init__(self, creds):
-        # We build the service using the credentials passed from the main app
-        self.service = build('sheets', 'v4', credentials=creds)
+    def __init__(self, creds=None):
+        # Reuse the cached Sheets service unless the caller brings its own credentials
+        if creds is None:
+            self.service = drive_utils.get_sheets_service()
+        else:
+            self.service = build('sheets', 'v4', credentials=creds, static_discovery=True, cache_discovery=False,
+                                 requestBuilder=drive_utils.TracedHttpRequest)
 
     def find_sheet_id_by_name(self, drive_service, folder_id, name="Time update"):
         """
         Finds the Google Sheet ID inside your specific folder.
         It uses the Drive API to look for the file ID.
         """
-        query = f"name = '{name}' and '{folder_id}' in parents and mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false"
-        results = drive_service.files().list(
-            q=query, 
-            fields="files(id)",
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True
-        ).execute()
-        files = results.get('files', [])
-        return files[0]['id'] if files else None
+        found = drive_utils.find_time_update_file(
+            drive_service, folder_id, name, exact=True,
+            mime_type='application/vnd.google-apps.spreadsheet'
+        )
+        return found['id'] if found else None
 
     def update_or_append_log(self, spreadsheet_id, date_str, wh, ot, note):
         """
         THE BUG FIX LOGIC:
-        1. Reads current dates from Column A.
+        1. Reads current dates from Column A (or just the indexed row when we know it).
         2. If today's date exists -> UPDATE that row.
         3. If today's date is missing -> APPEND a new row (Fixes the bug).
         """
         print(f"📊 Checking Sheet for date: {date_str}...")
-        
-        # 1. Read all dates in Column A (Sheet1)
-        sheet_range = "Sheet1!A:A" 
-        result = self.service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id, 
-            range=sheet_range
+        target = row_index.normalize_date(date_str)
+        if target is None:
+            raise ValueError(f"Unrecognised date '{date_str}'")
+        self.update_rows(spreadsheet_id, {target: (wh, ot, note)})
+
+    def update_rows(self, spreadsheet_id, rows):
+        """
+        Writes {date: (wh, ot, note)} with few small calls: one values.batchGet to locate the rows,
+        one values.batchUpdate for the rows that exist and one values.append for the new ones.
+        """
+        with tracing.span("sheets.update_rows", rows=len(rows)):
+            return self._update_rows(spreadsheet_id, rows)
+
+    def _verify_index(self, values, spreadsheet_id, cached, rows):
+        """
+        Reads just the hinted date cells, the last indexed row and the row after it. Returns {date: row}
+        for the requested dates when the index still matches the sheet and nothing was added below it
+        (so dates it doesn't know are new), else None.
+        """
+        hints = {d: cached["rows"][d] for d in rows if d in cached["rows"]}
+        last_row = cached["last_row"]
+        last_date = next((d for d, n in cached["rows"].items() if n == last_row), None)
+        if last_date is None:
+            return None
+        checks = {**hints, last_date: last_row}
+        result = values.batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{SHEET_NAME}!A{n}" for n in checks.values()] + [f"{SHEET_NAME}!A{last_row + 1}"]
         ).execute()
-        
-        rows = result.get('values', [])
+        value_ranges = result.get('valueRanges', [])
+        if len(value_ranges) != len(checks) + 1:
+            return None
+        for (target, n), value_range in zip(checks.items(), value_ranges):
+            cell = value_range.get('values', [])
+            if not (cell and cell[0] and row_index.normalize_date(cell[0][0]) == target):
+                return None
+        # A row added after ours (by a teammate or by hand) may hold one of the dates we think are new
+        after = value_ranges[-1].get('values', [])
+        if after and after[0] and str(after[0][0]).strip():
+            return None
+        return hints
 
-        # 2. Search for the date
-        row_index = -1
-        for i, row in enumerate(rows):
-            # Check if row is not empty and matches date
-            if row and row[0] == date_str:
-                row_index = i + 1  # Sheets are 1-indexed (Row 1 is the first row)
-                break
+    def _update_rows(self, spreadsheet_id, rows):
+        values = self.service.spreadsheets().values()
+        found = None
 
-        # 3. Decision: Update or Append
-        if row_index != -1:
-            # --- OPTION A: UPDATE EXISTING ROW ---
-            print(f"✅ Found date {date_str} at Row {row_index}. Updating...")
-            
-            # We want to update Columns C (Working Hours), D (Overtime), E (Note)
-            # Syntax: Sheet1!C5:E5
-            update_range = f"Sheet1!C{row_index}:E{row_index}" 
-            
-            body = {
-                'values': [[wh, ot, note]]
-            }
-            
-            self.service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id, 
-                range=update_range,
-                valueInputOption="USER_ENTERED", 
-                body=body
-            ).execute()
-            print("✨ Row updated successfully.")
-            
+        # 1. Known rows from the last run? Verify just those cells instead of reading Column A
+        cached = row_index.get(spreadsheet_id, SHEETS_INDEX_VERSION)
+        if cached:
+            found = self._verify_index(values, spreadsheet_id, cached, rows)
+        if found is not None:
+            tracing.set_attrs(index_hit=True)
+            index, last_row = cached["rows"], cached["last_row"]
         else:
-            # --- OPTION B: APPEND NEW ROW (THE FIX) ---
-            print(f"🆕 Date {date_str} not found. Creating new entry...")
-            
-            # We append a full row: [Date, User, WH, OT, Note]
-            values = [[date_str, "User", wh, ot, note]]
-            body = {'values': values}
-            
-            self.service.spreadsheets().values().append(
-                spreadsheetId=spreadsheet_id, 
-                range="Sheet1!A:E",
-                valueInputOption="USER_ENTERED", 
-                body=body
+            # 2. Read all dates in Column A once and rebuild the index
+            result = values.batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=[f"{SHEET_NAME}!A:A"]
+            ).execute()
+            column = result['valueRanges'][0].get('values', [])
+            index = {}
+            for i, row in enumerate(column):
+                # Skip the header and empty rows
+                if i == 0 or not row:
+                    continue
+                parsed = row_index.normalize_date(row[0])
+                if parsed:
+                    index.setdefault(parsed, i + 1)  # Sheets are 1-indexed
+            found = {d: index[d] for d in rows if d in index}
+            last_row = max(index.values(), default=0)
+
+        # 3. Decision: Update in one batchUpdate...
+        data = []
+        for target, n in found.items():
+            wh, ot, note = rows[target]
+            print(f"✅ Found date {target} at Row {n}. Updating...")
+            # Columns C (Working Hours), D (Overtime), E (Note)
+            data.append({'range': f"{SHEET_NAME}!C{n}:E{n}", 'values': [[wh, ot, note]]})
+        if data:
+            values.batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'valueInputOption': 'USER_ENTERED', 'data': data}
+            ).execute()
+
+        # ...or Append: values.append finds the end of the table itself, so rows whose
+        # Column A is blank but hold data further right are never overwritten
+        new = sorted(d for d in rows if d not in found)
+        if new:
+            for target in new:
+                print(f"🆕 Date {target} not found. Creating new entry...")
+            # We write full rows: [Date, User, WH, OT, Note]
+            result = values.append(
+                spreadsheetId=spreadsheet_id,
+                range=f"{SHEET_NAME}!A:E",
+                valueInputOption='USER_ENTERED',
+                insertDataOption='INSERT_ROWS',
+                body={'values': [[target.strftime("%d-%m-%Y"), "User", *rows[target]] for target in new]}
             ).execute()
-            print("✨ New row added successfully.")
\ No newline at end of file
+            first = int(re.search(r'![A-Z]+(\d+)', result['updates']['updatedRange']).group(1))
+            for offset, target in enumerate(new):
+                index[target] = first + offset
+            last_row = first + len(new) - 1
+
+        row_index.put(spreadsheet_id, SHEETS_INDEX_VERSION, {"rows": index, "last_row": last_row})
+        print("✨ Sheet updated successfully.")
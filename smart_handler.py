@@ -1,7 +1,19 @@
 import datetime
+import hashlib
 import io
-from dateutil import parser
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from googleapiclient.http import MediaIoBaseDownload
+
+import drive_utils
+import file_cache
+import row_index
+import tracing
+import xlsx_patch
+
+REVISION_FIELDS = 'md5Checksum, headRevisionId'
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+class ConcurrentEditError(Exception):
+    pass
 
 class SmartHandler:
     def __init__(self, drive_service, sheets_service=None):
@@ -10,66 +22,157 @@ class SmartHandler:
 
     def normalize_date(self, date_val):
         """Attempts to convert any date format into a standard python date object."""
-        if isinstance(date_val, datetime.datetime):
-            return date_val.date()
-        if isinstance(date_val, datetime.date):
-            return date_val
-        try:
-            return parser.parse(str(date_val), dayfirst=True).date()
-        except:
-            return None
+        return row_index.normalize_date(date_val)
 
-    def handle_excel_file(self, file_id, wh, ot, note):
-        import openpyxl
-        
-        print(f"📥 Downloading Excel file (ID: {file_id})...")
-        request = self.drive.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
+    def get_revision(self, file_id):
+        return self.drive.files().get(
+            fileId=file_id,
+            fields=REVISION_FIELDS,
+            supportsAllDrives=True
+        ).execute()
+
+    def download_workbook(self, file_id):
+        """
+        Fetches the xlsx into memory. Safe to start early (e.g. while the browser is still capturing).
+        A metadata-only call decides whether the local copy in file_cache is still current.
+        The returned buffer carries .revision, the Drive revision it was read from.
+        """
+        with tracing.span("workbook.download") as span:
+            revision = self.get_revision(file_id)
+            cached = file_cache.get(file_id, revision.get('md5Checksum'))
+            if cached is not None:
+                print("⚡ Excel unchanged since last run, using local copy.")
+                fh = io.BytesIO(cached)
+            else:
+                print(f"📥 Downloading Excel file (ID: {file_id})...")
+                request = self.drive.files().get_media(fileId=file_id)
+                fh = io.BytesIO()
+                downloader = MediaIoBaseDownload(fh, request)
+                done = False
+                while done is False:
+                    tracing.count("api_calls")  # next_chunk talks HTTP directly, bypassing execute()
+                    status, done = downloader.next_chunk()
+                tracing.count("bytes_down", len(fh.getvalue()))
+                file_cache.put(file_id, fh.getvalue(), revision.get('md5Checksum'), revision.get('headRevisionId'))
+            if span:
+                span.set(cache_hit=cached is not None, bytes=len(fh.getvalue()))
         
         fh.seek(0)
-        wb = openpyxl.load_workbook(fh)
-        sheet = wb.active
+        fh.revision = revision
+        return fh
+
+    def apply_update(self, fh, wh, ot, note, file_id=None):
+        """Updates (or appends) today's row and returns the saved workbook as a buffer."""
+        return self.apply_updates(fh, {datetime.date.today(): (wh, ot, note)}, file_id)
+
+    def apply_updates(self, fh, rows, file_id=None):
+        """
+        Writes several days in one load/save: rows maps date -> (wh, ot, note).
+        Existing dates are updated in place, missing ones appended in date order.
+        With file_id, the date -> row index from the previous run skips the column A scan
+        when the workbook hasn't changed since.
+        """
+        with tracing.span("workbook.patch", rows=len(rows)):
+            return self._apply_updates(fh, rows, file_id)
+
+    def _apply_updates(self, fh, rows, file_id):
+        import openpyxl
         
-        target_date = datetime.date.today()
-        row_found = False
+        # Fast path: patch just the affected rows in the sheet XML (see xlsx_patch)
+        data = fh.getvalue() if hasattr(fh, 'getvalue') else fh.read()
+        index = row_index.get(file_id, hashlib.md5(data).hexdigest()) if file_id else None
+        patched = xlsx_patch.patch_rows(data, rows, self.normalize_date, index=index)
+        if patched is not None:
+            out, matched, new_index = patched
+            print(f"⚡ Patched {len(matched)} row(s), appended {len(rows) - len(matched)}.")
+            if file_id:
+                # Keyed by the md5 of what we're about to upload (= Drive's md5Checksum afterwards)
+                row_index.put(file_id, hashlib.md5(out).hexdigest(), new_index)
+            tracing.set_attrs(method="xlsx_patch", bytes=len(out))
+            return io.BytesIO(out)
+
+        print("🐢 Workbook layout not patchable, using full load...")
+        if file_id:
+            row_index.invalidate(file_id)
+        wb = openpyxl.load_workbook(io.BytesIO(data))
+        sheet = wb.active
+        pending = dict(rows)
         
         # Iterates through Column A (User provided dates)
         for row in sheet.iter_rows(min_row=2):
+            if not pending: break
             cell_val = row[0].value
             if not cell_val: continue
             
             parsed_date = self.normalize_date(cell_val)
             
-            if parsed_date == target_date:
+            if parsed_date in pending:
                 print(f"✅ Found match: {cell_val}")
+                wh, ot, note = pending.pop(parsed_date)
                 # Update Columns C(2), D(3), E(4) - 0-indexed logic
                 row[2].value = wh
                 row[3].value = ot
                 row[4].value = note
-                row_found = True
-                break
         
-        if not row_found:
+        for target_date in sorted(pending):
             print(f"🆕 Date {target_date} not found. Appending...")
+            wh, ot, note = pending[target_date]
             sheet.append([target_date.strftime("%d-%m-%Y"), "User", wh, ot, note])
 
-        # Save and Re-upload
         out_buffer = io.BytesIO()
         wb.save(out_buffer)
         out_buffer.seek(0)
-        
+        tracing.set_attrs(method="openpyxl", bytes=len(out_buffer.getvalue()))
+        return out_buffer
+
+    def upload_workbook(self, file_id, out_buffer, expected_revision=None):
+        """
+        Uploads the edited workbook. With expected_revision (the .revision of the buffer we edited),
+        first checks nobody saved the file since we read it and raises ConcurrentEditError if they did.
+        Drive has no conditional update for file content, so this narrows the race rather than closing it.
+        """
+        if expected_revision is not None:
+            current = self.get_revision(file_id)
+            if current.get('headRevisionId') != expected_revision.get('headRevisionId'):
+                raise ConcurrentEditError(f"'{file_id}' was modified by someone else.")
+
         print("☁️ Uploading updated Excel...")
-        media_upload = MediaIoBaseUpload(out_buffer, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', resumable=True)
+        data = out_buffer.getvalue()
+        media_upload = drive_utils.media_from_bytes(data, XLSX_MIME)
         
         # --- THE FIX IS HERE: Added supportsAllDrives=True ---
-        self.drive.files().update(
-            fileId=file_id, 
-            media_body=media_upload,
-            supportsAllDrives=True  # <--- CRITICAL FIX for shared files
-        ).execute()
-        
-        return True
\ No newline at end of file
+        with tracing.span("workbook.upload", bytes=len(data)):
+            tracing.count("bytes_up", len(data))
+            uploaded = drive_utils.execute_upload(self.drive.files().update(
+                fileId=file_id, 
+                media_body=media_upload,
+                fields=REVISION_FIELDS,
+                supportsAllDrives=True  # <--- CRITICAL FIX for shared files
+            ))
+        # What we just uploaded is the new current version: next run skips the download
+        file_cache.put(file_id, data, uploaded.get('md5Checksum'), uploaded.get('headRevisionId'))
+
+    def commit_updates(self, file_id, rows, fh=None, attempts=3):
+        """
+        Apply rows and upload with an optimistic-concurrency check. If a teammate saved the
+        workbook in between, re-download and re-apply our rows on top of their version.
+        """
+        with tracing.span("workbook.commit", rows=len(rows)):
+            return self._commit_updates(file_id, rows, fh, attempts)
+
+    def _commit_updates(self, file_id, rows, fh, attempts):
+        for attempt in range(attempts):
+            tracing.set_attrs(attempts=attempt + 1)
+            if fh is None:
+                fh = self.download_workbook(file_id)
+            out_buffer = self.apply_updates(fh, rows, file_id)
+            try:
+                self.upload_workbook(file_id, out_buffer, getattr(fh, 'revision', None))
+                return True
+            except ConcurrentEditError:
+                print("🔁 Workbook changed while we were editing, re-applying on the latest version...")
+                fh = None
+        raise ConcurrentEditError(f"Gave up after {attempts} concurrent edits on '{file_id}'.")
+
+    def handle_excel_file(self, file_id, wh, ot, note):
+        return self.commit_updates(file_id, {datetime.date.today(): (wh, ot, note)})
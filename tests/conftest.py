@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Module settings are read from the environment at import time: point every cache at a scratch
+# directory before any app module is imported, so a test run never touches ./cache.
+_SCRATCH = tempfile.mkdtemp(prefix="wakatime-tests-")
+os.environ.update({
+    "DRIVE_ID_CACHE_FILE": os.path.join(_SCRATCH, "drive_ids.json"),
+    "ROW_INDEX_FILE": os.path.join(_SCRATCH, "row_index.json"),
+    "RUN_JOURNAL_FILE": os.path.join(_SCRATCH, "run_journal.json"),
+    "RUN_JOURNAL_DIR": os.path.join(_SCRATCH, "journal"),
+    "DRIVE_FILE_CACHE_DIR": os.path.join(_SCRATCH, "files"),
+    "ASSET_CACHE_DIR": os.path.join(_SCRATCH, "assets"),
+    "SESSION_STATE_DIR": os.path.join(_SCRATCH, "sessions"),
+    "CHART_TIMINGS_FILE": os.path.join(_SCRATCH, "readiness.jsonl"),
+    "TRACE_FILE": "",
+    "TRACE_OTEL": "0",
+    "WRITE_BEHIND_DELAY": "0.05",
+    "DRIVE_MAX_QPS": "0",
+    "DRIVE_BACKOFF_BASE": "0.001",
+})
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Fresh, empty on-disk caches (and in-memory copies) for every test."""
+    import file_cache
+    import id_cache
+    import json_store
+    import row_index
+    import run_journal
+
+    monkeypatch.setattr(id_cache, "_store", json_store.JsonStore(str(tmp_path / "drive_ids.json")))
+    monkeypatch.setattr(row_index, "_store", json_store.JsonStore(str(tmp_path / "row_index.json")))
+    monkeypatch.setattr(run_journal, "_store", json_store.JsonStore(str(tmp_path / "run_journal.json")))
+    monkeypatch.setattr(run_journal, "IMAGE_DIR", str(tmp_path / "journal"))
+    monkeypatch.setattr(file_cache, "CACHE_DIR", str(tmp_path / "files"))
+    return tmp_path
+
+
+@pytest.fixture
+def drive():
+    """The benchmarks' in-memory Drive v3 / Sheets v4, wired in through drive_utils.set_http_factory."""
+    import drive_utils
+    from benchmarks import fake_google
+
+    fake = fake_google.FakeDrive()
+    drive_utils.set_http_factory(fake.http)
+    yield fake
+    drive_utils.set_http_factory(None)
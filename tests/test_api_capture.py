@@ -0,0 +1,26 @@
+import io
+import datetime
+
+from PIL import Image
+
+import api_capture
+from benchmarks import fake_wakatime
+
+
+def test_day_start_prefers_payload_start():
+    payload = {"start": "2026-10-05T22:00:00Z"}
+    assert api_capture._day_start(payload, "2026-10-06") == datetime.datetime(2026, 10, 5, 22, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_day_start_falls_back_to_user_timezone():
+    expected = datetime.datetime(2026, 10, 6, tzinfo=datetime.timezone(datetime.timedelta(hours=9))).timestamp()
+    assert api_capture._day_start({"timezone": "Asia/Tokyo"}, "2026-10-06") == expected
+    assert api_capture._day_start({"timezone": "Not/AZone"}, "2026-10-06") == datetime.datetime(2026, 10, 6, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_render_is_encoded_once_in_configured_format(monkeypatch):
+    monkeypatch.setattr(api_capture.image_utils, "SCREENSHOT_FORMAT", "webp")
+    img = api_capture.render_day_chart(fake_wakatime.durations("2026-10-06"), "2026-10-06")
+    assert isinstance(img, Image.Image)
+    data = api_capture.image_utils.encode_image(img)
+    assert Image.open(io.BytesIO(data)).format == "WEBP"
@@ -0,0 +1,106 @@
+import os
+import socket
+import time
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import drive_utils
+
+CHUNK = 256 * 1024
+
+
+def http_error(status, reason=None):
+    content = b'{"error": {"errors": [{"reason": "%s"}]}}' % (reason or "backendError").encode()
+    return HttpError(httplib2.Response({"status": str(status)}), content)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(drive_utils, "UPLOAD_CHUNK_SIZE", CHUNK)
+    monkeypatch.setattr(drive_utils, "RESUMABLE_THRESHOLD", CHUNK)
+    monkeypatch.setattr(drive_utils.rate_limiter, "rate", 0)
+
+
+@pytest.mark.parametrize("error", [
+    http_error(429), http_error(500), http_error(503), http_error(403, "userRateLimitExceeded"),
+    ConnectionResetError(), socket.timeout(), TimeoutError(), httplib2.ServerNotFoundError("dns"),
+])
+def test_transient_errors(error):
+    assert drive_utils.is_transient(error)
+
+
+@pytest.mark.parametrize("error", [
+    http_error(400), http_error(404), http_error(403, "insufficientPermissions"),
+    FileNotFoundError("gone.png"), PermissionError("denied"), OSError(28, "No space left on device"),
+    ValueError("bad"),
+])
+def test_permanent_errors(error):
+    assert not drive_utils.is_transient(error)
+
+
+def test_resumable_upload_resumes_after_dropped_chunks(drive, small_chunks):
+    drive.fail_every = 2
+    root = drive.add("root")
+    data = os.urandom(5 * CHUNK + 123)
+    drive_utils.upload_bytes_to_drive(data, "big.bin", root, drive_utils.get_drive_service())
+    assert drive.content(drive.named("big.bin")[0]) == data
+
+
+def test_expired_session_restarts_from_zero(drive, small_chunks):
+    root = drive.add("root")
+    data = os.urandom(4 * CHUNK)
+    service = drive_utils.get_drive_service()
+    request = service.files().create(
+        body={"name": "big.bin", "parents": [root]}, media_body=drive_utils.media_from_bytes(data, "application/octet-stream")
+    )
+    request.next_chunk()  # Session opened, first chunk in
+    drive._sessions.clear()  # ...then Drive forgets it
+    drive_utils.execute_upload(request)
+    assert drive.content(drive.named("big.bin")[0]) == data
+
+
+def test_permanent_error_is_not_retried(drive, small_chunks, monkeypatch):
+    calls = []
+
+    class Failing:
+        resumable = None
+
+        def execute(self):
+            calls.append(1)
+            raise http_error(400)
+
+    with pytest.raises(HttpError):
+        drive_utils.execute_upload(Failing())
+    assert len(calls) == 1
+
+
+def test_rate_limiter_disabled_at_zero():
+    limiter = drive_utils.RateLimiter(0)
+    assert all(limiter.acquire() == 0.0 for _ in range(100))
+
+
+def test_rate_limiter_allows_a_burst_then_paces():
+    limiter = drive_utils.RateLimiter(100, burst=3)
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    start = time.monotonic()
+    assert 0 < limiter.acquire() <= 0.01
+    for _ in range(9):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09  # 10 past the burst at 100/s
+
+
+def test_backoff_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(drive_utils, "BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(drive_utils, "BACKOFF_MAX", 4.0)
+    for attempt in range(8):
+        assert all(0 <= drive_utils.backoff_delay(attempt) <= min(4.0, 2 ** attempt) for _ in range(50))
+
+
+def test_backoff_delay_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(drive_utils, "BACKOFF_MAX", 4.0)
+    error = HttpError(httplib2.Response({"status": "429", "retry-after": "7"}), b"{}")
+    assert drive_utils.backoff_delay(0, error) >= 7
+    dated = HttpError(httplib2.Response({"status": "429", "retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}), b"{}")
+    assert drive_utils.backoff_delay(0, dated) <= 4.0  # Only delta-seconds are understood
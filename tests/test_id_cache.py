@@ -0,0 +1,83 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import drive_utils
+import id_cache
+
+
+def test_entries_survive_a_reload():
+    id_cache.put("root", "2026-10", {"id": "f1"})
+    id_cache._store.clear()
+    assert id_cache.get("root", "2026-10") == {"id": "f1"}
+    assert id_cache.get("root", "2026-11") is None
+
+
+def test_expired_entries_are_misses():
+    id_cache.put("root", "2026-10", {"id": "f1"})
+    id_cache._store.data["root/2026-10"]["cached_at"] -= id_cache.TTL_SECONDS + 1
+    assert id_cache.get("root", "2026-10") is None
+
+
+def test_invalidate_drops_every_entry_for_the_id():
+    id_cache.put("root", "2026-10", {"id": "f1"})
+    id_cache.put("other", "alias", {"id": "f1"})
+    id_cache.put("root", "2026-11", {"id": "f2"})
+    id_cache.invalidate_id("f1")
+    id_cache._store.clear()
+    assert id_cache.get("root", "2026-10") is None and id_cache.get("other", "alias") is None
+    assert id_cache.get("root", "2026-11") == {"id": "f2"}
+
+
+def test_stale_id_is_resolved_again_after_404(drive):
+    root = drive.add("root")
+    service = drive_utils.get_drive_service()
+    stale = drive_utils.find_or_create_folder(service, root, "2026-10")
+    del drive.files[stale]  # Deleted in Drive behind the cache's back
+
+    resolve = lambda: drive_utils.find_or_create_folder(service, root, "2026-10")
+    fetched = drive_utils.retry_on_stale_id(resolve, lambda folder_id: service.files().get(fileId=folder_id).execute())
+    assert fetched["id"] != stale and fetched["name"] == "2026-10"
+    assert id_cache.get(root, "2026-10") == {"id": fetched["id"]}
+
+
+def test_other_errors_keep_the_cached_id():
+    id_cache.put("root", "2026-10", {"id": "f1"})
+
+    def action(item):
+        raise HttpError(httplib2.Response({"status": "500"}), b"{}")
+
+    with pytest.raises(HttpError):
+        drive_utils.retry_on_stale_id(lambda: id_cache.get("root", "2026-10"), action)
+    assert id_cache.get("root", "2026-10") == {"id": "f1"}
+
+
+def test_replaced_sheet_is_found_again(drive):
+    from benchmarks import fake_google, workbooks
+    from cloud_pipeline import CloudPipeline
+
+    root = drive.add("root")
+    old = drive.add("Time update", [root], fake_google.SHEET_MIME, rows=workbooks.sheet_rows(3))
+    pipeline = CloudPipeline(root, log=lambda message: None, sheet_backend="sheets")
+    assert pipeline._update_sheet("8", "0", "first") is True
+
+    del drive.files[old], drive.sheets[old]  # Replaced by a new sheet of the same name
+    new = drive.add("Time update", [root], fake_google.SHEET_MIME, rows=workbooks.sheet_rows(3))
+    assert pipeline._update_sheet("8", "0", "second") is True
+    assert drive.sheets[new][-1][-1] == "second"
+    assert id_cache.get(root, drive_utils._lookup_cache_name("Time update", True, fake_google.SHEET_MIME))["id"] == new
+
+
+def test_files_by_name_are_found_in_one_batch(drive):
+    root = drive.add("root")
+    days = {day: drive.add(day, [root]) for day in ("01-10-2026", "02-10-2026", "03-10-2026")}
+    shot = drive.add("wakatime_2026-10-02.webp", [days["02-10-2026"]], content=b"old")
+    service = drive_utils.get_drive_service()
+    locations = {day: (folder, f"wakatime_{day[6:]}-{day[3:5]}-{day[:2]}.webp") for day, folder in days.items()}
+
+    drive.reset_calls()
+    assert drive_utils.find_files_by_name(service, locations) == {"02-10-2026": shot}
+    assert drive.round_trips == 1
+    drive.reset_calls()
+    assert drive_utils.find_files_by_name(service, {"02-10-2026": locations["02-10-2026"]}) == {"02-10-2026": shot}
+    assert drive.round_trips == 0  # Served from id_cache
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+import json_store
+
+
+def test_store_round_trips_and_reads_bad_files_as_empty(tmp_path):
+    path = tmp_path / "nested" / "store.json"
+    store = json_store.JsonStore(str(path))
+    assert store.data == {}
+    store.data["a"] = 1
+    store.save()
+    assert json.loads(path.read_text()) == {"a": 1}
+
+    path.write_text("{truncated")
+    store.clear()
+    assert store.data == {}
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / "state.json"
+    json_store.atomic_write(str(path), "old")
+    with pytest.raises(RuntimeError):
+        with json_store.atomic_path(str(path)) as tmp:
+            with open(tmp, "w") as f:
+                f.write("half")
+            raise RuntimeError("crashed mid-write")
+    assert path.read_text() == "old"
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]  # No temp file left behind
@@ -0,0 +1,52 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import request_blocker
+
+
+@pytest.mark.parametrize("url, resource_type, reason", [
+    ("https://wakatime.com/static/logo.png", "image", "type"),
+    ("https://fonts.example.com/a.woff2", "font", "type"),
+    ("https://www.google-analytics.com/collect", "xhr", "host"),
+    ("https://a.b.doubleclick.net/ad.js", "script", "host"),
+    ("https://WWW.HOTJAR.COM/c.js", "script", "host"),
+    ("https://notdoubleclick.net/x.js", "script", None),  # Suffix match on labels, not a substring
+    ("https://wakatime.com/api/v1/users/current/summaries", "fetch", None),
+    ("https://cdn.example.com/app.js", "script", None),
+    ("data:text/plain,hi", "other", None),
+])
+def test_default_rules(url, resource_type, reason):
+    assert request_blocker.RuleSet().check(url, resource_type) == reason
+
+
+def test_allow_hosts_win_over_block_hosts():
+    rules = request_blocker.RuleSet({"block_hosts": ["wakatime.com", "example.com"], "allow_hosts": ["api.example.com"]})
+    assert rules.check("https://wakatime.com/dashboard", "document") == "host"  # Defaults' allow list was replaced
+    assert rules.check("https://v1.api.example.com/x", "fetch") is None
+    assert rules.check("https://www.example.com/x", "fetch") == "host"
+
+
+def test_load_overrides_only_the_given_keys(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"block_resource_types": ["stylesheet"]}))
+    rules = request_blocker.RuleSet.load(str(path))
+    assert rules.check("https://wakatime.com/a.css", "stylesheet") == "type"
+    assert rules.check("https://wakatime.com/a.png", "image") is None
+    assert rules.check("https://doubleclick.net/x", "script") == "host"
+    assert request_blocker.RuleSet.load(str(tmp_path / "missing.json")).block_types == request_blocker.RuleSet().block_types
+
+
+def test_blocker_counts_per_reason():
+    blocker = request_blocker.Blocker(rules=request_blocker.RuleSet(), use_asset_cache=False)
+    for url, resource_type in [
+        ("https://wakatime.com/a.png", "image"), ("https://wakatime.com/b.png", "image"),
+        ("https://doubleclick.net/x", "script"), ("https://wakatime.com/app.js", "script"),
+    ]:
+        blocker.should_block(SimpleNamespace(url=url, resource_type=resource_type))
+    assert blocker.stats["blocked"] == 3 and blocker.stats["allowed"] == 1
+    assert blocker.stats["blocked_by"] == {"type:image": 2, "host:doubleclick.net": 1}
+    assert "Blocked 3 / allowed 1" in blocker.summary()
+    blocker.reset()
+    assert blocker.stats["blocked"] == blocker.stats["allowed"] == 0
@@ -0,0 +1,43 @@
+import datetime
+
+import pytest
+
+import row_index
+
+OCT_5 = datetime.date(2026, 10, 5)
+
+
+@pytest.mark.parametrize("value", [
+    "05-10-2026", "05/10/2026", "2026-10-05", "05.10.2026", "05-10-26", "5 Oct 2026",
+    datetime.datetime(2026, 10, 5, 9, 30), OCT_5, " 05-10-2026 ",
+])
+def test_normalize_date(value):
+    assert row_index.normalize_date(value) == OCT_5
+
+
+@pytest.mark.parametrize("value", [None, "", "Date", "5", 42, "42", "3.5", "not a date"])
+def test_rejects_non_dates(value):
+    assert row_index.normalize_date(value) is None
+
+
+def test_fuzzy_results_are_not_memoized(monkeypatch):
+    calls = []
+    real_parse = row_index.parser.parse
+    monkeypatch.setattr(row_index.parser, "parse", lambda *a, **k: calls.append(a) or real_parse(*a, **k))
+    for _ in range(2):
+        assert row_index.normalize_date("5 October") is not None  # Year filled in from today
+    assert len(calls) == 2
+
+
+def test_index_is_tied_to_content_version():
+    index = {"rows": {OCT_5: 7}, "last_row": 9}
+    row_index.put("file", "md5-a", index)
+    assert row_index.get("file", "md5-a") == index
+    assert row_index.get("file", "md5-b") is None
+    assert row_index.get("other", "md5-a") is None
+
+
+def test_index_survives_reload():
+    row_index.put("file", "v1", {"rows": {OCT_5: 3}, "last_row": 3})
+    row_index._store.clear()  # Next process
+    assert row_index.get("file", "v1") == {"rows": {OCT_5: 3}, "last_row": 3}
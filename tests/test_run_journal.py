@@ -0,0 +1,120 @@
+import datetime
+
+import pytest
+
+import drive_utils
+import run_journal
+from benchmarks import fake_google, workbooks
+from cloud_pipeline import CloudPipeline
+
+TODAY = datetime.date.today()
+IMAGE = b"RIFF fake webp bytes" * 50
+
+
+@pytest.fixture
+def folder(drive):
+    root = drive.add("Team folder")
+    drive.add("Time update", [root], fake_google.SHEET_MIME, rows=workbooks.sheet_rows(5, TODAY - datetime.timedelta(days=1)))
+    return root
+
+
+def attempt(folder, capture, note="note"):
+    """One OfficeAutomator run's journal/cloud steps, in _run's order. Returns the pipeline's result."""
+    journal = run_journal.open_run("auth.json", None, folder, TODAY.isoformat())
+    image = journal.load_image()
+    if image is None:
+        image = capture()
+    journal.save_image(image)
+    pipeline = CloudPipeline(folder, log=lambda message: None, sheet_backend="sheets", journal=journal)
+    return pipeline.run(image, f"wakatime_{TODAY}.webp", TODAY.strftime("%d-%m-%Y"), "8", "0", note)
+
+
+def screenshots(drive):
+    return drive.named(f"wakatime_{TODAY}.webp")
+
+
+def test_retry_after_failed_upload_skips_capture_and_row(drive, folder, monkeypatch):
+    captures = []
+
+    def capture():
+        captures.append(1)
+        return IMAGE
+
+    real_upload = drive_utils.upload_bytes_to_drive
+    monkeypatch.setattr(drive_utils, "upload_bytes_to_drive", lambda *a, **k: (_ for _ in ()).throw(ConnectionError("dropped")))
+    assert attempt(folder, capture) is False
+    assert len(captures) == 1 and not screenshots(drive)
+
+    monkeypatch.setattr(drive_utils, "upload_bytes_to_drive", real_upload)
+    drive.reset_calls()
+    assert attempt(folder, capture) is True
+    assert len(captures) == 1  # The saved screenshot was reused
+    assert drive.calls.get("sheets.append", 0) == drive.calls.get("sheets.batchUpdate", 0) == 0  # Row already written
+    assert len(screenshots(drive)) == 1
+    assert drive.content(screenshots(drive)[0]) == IMAGE
+
+
+def test_completed_run_starts_fresh_and_updates_the_same_file(drive, folder):
+    captures = []
+
+    def capture():
+        captures.append(1)
+        return IMAGE + bytes([len(captures)])
+
+    assert attempt(folder, capture, note="first") is True
+    assert attempt(folder, capture, note="second") is True
+    assert len(captures) == 2
+    assert len(screenshots(drive)) == 1  # Upserted, not duplicated
+    assert drive.content(screenshots(drive)[0]).endswith(b"\x02")
+    assert drive.sheets[drive.named("Time update")[0]][-1][-1] == "second"
+
+
+def test_journal_image_uses_screenshot_extension(monkeypatch):
+    journal = run_journal.open_run("auth.json", None, "folder", TODAY.isoformat())
+    monkeypatch.setattr(run_journal.image_utils, "SCREENSHOT_FORMAT", "jpeg")
+    journal.save_image(IMAGE)
+    assert journal.stage(run_journal.CAPTURE)["path"].endswith(".jpg")
+    assert journal.load_image() == IMAGE
+
+
+def test_tampered_image_is_not_resumed():
+    journal = run_journal.open_run("auth.json", None, "folder", TODAY.isoformat())
+    journal.save_image(IMAGE)
+    with open(journal.stage(run_journal.CAPTURE)["path"], "wb") as f:
+        f.write(b"truncated")
+    assert journal.load_image() is None
+
+
+@pytest.fixture
+def name_lookups(monkeypatch):
+    """Names upload_bytes_to_drive asked Drive for."""
+    names = []
+    real = drive_utils.find_time_update_file
+
+    def spy(service, parent_id, name="Time update", **kwargs):
+        names.append(name)
+        return real(service, parent_id, name, **kwargs)
+
+    monkeypatch.setattr(drive_utils, "find_time_update_file", spy)
+    return names
+
+
+def test_fresh_run_does_not_look_the_screenshot_up(drive, folder, name_lookups):
+    assert attempt(folder, lambda: IMAGE) is True
+    assert f"wakatime_{TODAY}.webp" not in name_lookups
+
+
+def test_retry_after_lost_upload_response_updates_the_uploaded_file(drive, folder, monkeypatch, name_lookups):
+    real_upload = drive_utils.upload_bytes_to_drive
+
+    def lost_response(*args, **kwargs):
+        real_upload(*args, **kwargs)
+        raise ConnectionError("response lost")
+
+    monkeypatch.setattr(drive_utils, "upload_bytes_to_drive", lost_response)
+    assert attempt(folder, lambda: IMAGE) is False
+    monkeypatch.setattr(drive_utils, "upload_bytes_to_drive", real_upload)
+    drive_utils.id_cache._store.data.clear()  # e.g. retried from another dyno
+    assert attempt(folder, lambda: IMAGE) is True
+    assert f"wakatime_{TODAY}.webp" in name_lookups
+    assert len(screenshots(drive)) == 1
@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+from benchmarks import fake_google, workbooks
+from sheet_handler import SheetHandler
+
+TODAY = datetime.date(2026, 10, 18)
+YESTERDAY = TODAY - datetime.timedelta(days=1)
+
+
+@pytest.fixture
+def sheet(drive):
+    return drive.add("Time update", mime_type=fake_google.SHEET_MIME, rows=workbooks.sheet_rows(5, YESTERDAY))
+
+
+def rows_for(drive, sheet, day):
+    return [row for row in drive.sheets[sheet] if row and row[0] == day.strftime("%d-%m-%Y")]
+
+
+def test_update_rows_updates_and_appends(drive, sheet):
+    SheetHandler().update_rows(sheet, {YESTERDAY: ("7", "1", "updated"), TODAY: ("8", "0", "new")})
+    assert rows_for(drive, sheet, YESTERDAY) == [[YESTERDAY.strftime("%d-%m-%Y"), "User", "7", "1", "updated"]]
+    assert rows_for(drive, sheet, TODAY) == [[TODAY.strftime("%d-%m-%Y"), "User", "8", "0", "new"]]
+
+
+def test_index_hit_reads_only_the_hinted_cells(drive, sheet):
+    SheetHandler().update_rows(sheet, {YESTERDAY: ("8", "0", "")})
+    drive.reset_calls()
+    SheetHandler().update_rows(sheet, {YESTERDAY: ("6", "2", "again")})
+    assert drive.calls["sheets.batchGet"] == 1
+    assert rows_for(drive, sheet, YESTERDAY)[0][2:] == ["6", "2", "again"]
+
+
+def test_row_added_after_the_index_is_updated_not_duplicated(drive, sheet):
+    SheetHandler().update_rows(sheet, {YESTERDAY: ("8", "0", "")})
+    drive.sheets[sheet].append([TODAY.strftime("%d-%m-%Y"), "User", "4", "0", "typed by hand"])
+    SheetHandler().update_rows(sheet, {TODAY: ("8", "0", "from the run")})
+    assert rows_for(drive, sheet, TODAY) == [[TODAY.strftime("%d-%m-%Y"), "User", "8", "0", "from the run"]]
+
+
+def test_unrelated_row_added_after_the_index_forces_a_rescan(drive, sheet):
+    SheetHandler().update_rows(sheet, {YESTERDAY: ("8", "0", "")})
+    drive.sheets[sheet].append(["01-01-2027", "User", "1", "0", ""])
+    SheetHandler().update_rows(sheet, {TODAY: ("8", "0", "")})
+    assert drive.sheets[sheet][-1][0] == TODAY.strftime("%d-%m-%Y")
+    SheetHandler().update_rows(sheet, {TODAY: ("5", "0", "indexed after rescan")})
+    assert rows_for(drive, sheet, TODAY) == [[TODAY.strftime("%d-%m-%Y"), "User", "5", "0", "indexed after rescan"]]
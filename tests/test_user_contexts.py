@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+import user_contexts
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def add_cookies(self, cookies):
+        pass
+
+    async def route(self, pattern, handler):
+        pass
+
+    def on(self, event, handler):
+        pass
+
+    async def storage_state(self, path):
+        with open(path, "w") as f:
+            f.write("{}")
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, **kwargs):
+        await asyncio.sleep(0.01)
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+
+@pytest.fixture
+def contexts(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_contexts, "STATE_DIR", str(tmp_path / "sessions"))
+    browser = FakeBrowser()
+
+    async def get_browser():
+        return browser
+
+    return browser, lambda: user_contexts.UserContexts(get_browser)
+
+
+def test_runs_of_one_user_share_the_warm_context(contexts):
+    browser, make = contexts
+
+    async def scenario():
+        pool = make()
+        seen = []
+
+        async def run():
+            async with pool.acquire("auth.json", "cookie") as (context, _):
+                seen.append(context)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(run(), run(), run())
+        await pool.close_all()
+        return seen
+
+    seen = asyncio.run(scenario())
+    assert len(browser.contexts) == 1 and all(context is seen[0] for context in seen)
+
+
+def test_waiting_run_gets_a_fresh_context_after_a_failed_run(contexts):
+    browser, make = contexts
+
+    async def scenario():
+        pool = make()
+        first_in = asyncio.Event()
+
+        async def failing():
+            async with pool.acquire("auth.json", "cookie"):
+                first_in.set()
+                await asyncio.sleep(0.02)  # The second run is now waiting on this entry's lock
+                raise RuntimeError("page crashed")
+
+        async def waiting():
+            await first_in.wait()
+            async with pool.acquire("auth.json", "cookie") as (context, _):
+                return context.closed, context
+
+        results = await asyncio.gather(failing(), waiting(), return_exceptions=True)
+        await pool.close_all()
+        return results
+
+    failed, (was_closed, context) = asyncio.run(scenario())
+    assert isinstance(failed, RuntimeError)
+    assert was_closed is False
+    assert browser.contexts == [browser.contexts[0], context] and browser.contexts[0].closed
@@ -0,0 +1,76 @@
+import datetime
+import threading
+
+import pytest
+
+import write_behind
+
+OCT_5, OCT_6 = datetime.date(2026, 10, 5), datetime.date(2026, 10, 6)
+
+
+@pytest.fixture
+def flushes(monkeypatch):
+    """Every flush's (file_id, rows), recorded instead of going to the Sheets API."""
+    calls = []
+
+    class Sheets:
+        def update_rows(self, file_id, rows):
+            calls.append((file_id, dict(rows)))
+
+    monkeypatch.setattr(write_behind, "SheetHandler", Sheets)
+    return calls
+
+
+def test_edits_within_the_delay_share_one_flush(flushes):
+    queue = write_behind.WriteBehindQueue(delay=0.1)
+    first = queue.submit("sheet", {OCT_5: ("8", "0", "first")}, backend="sheets")
+    second = queue.submit("sheet", {OCT_5: ("7", "1", "second"), OCT_6: ("8", "0", "")}, backend="sheets")
+    assert first.result(timeout=5) is True and second.result(timeout=5) is True
+    assert flushes == [("sheet", {OCT_5: ("7", "1", "second"), OCT_6: ("8", "0", "")})]  # Later edit wins
+
+
+def test_files_are_flushed_separately(flushes):
+    queue = write_behind.WriteBehindQueue(delay=0.05)
+    futures = [queue.submit(file_id, {OCT_5: ("8", "0", file_id)}, backend="sheets") for file_id in ("a", "b")]
+    for future in futures:
+        future.result(timeout=5)
+    assert sorted(flushes) == [("a", {OCT_5: ("8", "0", "a")}), ("b", {OCT_5: ("8", "0", "b")})]
+
+
+def test_full_batch_flushes_without_waiting(flushes):
+    queue = write_behind.WriteBehindQueue(delay=60, max_batch=2)
+    futures = [queue.submit("sheet", {day: ("8", "0", "")}, backend="sheets") for day in (OCT_5, OCT_6)]
+    for future in futures:
+        future.result(timeout=5)
+    assert flushes == [("sheet", {OCT_5: ("8", "0", ""), OCT_6: ("8", "0", "")})]
+
+
+def test_next_batch_waits_for_the_running_flush(monkeypatch):
+    release, order = threading.Event(), []
+
+    class SlowSheets:
+        def update_rows(self, file_id, rows):
+            order.append(("start", sorted(rows)))
+            release.wait(5)
+            order.append(("end", sorted(rows)))
+
+    monkeypatch.setattr(write_behind, "SheetHandler", SlowSheets)
+    queue = write_behind.WriteBehindQueue(delay=60, max_batch=1)
+    first = queue.submit("sheet", {OCT_5: ("8", "0", "")}, backend="sheets")
+    second = queue.submit("sheet", {OCT_6: ("8", "0", "")}, backend="sheets")
+    release.set()
+    first.result(timeout=5), second.result(timeout=5)
+    assert [step for step, _ in order] == ["start", "end", "start", "end"]
+
+
+def test_failed_flush_fails_every_waiter(monkeypatch):
+    class BrokenSheets:
+        def update_rows(self, file_id, rows):
+            raise ConnectionError("dropped")
+
+    monkeypatch.setattr(write_behind, "SheetHandler", BrokenSheets)
+    queue = write_behind.WriteBehindQueue(delay=0.05)
+    futures = [queue.submit("sheet", {day: ("8", "0", "")}, backend="sheets") for day in (OCT_5, OCT_6)]
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result(timeout=5)
@@ -0,0 +1,150 @@
+import io
+import re
+import zipfile
+import datetime
+
+import openpyxl
+import pytest
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+import row_index
+import xlsx_patch
+
+OCT_5, OCT_6, OCT_7 = datetime.date(2026, 10, 5), datetime.date(2026, 10, 6), datetime.date(2026, 10, 7)
+HEADER = ["Date", "User", "Working Hours", "Overtime", "Note"]
+
+
+def workbook(column_a, epoch=None):
+    """xlsx bytes with a header and one row per column A value (openpyxl writes strings inline)."""
+    wb = openpyxl.Workbook()
+    if epoch is not None:
+        wb.epoch = epoch
+    sheet = wb.active
+    sheet.append(HEADER)
+    for value in column_a:
+        sheet.append([value, "User", "8", "0", "old"])
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            sheet.cell(sheet.max_row, 1).number_format = "dd-mm-yyyy"
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def with_shared_strings(data):
+    """Same workbook with every inline string moved into xl/sharedStrings.xml, the way Excel saves it."""
+    strings = []
+
+    def to_shared(m):
+        strings.append(m.group(2))
+        return b'<c r="%s" t="s"><v>%d</v></c>' % (m.group(1), len(strings) - 1)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as zin, zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            body = zin.read(info.filename)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                body = re.sub(rb'<c r="([A-Z]+\d+)" t="inlineStr"><is><t>(.*?)</t></is></c>', to_shared, body)
+            elif info.filename == "[Content_Types].xml":
+                body = body.replace(b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType='
+                                    b'"application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+            elif info.filename == "xl/_rels/workbook.xml.rels":
+                body = body.replace(b"</Relationships>", b'<Relationship Id="rIdSST" Target="sharedStrings.xml" Type='
+                                    b'"http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"/></Relationships>')
+            zout.writestr(info, body)
+        items = b"".join(b"<si><t>%s</t></si>" % t for t in strings)
+        zout.writestr("xl/sharedStrings.xml", b'<sst xmlns="%s" count="%d" uniqueCount="%d">%s</sst>'
+                      % (xlsx_patch.NS_MAIN.encode(), len(strings), len(strings), items))
+    return buf.getvalue()
+
+
+def rows_of(data):
+    sheet = openpyxl.load_workbook(io.BytesIO(data)).active
+    return [[c.value for c in row] for row in sheet.iter_rows(min_row=2)]
+
+
+def patch(data, rows, **kwargs):
+    return xlsx_patch.patch_rows(data, rows, row_index.normalize_date, **kwargs)
+
+
+def test_updates_matching_row_in_place():
+    data = workbook(["05-10-2026", "06-10-2026"])
+    patched, matched, index = patch(data, {OCT_6: ("7", "1", "new")})
+    assert matched == [OCT_6]
+    assert rows_of(patched) == [
+        ["05-10-2026", "User", "8", "0", "old"],
+        ["06-10-2026", "User", "7", "1", "new"],
+    ]
+    assert index == {"rows": {OCT_5: 2, OCT_6: 3}, "last_row": 3}
+
+
+def test_appends_missing_dates_in_order():
+    data = workbook(["05-10-2026"])
+    patched, matched, index = patch(data, {OCT_7: ("1", "0", "b"), OCT_6: ("2", "0", "a")})
+    assert matched == []
+    assert rows_of(patched)[1:] == [["06-10-2026", "User", "2", "0", "a"], ["07-10-2026", "User", "1", "0", "b"]]
+    assert index["rows"] == {OCT_5: 2, OCT_6: 3, OCT_7: 4} and index["last_row"] == 4
+    assert openpyxl.load_workbook(io.BytesIO(patched)).active.max_row == 4
+
+
+def test_append_false_only_updates():
+    data = workbook(["05-10-2026"])
+    patched, matched, _ = patch(data, {OCT_7: ("1", "0", "b")}, append=False)
+    assert matched == [] and rows_of(patched) == rows_of(data)
+
+
+def test_shared_strings_are_resolved_and_left_untouched():
+    data = with_shared_strings(workbook(["05-10-2026", "06-10-2026"]))
+    assert rows_of(data)[0] == ["05-10-2026", "User", "8", "0", "old"]
+    patched, _, _ = patch(data, {OCT_5: ("9", "9", "shared")})
+    with zipfile.ZipFile(io.BytesIO(data)) as before, zipfile.ZipFile(io.BytesIO(patched)) as after:
+        assert before.read("xl/sharedStrings.xml") == after.read("xl/sharedStrings.xml")
+    assert rows_of(patched)[0] == ["05-10-2026", "User", "9", "9", "shared"]
+
+
+@pytest.mark.parametrize("epoch", [None, CALENDAR_MAC_1904])
+def test_date_cells_in_both_date_systems(epoch):
+    data = workbook([datetime.datetime(2026, 10, 5), datetime.datetime(2026, 10, 6)], epoch=epoch)
+    patched, matched, index = patch(data, {OCT_6: ("5", "0", "dated")})
+    assert matched == [OCT_6]
+    assert index["rows"][OCT_5] == 2
+    assert rows_of(patched)[1][2:] == ["5", "0", "dated"]
+
+
+def test_plain_numbers_in_column_a_are_not_dates():
+    # 46300 is 2026-10-05 as an Excel serial, but this cell has no date format
+    data = workbook([46300, "05-10-2026"])
+    patched, matched, index = patch(data, {OCT_5: ("1", "1", "x")})
+    assert index["rows"] == {OCT_5: 3}
+    assert rows_of(patched)[0][2:] == ["8", "0", "old"]
+    assert rows_of(patched)[1][2:] == ["1", "1", "x"]
+
+
+def test_index_hit_skips_the_scan(monkeypatch):
+    data = workbook(["05-10-2026", "06-10-2026"])
+    _, _, index = patch(data, {OCT_5: ("8", "0", "old")})
+    monkeypatch.setattr(xlsx_patch, "_lookup_with_scan", lambda *a: pytest.fail("column A was scanned"))
+    patched, matched, new_index = patch(data, {OCT_6: ("3", "3", "indexed")}, index=index)
+    assert matched == [OCT_6] and new_index == index
+    assert rows_of(patched)[1][2:] == ["3", "3", "indexed"]
+
+
+def test_stale_index_falls_back_to_scan():
+    data = workbook(["05-10-2026", "06-10-2026"])
+    stale = {"rows": {OCT_6: 2, OCT_5: 3}, "last_row": 3}  # Rows were swapped since
+    patched, matched, index = patch(data, {OCT_6: ("4", "4", "rescanned")}, index=stale)
+    assert matched == [OCT_6]
+    assert index["rows"] == {OCT_5: 2, OCT_6: 3}
+    assert rows_of(patched)[1] == ["06-10-2026", "User", "4", "4", "rescanned"]
+
+
+def test_unusual_workbooks_fall_back_to_openpyxl():
+    assert patch(b"not a zip", {OCT_5: ("1", "1", "x")}) is None
+    data = workbook(["05-10-2026"])
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as zin, zipfile.ZipFile(buf, "w") as zout:
+        for info in zin.infolist():
+            body = zin.read(info.filename)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                body = body.replace(b"<sheetData>", b"<sheetData x=\"1\">")  # Not the layout we splice into
+            zout.writestr(info, body)
+    assert patch(buf.getvalue(), {OCT_5: ("1", "1", "x")}) is None
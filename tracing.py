@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextlib
+import contextvars
+import statistics
+
+# Structured run traces. A trace is one run (a click, a CLI run, a write-behind flush);
+# spans are its stages, with attributes such as bytes and API call counts. Finished traces
+# go to TRACE_FILE as JSON lines (one span per line, OpenTelemetry-style field names) and,
+# with TRACE_OTEL=1 and opentelemetry installed, to the configured OTel tracer provider.
+#
+# The current trace/span live in contextvars. asyncio tasks inherit them; threads don't,
+# so work handed to an executor or the browser pool goes through bind().
+TRACE_FILE = os.environ.get("TRACE_FILE", "cache/traces.jsonl")
+TRACE_OTEL = os.environ.get("TRACE_OTEL", "0") == "1"
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # Optional dependency
+    otel_trace = None
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+_file_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, trace, name, parent_id, attrs):
+        self.trace = trace
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+        self._t0 = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, n=1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.id, "span_id": self.id, "parent_id": self.parent_id,
+            "name": self.name, "start": round(self.start, 6),
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "status": self.status, "attrs": self.attrs,
+        }
+
+
+class Trace:
+    def __init__(self, name, attrs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.spans = []
+        self.totals = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.root = Span(self, name, None, attrs)
+
+    def on_span(self, callback):
+        """callback(span) after every finished span (any thread). Used to drive progress bars."""
+        self._listeners.append(callback)
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+        for callback in self._listeners:
+            try:
+                callback(span)
+            except Exception:
+                pass
+
+    def _count(self, key, n):
+        with self._lock:
+            self.totals[key] = self.totals.get(key, 0) + n
+
+
+# --- RECORDING API (no-ops outside a trace) ---
+@contextlib.contextmanager
+def start_trace(name, **attrs):
+    """Root of a run. On exit every span is written out."""
+    trace = Trace(name, attrs)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException:
+        trace.root.status = "error"
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace.root.duration = time.perf_counter() - trace.root._t0
+        trace.root.attrs.update(trace.totals)
+        trace._finish(trace.root)
+        export(trace)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(trace, name, parent.id if parent else None, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attrs["error"] = str(e)[:200]
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current._t0
+        trace._finish(current)
+
+
+def record(name, seconds, start=None, **attrs):
+    """Adds an already-measured span (e.g. readiness phases timed inside one Playwright call)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    done = Span(trace, name, parent.id if parent else None, attrs)
+    if start is not None:
+        done.start = start
+    done.duration = seconds
+    trace._finish(done)
+
+
+def set_attrs(**attrs):
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def count(key, n=1):
+    """Adds to the current span and to the run's totals (api_calls, bytes_up, bytes_down...)."""
+    current = _current_span.get()
+    if current is None:
+        return
+    if current is not current.trace.root:
+        current.add(key, n)
+    current.trace._count(key, n)
+
+
+def bind(fn):
+    """fn wrapped to run in (a copy of) the caller's trace context, for executors and other threads."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# --- EXPORT ---
+def export(trace):
+    spans = sorted(trace.spans, key=lambda s: s.start)
+    if TRACE_FILE:
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        with _file_lock:
+            try:
+                os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+                with open(TRACE_FILE, "a") as f:
+                    f.write(lines)
+            except OSError:
+                pass  # Diagnostics only
+    if TRACE_OTEL and otel_trace is not None:
+        _export_otel(spans)
+
+
+def _export_otel(spans):
+    # Spans are replayed with their recorded timestamps, parents first
+    tracer = otel_trace.get_tracer("wakatime-automator")
+    by_id = {}
+    for s in sorted(spans, key=lambda s: (s.parent_id is not None, s.start)):
+        parent = by_id.get(s.parent_id)
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = tracer.start_span(s.name, context=context, start_time=int(s.start * 1e9),
+                                      attributes={k: v for k, v in s.attrs.items() if isinstance(v, (str, bool, int, float))})
+        by_id[s.id] = otel_span
+    for s in spans:
+        by_id[s.id].end(end_time=int((s.start + (s.duration or 0)) * 1e9))
+
+
+def summary(path=None):
+    """p50 / p95 duration per span name over every recorded trace: {name: {"count", "p50_ms", "p95_ms"}}."""
+    durations = {}
+    try:
+        with open(path or TRACE_FILE, "r") as f:
+            for line in f:
+                try:
+                    s = json.loads(line)
+                except ValueError:
+                    continue
+                durations.setdefault(s["name"], []).append(s["duration_ms"])
+    except OSError:
+        return {}
+    result = {}
+    for name, values in sorted(durations.items()):
+        values.sort()
+        result[name] = {
+            "count": len(values),
+            "p50_ms": statistics.median(values),
+            "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+        }
+    return result
+
+
+if __name__ == "__main__":
+    # python tracing.py [traces.jsonl] -> where the p95 goes, slowest first
+    stats = summary(sys.argv[1] if len(sys.argv) > 1 else None)
+    for name, s in sorted(stats.items(), key=lambda kv: kv[1]["p95_ms"], reverse=True):
+        print(f"{name:<28} n={s['count']:<5} p50={s['p50_ms']:>9.1f}ms  p95={s['p95_ms']:>9.1f}ms")
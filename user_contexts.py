@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import hashlib
+import contextlib
+
+import json_store
+import request_blocker
+import tracing
+
+# Per-user browser state. The web app only knows the user's pasted WakaTime "session"
+# cookie, so instead of every run doing new_context(storage_state=auth.json):
+#   - the cookie is injected into a fresh context (no login redirect),
+#   - the context stays open between that user's runs until it has been idle for CONTEXT_IDLE_TTL,
+#   - the storage state (including cookies WakaTime rotated meanwhile) is written back after each run,
+#     so a context rebuilt later, or in another process, starts from the refreshed cookies.
+# CLI runs without a pasted cookie keep using auth.json, which gets the write-back instead.
+STATE_DIR = os.environ.get("SESSION_STATE_DIR", "cache/sessions")
+CONTEXT_IDLE_TTL = int(os.environ.get("CONTEXT_IDLE_TTL", "600"))   # Seconds before an unused context is closed
+REAP_INTERVAL = 30
+SESSION_COOKIE = "session"
+VIEWPORT = {"width": 1920, "height": 1080}
+
+
+def session_cookie(value):
+    return {
+        "name": SESSION_COOKIE, "value": value.strip(), "domain": ".wakatime.com", "path": "/",
+        "secure": True, "httpOnly": True, "sameSite": "Lax",
+    }
+
+
+def user_key(auth_file, user_cookie):
+    # Never keep the raw cookie around as a key / file name
+    if user_cookie:
+        return hashlib.sha256(user_cookie.strip().encode("utf-8")).hexdigest()[:24]
+    return os.path.abspath(auth_file)
+
+
+def state_path(auth_file, user_cookie):
+    if not user_cookie:
+        return auth_file
+    return os.path.join(STATE_DIR, f"{user_key(auth_file, user_cookie)}.json")
+
+
+def initial_state(auth_file, user_cookie):
+    """Storage state to open a context with: the refreshed state if we saved one, else None (cookie gets injected)."""
+    path = state_path(auth_file, user_cookie)
+    return path if os.path.exists(path) else None
+
+
+def inject(context, user_cookie, state):
+    # A saved state already holds the (possibly rotated) cookie: re-injecting would roll it back
+    if user_cookie and state is None:
+        context.add_cookies([session_cookie(user_cookie)])
+
+
+async def inject_async(context, user_cookie, state):
+    if user_cookie and state is None:
+        await context.add_cookies([session_cookie(user_cookie)])
+
+
+def save_state(context, path):
+    with json_store.atomic_path(path) as tmp:
+        context.storage_state(path=tmp)
+
+
+async def save_state_async(context, path):
+    with json_store.atomic_path(path) as tmp:
+        await context.storage_state(path=tmp)
+
+
+class _Entry:
+    def __init__(self, browser, context, blocker, path):
+        self.browser = browser
+        self.context = context
+        self.blocker = blocker
+        self.path = path
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class UserContexts:
+    """
+    Warm BrowserContext per user on one async browser (used by capture_scheduler).
+    One run per user at a time; different users run side by side.
+    """
+
+    def __init__(self, get_browser, ttl=CONTEXT_IDLE_TTL):
+        self._get_browser = get_browser
+        self.ttl = ttl
+        self._entries = {}
+        self._opening = {}  # key -> task opening that user's context (joined by concurrent runs)
+        self._lock = asyncio.Lock()
+        self._reaper = None
+
+    async def _open(self, browser, auth_file, user_cookie):
+        # Only shows up in a trace when the user had no warm context
+        with tracing.span("browser.context"):
+            state = initial_state(auth_file, user_cookie)
+            context = await browser.new_context(storage_state=state, viewport=VIEWPORT)
+            await inject_async(context, user_cookie, state)
+            blocker = await request_blocker.Blocker().install_async(context)
+        return _Entry(browser, context, blocker, state_path(auth_file, user_cookie))
+
+    async def _open_entry(self, key, browser, auth_file, user_cookie):
+        try:
+            entry = await self._open(browser, auth_file, user_cookie)
+            async with self._lock:
+                self._entries[key] = entry
+            return entry
+        finally:
+            self._opening.pop(key, None)
+
+    async def _entry(self, key, auth_file, user_cookie):
+        """
+        The user's warm entry, opening it if needed. The global lock only guards the dict lookups:
+        one user's cold start (browser launch, new_context, cookie injection) never holds up the others,
+        and concurrent runs of the same user share a single open.
+        """
+        browser = await self._get_browser()
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.browser is not browser:
+                del self._entries[key]  # Browser was relaunched: that context died with the old one
+                entry = None
+            if entry is not None:
+                return entry
+            opening = self._opening.get(key)
+            if opening is None:
+                opening = self._opening[key] = asyncio.ensure_future(self._open_entry(key, browser, auth_file, user_cookie))
+        return await asyncio.shield(opening)  # A cancelled run doesn't abort the open for the others
+
+    async def _close(self, entry):
+        try:
+            await save_state_async(entry.context, entry.path)
+        except Exception as e:
+            print(f"⚠️ Could not save session state: {e}")
+        try:
+            await entry.context.close()
+        except Exception:
+            pass
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, auth_file, user_cookie):
+        """async with contexts.acquire(...) as (context, blocker): the user's warm context and its blocker."""
+        if self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap())
+        key = user_key(auth_file, user_cookie)
+        while True:
+            entry = await self._entry(key, auth_file, user_cookie)
+            entry.last_used = time.monotonic()  # Keeps the reaper off it until we hold entry.lock
+            await entry.lock.acquire()
+            if self._entries.get(key) is entry:
+                break
+            # The run ahead of us failed (or the reaper got there first) and closed it: open a fresh one
+            entry.lock.release()
+
+        try:
+            entry.blocker.reset()
+            try:
+                yield entry.context, entry.blocker
+            except BaseException:
+                # Don't hand a possibly broken context to the next run
+                async with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                await self._close(entry)
+                raise
+            entry.last_used = time.monotonic()
+            try:
+                await save_state_async(entry.context, entry.path)
+            except Exception as e:
+                print(f"⚠️ Could not save session state: {e}")
+        finally:
+            entry.lock.release()
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            async with self._lock:
+                idle = [
+                    (key, entry) for key, entry in self._entries.items()
+                    if now - entry.last_used > self.ttl and not entry.lock.locked()
+                ]
+                for key, _ in idle:
+                    del self._entries[key]
+            for _, entry in idle:
+                await self._close(entry)
+
+    async def close_all(self):
+        async with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            await self._close(entry)
@@ -0,0 +1,101 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import drive_utils
+import tracing
+from smart_handler import SmartHandler
+from sheet_handler import SheetHandler
+
+# Teammates often submit within the same minute. Instead of each run doing its own
+# download -> edit -> upload of the shared workbook (slow, and last writer wins), row edits
+# are queued per file and flushed together in one load-modify-save-upload cycle.
+FLUSH_DELAY = float(os.environ.get("WRITE_BEHIND_DELAY", "1.5"))   # Seconds to wait for more edits
+MAX_BATCH = int(os.environ.get("WRITE_BEHIND_MAX_BATCH", "20"))     # Flush right away at this many runs
+
+# Flushes run on these long-lived threads so their cached Drive/Sheets services stay warm
+# (see drive_utils._get_service). Separate from cloud_pipeline's executor, whose branches wait on us.
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("WRITE_BEHIND_WORKERS", "2")), thread_name_prefix="write-behind")
+
+
+class _PendingFile:
+    def __init__(self):
+        self.rows = {}
+        self.waiters = []
+        self.timer = None
+
+
+class WriteBehindQueue:
+    """
+    Coalesces {date: (wh, ot, note)} edits per (backend, file_id).
+    submit() returns a Future that resolves once the flush containing the edit has been uploaded.
+    """
+
+    def __init__(self, delay=FLUSH_DELAY, max_batch=MAX_BATCH):
+        self.delay = delay
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flush_locks = {}
+        self._executor = _executor
+
+    def submit(self, file_id, rows, backend="xlsx"):
+        key = (backend, file_id)
+        future = Future()
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingFile()
+            pending.rows.update(rows)  # Same date twice: the later edit wins
+            pending.waiters.append(future)
+
+            if len(pending.waiters) >= self.max_batch:
+                if pending.timer is not None:
+                    pending.timer.cancel()
+                del self._pending[key]
+                self._executor.submit(self._flush, key, pending)
+            elif pending.timer is None:
+                # The timer thread only hands the flush over to the executor
+                pending.timer = threading.Timer(self.delay, self._executor.submit, args=(self._flush_due, key, pending))
+                pending.timer.daemon = True
+                pending.timer.start()
+        return future
+
+    def _flush_due(self, key, pending):
+        with self._lock:
+            if self._pending.get(key) is not pending:
+                return  # Already flushed because the batch filled up
+            del self._pending[key]
+        self._flush(key, pending)
+
+    def _flush(self, key, pending):
+        backend, file_id = key
+        with self._lock:
+            flush_lock = self._flush_locks.setdefault(key, threading.Lock())
+
+        # One cycle per file at a time; the next batch builds on top of this upload
+        with flush_lock:
+            try:
+                with tracing.start_trace("write_behind.flush", backend=backend, runs=len(pending.waiters), rows=len(pending.rows)):
+                    if backend == "sheets":
+                        SheetHandler().update_rows(file_id, pending.rows)
+                    else:
+                        SmartHandler(drive_utils.get_drive_service()).commit_updates(file_id, pending.rows)
+            except Exception as e:
+                for waiter in pending.waiters:
+                    waiter.set_exception(e)
+                return
+            for waiter in pending.waiters:
+                waiter.set_result(True)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteBehindQueue()
+        return _queue
@@ -0,0 +1,294 @@
+import io
+import re
+import zipfile
+import datetime
+import posixpath
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+# Fast path for the timesheet update: instead of parsing the whole workbook with openpyxl
+# and re-serialising every sheet, scan the active sheet's XML for the target rows and
+# splice new C/D/E cells (inline strings, so sharedStrings.xml stays untouched) into it.
+# Anything unexpected returns None and the caller falls back to openpyxl.
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+ROW_RE = re.compile(rb'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+CELL_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+ATTR_RE = re.compile(rb'\b([\w:]+)="([^"]*)"')
+VALUE_RE = re.compile(rb'<v>(.*?)</v>', re.S)
+INLINE_RE = re.compile(rb'<t\b[^>]*>(.*?)</t>', re.S)
+REF_RE = re.compile(rb'^([A-Z]+)(\d+)$')
+
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+EXCEL_EPOCH_1904 = datetime.datetime(1904, 1, 1)
+
+# Built-in number formats that show a date (14-17, 22; 27-36 and 50-58 are the East Asian locale ones).
+# A number in column A is only a date when its style uses one of these or a custom d/y format.
+BUILTIN_DATE_FORMATS = frozenset((14, 15, 16, 17, 22, *range(27, 37), *range(50, 59)))
+FORMAT_LITERALS_RE = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+
+
+def _attrs(raw):
+    return {k.decode(): v.decode() for k, v in ATTR_RE.findall(raw)}
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def _unescape(raw):
+    return ET.fromstring(b"<x>" + raw + b"</x>").text or ""
+
+
+def _active_sheet_path(zf):
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    view = wb.find(f"{{{NS_MAIN}}}bookViews/{{{NS_MAIN}}}workbookView")
+    active = int(view.get("activeTab", "0")) if view is not None else 0
+    sheets = wb.findall(f"{{{NS_MAIN}}}sheets/{{{NS_MAIN}}}sheet")
+    rel_id = sheets[active].get(f"{{{NS_REL}}}id")
+
+    pr = wb.find(f"{{{NS_MAIN}}}workbookPr")
+    date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.findall(f"{{{NS_PKG_REL}}}Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            return path, date1904
+    raise KeyError(rel_id)
+
+
+def _date_styles(zf):
+    """Indices into cellXfs whose number format is a date."""
+    if "xl/styles.xml" not in zf.namelist():
+        return frozenset()
+    root = ET.fromstring(zf.read("xl/styles.xml"))
+    date_formats = set(BUILTIN_DATE_FORMATS)
+    for fmt in root.iter(f"{{{NS_MAIN}}}numFmt"):
+        code = FORMAT_LITERALS_RE.sub("", fmt.get("formatCode", ""))
+        if re.search(r"[dDyY]", code):
+            date_formats.add(int(fmt.get("numFmtId")))
+    xfs = root.find(f"{{{NS_MAIN}}}cellXfs")
+    if xfs is None:
+        return frozenset()
+    return frozenset(i for i, xf in enumerate(xfs.findall(f"{{{NS_MAIN}}}xf")) if int(xf.get("numFmtId", "0")) in date_formats)
+
+
+def _shared_strings(zf, wanted):
+    """Only materialises the shared strings column A actually points at."""
+    if not wanted or "xl/sharedStrings.xml" not in zf.namelist():
+        return {}
+    found = {}
+    index = 0
+    last = max(wanted)
+    with zf.open("xl/sharedStrings.xml") as f:
+        for event, elem in ET.iterparse(f):
+            if elem.tag == f"{{{NS_MAIN}}}si":
+                if index in wanted:
+                    found[index] = "".join(t.text or "" for t in elem.iter(f"{{{NS_MAIN}}}t"))
+                elem.clear()
+                index += 1
+                if index > last:
+                    break
+    return found
+
+
+def _cell(ref, value, style=None):
+    s = f' s="{style}"' if style else ""
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'.encode("utf-8")
+
+
+def _patch_row(row_num, body, values):
+    """Rebuilds one row's cells with values {column_letter: value}. None if the row has non-cell children."""
+    cells = {}
+    pos = 0
+    for m in CELL_RE.finditer(body):
+        if body[pos:m.start()].strip():
+            return None
+        pos = m.end()
+        ref = _attrs(m.group(1)).get("r", "")
+        match = REF_RE.match(ref.encode())
+        if not match:
+            return None
+        cells[match.group(1).decode()] = (m.group(0), _attrs(m.group(1)).get("s"))
+    if body[pos:].strip():
+        return None
+
+    for col, value in values.items():
+        style = cells[col][1] if col in cells else None
+        cells[col] = (_cell(f"{col}{row_num}", value, style), style)
+    return b"".join(cells[col][0] for col in sorted(cells, key=_col_index))
+
+
+def _column_a(m, dates):
+    """
+    Reads column A of one <row> match: ("s", shared_index), ("str", value) or None.
+    dates is (epoch, date style indices): numbers become datetimes only in date-formatted cells.
+    """
+    row_num = int(_attrs(m.group(1))["r"])
+    if not m.group(2):
+        return None
+    first = CELL_RE.search(m.group(2))
+    if not first:
+        return None
+    attrs = _attrs(first.group(1))
+    if attrs.get("r") != f"A{row_num}":
+        return None
+    inner = first.group(2) or b""
+    kind = attrs.get("t", "n")
+    if kind == "inlineStr":
+        return "str", "".join(_unescape(t) for t in INLINE_RE.findall(inner))
+    v = VALUE_RE.search(inner)
+    if not v:
+        return None
+    if kind == "s":
+        return "s", int(v.group(1))
+    epoch, date_styles = dates
+    if kind == "n" and int(attrs.get("s", "0")) in date_styles:
+        try:
+            return "str", epoch + datetime.timedelta(days=float(v.group(1).decode()))
+        except (ValueError, OverflowError):
+            pass
+    return "str", _unescape(v.group(1))
+
+
+def _find_row(sheet, row_num, start, end):
+    hit = re.compile(rb'<row\b[^>]*?\br="%d"' % row_num).search(sheet, start, end)
+    return ROW_RE.match(sheet, hit.start()) if hit else None
+
+
+def _lookup_with_index(zin, sheet, start, end, dates, rows, normalize, index):
+    """
+    O(1) path: jump straight to the indexed rows and only verify their column A.
+    Returns ({date: row_match}, last_row) or None if the index turned out stale.
+    """
+    found = {}
+    for target_date in rows:
+        row_num = index["rows"].get(target_date)
+        if row_num is None:
+            continue
+        m = _find_row(sheet, row_num, start, end)
+        cell = m and _column_a(m, dates)
+        if not cell:
+            return None
+        kind, value = cell
+        if kind == "s":
+            value = _shared_strings(zin, {value}).get(value)
+        if value in (None, "") or normalize(value) != target_date:
+            return None
+        found[target_date] = m
+    return found, index["last_row"]
+
+
+def _lookup_with_scan(zin, sheet, start, end, dates, rows, normalize):
+    """Full pass over column A. Also returns the complete {date: row} map for the next run's index."""
+    column_a = []
+    wanted = set()
+    last_row = 0
+    for m in ROW_RE.finditer(sheet, start, end):
+        row_attrs = _attrs(m.group(1))
+        if "r" not in row_attrs:
+            raise ValueError("row without r attribute")
+        row_num = int(row_attrs["r"])
+        last_row = max(last_row, row_num)
+        if row_num < 2:
+            continue
+        cell = _column_a(m, dates)
+        if cell:
+            if cell[0] == "s":
+                wanted.add(cell[1])
+            column_a.append((m, row_num, cell))
+
+    strings = _shared_strings(zin, wanted)
+    found = {}
+    full_index = {}
+    for m, row_num, (kind, value) in column_a:
+        cell_val = strings.get(value) if kind == "s" else value
+        if cell_val in (None, ""):
+            continue
+        parsed = normalize(cell_val)
+        if parsed is None:
+            continue
+        full_index.setdefault(parsed, row_num)  # First match wins, like the openpyxl loop
+        if parsed in rows and parsed not in found:
+            found[parsed] = m
+    return found, last_row, full_index
+
+
+def patch_rows(data, rows, normalize, append=True, index=None):
+    """
+    data: xlsx bytes. rows: {date: (wh, ot, note)}. normalize: cell value -> date or None.
+    index: optional {"rows": {date: row_num}, "last_row": n} known to describe exactly this data.
+    Returns (patched_bytes, matched_dates, new_index) or None when the workbook needs the openpyxl path.
+    """
+    try:
+        zin = zipfile.ZipFile(io.BytesIO(data))
+        sheet_path, date1904 = _active_sheet_path(zin)
+        sheet = zin.read(sheet_path)
+        date_styles = _date_styles(zin)
+    except (KeyError, IndexError, ValueError, zipfile.BadZipFile, ET.ParseError):
+        return None
+
+    start = sheet.find(b"<sheetData>")
+    end = sheet.find(b"</sheetData>")
+    if start == -1 or end == -1:
+        return None
+    start += len(b"<sheetData>")
+    dates = (EXCEL_EPOCH_1904 if date1904 else EXCEL_EPOCH, date_styles)
+
+    looked_up = _lookup_with_index(zin, sheet, start, end, dates, rows, normalize, index) if index else None
+    if looked_up is not None:
+        found, last_row = looked_up
+        new_rows = dict(index["rows"])
+    else:
+        try:
+            found, last_row, new_rows = _lookup_with_scan(zin, sheet, start, end, dates, rows, normalize)
+        except ValueError:
+            return None
+
+    edits = []
+    for target_date, m in sorted(found.items(), key=lambda item: item[1].start()):
+        wh, ot, note = rows[target_date]
+        row_num = int(_attrs(m.group(1))["r"])
+        body = _patch_row(row_num, m.group(2), {"C": wh, "D": ot, "E": note})
+        if body is None:
+            return None
+        edits.append((m.start(2), m.end(2), body))
+    matched = [d for d in rows if d in found]
+    pending = [d for d in rows if d not in found] if append else []
+
+    out = bytearray()
+    pos = 0
+    for a, b, body in edits:
+        out += sheet[pos:a] + body
+        pos = b
+    out += sheet[pos:end]
+
+    for target_date in sorted(pending):
+        last_row += 1
+        wh, ot, note = rows[target_date]
+        cells = {"A": target_date.strftime("%d-%m-%Y"), "B": "User", "C": wh, "D": ot, "E": note}
+        out += f'<row r="{last_row}">'.encode() + b"".join(_cell(f"{c}{last_row}", v) for c, v in cells.items()) + b"</row>"
+        new_rows.setdefault(target_date, last_row)
+    out += sheet[end:]
+    new_sheet = bytes(out)
+
+    if pending:
+        new_sheet = re.sub(
+            rb'(<dimension ref="[A-Z]+\d+:[A-Z]+)(\d+)"',
+            lambda d: d.group(1) + str(max(last_row, int(d.group(2)))).encode() + b'"',
+            new_sheet, count=1
+        )
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            zout.writestr(info, new_sheet if info.filename == sheet_path else zin.read(info.filename))
+    return buf.getvalue(), matched, {"rows": new_rows, "last_row": last_row}